@@ -0,0 +1,276 @@
+"""Columnar analytics over player state, run outside the bot.
+
+`export` streams the store user by user into one column per field: user id,
+coins, energy, a count column per animal and per food, and the team and
+equipped-food slots (catalog ordinals, -1 when empty). Columns are written as
+NumPy .npy files (readable with numpy.load, no numpy needed to write them) or
+as one wide CSV. Reading users.snap walks the fixed-width records directly;
+users.json has to be parsed whole, so point the export at the snapshot when
+the bot runs with STORE_FORMAT=binary. Both files are replaced atomically by
+the bot, so exporting never interferes with it. Profiles archived to the
+cold store next to the source (users.cold) are exported too.
+
+`query` aggregates over an exported .npy directory, vectorized with numpy
+when it is installed and with plain arrays otherwise:
+
+    python analytics.py export users.snap --out analytics/
+    python analytics.py query analytics/ count animal.dragon --min 1
+    python analytics.py query analytics/ describe coins
+    python analytics.py query analytics/ histogram coins --bins 10
+    python analytics.py query analytics/ top coins --limit 10
+"""
+
+import argparse
+import ast
+import csv
+import itertools
+import json
+import os
+import statistics
+import struct
+import sys
+import time
+from array import array
+from typing import Collection, Dict, Iterator, List, Tuple
+
+try:
+    import numpy
+except ImportError:  # optional: queries fall back to plain arrays
+    numpy = None
+
+import main
+
+CHUNK_ROWS = 4096
+# Column dtype -> array typecode (all fixed-size).
+TYPECODES = {"<u8": "Q", "<i8": "q", "<i2": "h"}
+
+
+def npy_header(dtype: str, count: int) -> bytes:
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (dtype, count)
+    # Format 1.0: magic, version, u16 header length; data starts on a 64-byte boundary.
+    pad = 63 - (10 + len(header)) % 64
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header) + pad + 1) + header.encode("latin1") + b" " * pad + b"\n"
+
+
+def columns_for_catalog() -> Dict[str, str]:
+    columns = {"user_id": "<u8", "coins": "<i8", "energy": "<i8"}
+    columns.update({f"animal.{animal_id}": "<i8" for animal_id in main.catalog.animals})
+    columns.update({f"food.{food_id}": "<i8" for food_id in main.catalog.foods})
+    columns.update({f"team.{slot}": "<i2" for slot in main.SLOT_KEYS})
+    columns.update({f"equipped.{slot}": "<i2" for slot in main.SLOT_KEYS})
+    return columns
+
+
+def clamp(value) -> int:
+    # int64 columns; the odd out-of-range balance is pinned rather than failing the export.
+    return max(-(2**63), min(2**63 - 1, int(value)))
+
+
+def profile_row(profile: Dict, animal_index: Dict[str, int], food_index: Dict[str, int]) -> List[int]:
+    row = [int(profile["user_id"]), clamp(profile.get("coins", 0)), clamp(profile.get("energy", 0))]
+    zoo, foods = profile.get("zoo", {}), profile.get("foods", {})
+    row += [clamp(zoo.get(animal_id, 0)) for animal_id in animal_index]
+    row += [clamp(foods.get(food_id, 0)) for food_id in food_index]
+    team, equipped = profile.get("team", {}), profile.get("equipped_foods", {})
+    row += [animal_index.get(team.get(slot), -1) for slot in main.SLOT_KEYS]
+    row += [food_index.get(equipped.get(slot), -1) for slot in main.SLOT_KEYS]
+    return row
+
+
+def snapshot_rows(path: str) -> Tuple[int, Iterator[List[int]], Collection[str]]:
+    snapshot = main.Snapshot(path)
+    codec = snapshot.codec
+    animal_index = {animal_id: idx for idx, animal_id in enumerate(main.catalog.animals)}
+    food_index = {food_id: idx for idx, food_id in enumerate(main.catalog.foods)}
+    a, f = len(codec.animal_ids), len(codec.food_ids)
+    # Snapshot ordinal -> current catalog column, or None for ids no longer in the catalog.
+    animal_map = [animal_index.get(animal_id) for animal_id in codec.animal_ids]
+    food_map = [food_index.get(food_id) for food_id in codec.food_ids]
+    no_slot = main.SNAPSHOT_NO_SLOT
+
+    def rows() -> Iterator[List[int]]:
+        size = codec.record.size
+        for start in range(0, snapshot.count, CHUNK_ROWS):
+            stop = min(snapshot.count, start + CHUNK_ROWS)
+            block = snapshot.map[snapshot.rows_start + start * size : snapshot.rows_start + stop * size]
+            for offset, values in enumerate(codec.record.iter_unpack(block)):
+                if values[-1]:
+                    # Records with JSON extras carry values the fixed layout cannot hold.
+                    yield profile_row(snapshot.decode(start + offset), animal_index, food_index)
+                    continue
+                zoo = [0] * len(animal_index)
+                for idx, amount in enumerate(values[3 : 3 + a]):
+                    if amount and animal_map[idx] is not None:
+                        zoo[animal_map[idx]] = amount
+                foods = [0] * len(food_index)
+                for idx, amount in enumerate(values[3 + a : 3 + a + f]):
+                    if amount and food_map[idx] is not None:
+                        foods[food_map[idx]] = amount
+                slots = values[3 + a + f : 9 + a + f]
+                team = [-1 if v == no_slot or animal_map[v] is None else animal_map[v] for v in slots[:3]]
+                equipped = [-1 if v == no_slot or food_map[v] is None else food_map[v] for v in slots[3:]]
+                yield [values[0], values[1], values[2]] + zoo + foods + team + equipped
+        snapshot.close()
+
+    return snapshot.count, rows(), snapshot.row_ids().keys()
+
+
+def json_rows(path: str) -> Tuple[int, Iterator[List[int]], Collection[str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        users = json.load(f)["users"]
+    animal_index = {animal_id: idx for idx, animal_id in enumerate(main.catalog.animals)}
+    food_index = {food_id: idx for idx, food_id in enumerate(main.catalog.foods)}
+    return len(users), (profile_row(profile, animal_index, food_index) for profile in users.values()), users.keys()
+
+
+# Archived profiles that are not hot again, after the hot rows.
+def with_cold_rows(source: str, count: int, rows: Iterator[List[int]], hot: Collection[str]) -> Tuple[int, Iterator[List[int]]]:
+    cold = main.ColdArchive(os.path.splitext(source)[0] + ".cold")
+    user_ids = [user_id for user_id in cold.user_ids() if user_id not in hot]
+    if not user_ids:
+        return count, rows
+    animal_index = {animal_id: idx for idx, animal_id in enumerate(main.catalog.animals)}
+    food_index = {food_id: idx for idx, food_id in enumerate(main.catalog.foods)}
+    cold_rows = (profile_row(cold.get(user_id), animal_index, food_index) for user_id in user_ids)
+    return count + len(user_ids), itertools.chain(rows, cold_rows)
+
+
+def export(source: str, out: str, fmt: str) -> int:
+    count, rows, hot = snapshot_rows(source) if source.endswith(".snap") else json_rows(source)
+    count, rows = with_cold_rows(source, count, rows, hot)
+    columns = columns_for_catalog()
+    names = list(columns)
+    os.makedirs(out, exist_ok=True)
+    if fmt == "csv":
+        with open(os.path.join(out, "users.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            writer.writerows(rows)
+    else:
+        files = [open(os.path.join(out, f"{name}.npy"), "wb") for name in names]
+        try:
+            for handle, name in zip(files, names):
+                handle.write(npy_header(columns[name], count))
+            buffers = [array(TYPECODES[columns[name]]) for name in names]
+            for idx, row in enumerate(rows, start=1):
+                for buffer, value in zip(buffers, row):
+                    buffer.append(value)
+                if idx % CHUNK_ROWS == 0:
+                    flush_buffers(files, buffers)
+            flush_buffers(files, buffers)
+        finally:
+            for handle in files:
+                handle.close()
+    manifest = {
+        "count": count,
+        "source": os.path.abspath(source),
+        "exported_at": time.time(),
+        "format": fmt,
+        "columns": columns,
+        "animal_ids": list(main.catalog.animals),
+        "food_ids": list(main.catalog.foods),
+    }
+    with open(os.path.join(out, "columns.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return count
+
+
+def flush_buffers(files, buffers: List[array]) -> None:
+    for handle, buffer in zip(files, buffers):
+        if sys.byteorder == "big":
+            buffer.byteswap()
+        buffer.tofile(handle)
+        del buffer[:]
+
+
+def load_column(directory: str, name: str):
+    path = os.path.join(directory, f"{name}.npy")
+    if not os.path.exists(path):
+        raise SystemExit(f"No column {name!r} in {directory}; see columns.json for the list.")
+    if numpy is not None:
+        return numpy.load(path, mmap_mode="r")
+    with open(path, "rb") as f:
+        prefix = f.read(10)
+        (header_len,) = struct.unpack("<H", prefix[8:10])
+        header = ast.literal_eval(f.read(header_len).decode("latin1"))
+        values = array(TYPECODES[header["descr"]])
+        values.frombytes(f.read())
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def query(directory: str, args: argparse.Namespace) -> None:
+    values = load_column(directory, args.column)
+    if args.action == "count":
+        if numpy is not None:
+            matched = int(numpy.count_nonzero(values >= args.min))
+        else:
+            matched = sum(1 for value in values if value >= args.min)
+        print(f"{matched} of {len(values)} players have {args.column} >= {args.min}")
+    elif args.action == "describe":
+        if not len(values):
+            print("no rows")
+            return
+        if numpy is not None:
+            p50, p90, p99 = numpy.percentile(values, [50, 90, 99])
+            low, high, mean, total = values.min(), values.max(), values.mean(), values.sum()
+        else:
+            ordered = sorted(values)
+            pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+            p50, p90, p99 = pick(0.5), pick(0.9), pick(0.99)
+            low, high, mean, total = ordered[0], ordered[-1], statistics.fmean(ordered), sum(ordered)
+        print(f"{args.column}: n={len(values)} min={low} max={high} mean={mean:.2f} sum={total}")
+        print(f"p50={p50} p90={p90} p99={p99}")
+    elif args.action == "histogram":
+        if not len(values):
+            print("no rows")
+            return
+        if numpy is not None:
+            counts, edges = numpy.histogram(values, bins=args.bins)
+        else:
+            low, high = min(values), max(values)
+            width = (high - low) / args.bins or 1
+            counts = [0] * args.bins
+            for value in values:
+                counts[min(args.bins - 1, int((value - low) / width))] += 1
+            edges = [low + width * idx for idx in range(args.bins + 1)]
+        for idx, amount in enumerate(counts):
+            print(f"[{edges[idx]:>12.1f}, {edges[idx + 1]:>12.1f}) {amount}")
+    elif args.action == "top":
+        user_ids = load_column(directory, "user_id")
+        if numpy is not None:
+            order = numpy.argsort(values)[::-1][: args.limit]
+        else:
+            order = sorted(range(len(values)), key=values.__getitem__, reverse=True)[: args.limit]
+        for idx in order:
+            print(f"{user_ids[idx]} {values[idx]}")
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export", help="Write the store as columns")
+    export_parser.add_argument("source", help="users.snap (preferred) or users.json")
+    export_parser.add_argument("--out", default="analytics", help="Output directory")
+    export_parser.add_argument("--format", choices=("npy", "csv"), default="npy")
+    query_parser = sub.add_parser("query", help="Aggregate over exported .npy columns")
+    query_parser.add_argument("directory")
+    query_parser.add_argument("action", choices=("count", "describe", "histogram", "top"))
+    query_parser.add_argument("column", help="e.g. coins, energy, animal.dragon, food.honey, team.slot1")
+    query_parser.add_argument("--min", type=int, default=1, help="count: threshold (inclusive)")
+    query_parser.add_argument("--bins", type=int, default=10, help="histogram: bucket count")
+    query_parser.add_argument("--limit", type=int, default=10, help="top: rows to show")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        started = time.perf_counter()
+        count = export(args.source, args.out, args.format)
+        print(f"Exported {count} users to {args.out} in {time.perf_counter() - started:.2f}s")
+    else:
+        query(args.directory, args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,241 @@
+"""Offline benchmarks for the game logic and persistence hot paths.
+
+Runs without a Discord token or network access:
+
+    python bench.py                          # print results
+    python bench.py --output bench.json      # save results as JSON
+    python bench.py --baseline bench.json    # compare against a saved run
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+import discord
+from discord import app_commands
+
+import main
+
+REGRESSION_THRESHOLD = 1.10
+
+
+def measure(func: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    timings: List[float] = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return {
+        "repeat": repeat,
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "mean_s": statistics.fmean(timings),
+    }
+
+
+def synthetic_profile(user_id: str, rng: random.Random) -> Dict:
+    profile = main.store._default_profile(user_id)
+    profile["coins"] = rng.randint(0, 5000)
+    profile["energy"] = rng.randint(0, 500)
+    for animal_id in rng.sample(list(main.catalog.animals), rng.randint(5, 25)):
+        profile["zoo"][animal_id] = rng.randint(1, 40)
+    for food_id in rng.sample(list(main.catalog.foods), rng.randint(0, 5)):
+        profile["foods"][food_id] = rng.randint(1, 5)
+    return profile
+
+
+def synthetic_store(path: str, users: int, seed: int = 1234) -> main.DataStore:
+    rng = random.Random(seed)
+    store = main.DataStore(path)
+    store.data["users"] = {str(uid): synthetic_profile(str(uid), rng) for uid in range(users)}
+    return store
+
+
+def full_team_profile() -> Dict:
+    profile = main.store._default_profile("bench")
+    profile["team"] = {"slot1": "elephant", "slot2": "wolf", "slot3": "owl"}
+    profile["equipped_foods"] = {"slot1": "honey", "slot2": "pepper", "slot3": None}
+    profile["zoo"] = {animal_id: 50 for animal_id in main.catalog.animals}
+    return profile
+
+
+def battle_once(profile: Dict, seed: int) -> bool:
+    team = main.team_snapshot(profile)
+    return main.simulate_battle(team.stats, team.power, team.allowed_indices, None, seed)[4]
+
+
+# Stands in for discord.py's dispatch so only the ZooCommandTree wrapper
+# (guild entry, lease choice, latency histogram) is timed.
+class BareTree(app_commands.CommandTree):
+    async def _call(self, interaction) -> None:
+        return None
+
+
+class TimedTree(main.ZooCommandTree, BareTree):
+    pass
+
+
+def tree_calls(tree: app_commands.CommandTree, count: int) -> Callable[[], object]:
+    interaction = SimpleNamespace(
+        guild_id=None,
+        type=discord.InteractionType.application_command,
+        user=SimpleNamespace(id=1),
+        command=SimpleNamespace(qualified_name="bench"),
+    )
+
+    async def calls() -> None:
+        for _ in range(count):
+            await tree._call(interaction)
+
+    return lambda: asyncio.run(calls())
+
+
+def run(quick: bool, workdir: str) -> Dict[str, Dict[str, float]]:
+    rng = random.Random(42)
+    main.init_storage(os.path.join(workdir, "users.json"), os.path.join(workdir, "hatch_counts.jsonl"))
+    results: Dict[str, Dict[str, float]] = {}
+
+    for rolls in (1, 100, 10_000):
+        repeat = 200 if rolls < 10_000 else 10
+        results[f"pick_rarity_x{rolls}"] = measure(lambda: [main.pick_rarity(rng) for _ in range(rolls)], repeat)
+        results[f"pick_rarities_batch_x{rolls}"] = measure(lambda: main.pick_rarities(rolls, rng), repeat)
+        results[f"hunt_rolls_x{rolls}"] = measure(lambda: main.roll_animals(rolls, rng), repeat)
+
+    profile = full_team_profile()
+    seeds = iter(range(1_000_000))
+    results["battle_full"] = measure(lambda: battle_once(profile, next(seeds)), 500)
+    team = main.team_snapshot(profile)
+    enemy_ids = main.simulate_battle(team.stats, team.power, team.allowed_indices, None, 7)[1]
+    enemy_stats = {slot: main.apply_food(main.catalog.animals[animal_id], None) for slot, animal_id in enemy_ids.items()}
+    results["resolve_battle"] = measure(lambda: main.resolve_battle(team.stats, enemy_stats), 2000)
+    results["resolve_battle_recorded"] = measure(lambda: main.resolve_recorded(team.stats, enemy_stats), 2000)
+    kills = main.resolve_recorded(team.stats, enemy_stats)[3]
+    record = main.battle_record(
+        {slot: a.animal_id for slot, a in team.animals.items()}, team.stats, enemy_ids, enemy_stats, True, kills
+    )
+    replay_store = main.ReplayStore(os.path.join(workdir, "replays.bin"))
+    results["replay_encode"] = measure(lambda: replay_store.encode(record), 2000)
+    results["replay_add"] = measure(lambda: replay_store.add("1", record), 2000)
+    results["team_snapshot_cached"] = measure(lambda: main.team_snapshot(profile), 2000)
+    results["team_snapshot_rebuild"] = measure(
+        lambda: main.team_snapshot(profile), 2000, setup=lambda: main.invalidate_team(profile["user_id"])
+    )
+
+    sale_store = synthetic_store(os.path.join(workdir, "sale.json"), 1000)
+    main.store = sale_store
+    seller = sale_store.data["users"]["0"]
+    snapshot = json.loads(json.dumps(seller))
+
+    def reset_seller() -> None:
+        sale_store.data["users"]["0"] = json.loads(json.dumps(snapshot))
+
+    results["finalize_sale_rarity"] = measure(
+        lambda: main.finalize_sale(
+            sale_store.data["users"]["0"], main.plan_rarity_sale(sale_store.data["users"]["0"], "COMMON", None)
+        ),
+        20,
+        setup=reset_seller,
+    )
+
+    results["metrics_observe_x1000"] = measure(
+        lambda: [main.metrics.observe("zoo_command_seconds", 0.004, 'command="bench"') for _ in range(1000)], 200
+    )
+    results["tree_call_bare_x1000"] = measure(tree_calls(BareTree(discord.Client(intents=discord.Intents.none())), 1000), 50)
+    results["tree_call_x1000"] = measure(tree_calls(TimedTree(discord.Client(intents=discord.Intents.none())), 1000), 50)
+
+    main.hatch_counter.add({animal_id: 10 for animal_id in main.catalog.animals})
+    main.hatch_counter.flush()
+    results["build_index_embed"] = measure(main.build_index_embed, 500)
+
+    sizes = (1_000, 10_000) if quick else (1_000, 10_000, 100_000)
+    for users in sizes:
+        store = synthetic_store(os.path.join(workdir, f"users_{users}.json"), users)
+        target = store.data["users"]["0"]
+        results[f"save_profile_{users}_users"] = measure(
+            lambda: store.save_profile(target), 5 if users < 100_000 else 2
+        )
+
+        # Time-to-ready: open the store and serve the first profile.
+        json_path = os.path.join(workdir, f"ready_{users}.json")
+        store.export_json(json_path)
+        main.DataStore(json_path, "binary")
+        repeat = 5 if users < 100_000 else 2
+        results[f"startup_json_{users}_users"] = measure(
+            lambda: main.DataStore(json_path, "json").load_profile("0"), repeat
+        )
+        results[f"startup_binary_{users}_users"] = measure(
+            lambda: main.DataStore(json_path, "binary").load_profile("0"), repeat
+        )
+        binary_store = main.DataStore(json_path, "binary")
+        binary_target = binary_store.load_profile("0")
+        results[f"save_profile_binary_{users}_users"] = measure(
+            lambda: binary_store.save_profile(binary_target), repeat
+        )
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline_path: str, threshold: float) -> bool:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    ok = True
+    print(f"{'benchmark':32} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            print(f"{name:32} {'-':>12} {current['min_s'] * 1000:>10.3f}ms {'new':>8}")
+            continue
+        # Best-of-N is far less noisy than the median for sub-millisecond cases.
+        ratio = current["min_s"] / previous["min_s"] if previous["min_s"] else float("inf")
+        flag = "  REGRESSION" if ratio > threshold else ""
+        ok = ok and not flag
+        print(
+            f"{name:32} {previous['min_s'] * 1000:>10.3f}ms {current['min_s'] * 1000:>10.3f}ms "
+            f"{ratio:>7.2f}x{flag}"
+        )
+    return ok
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against a previously saved JSON result")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Best-time ratio that counts as a regression")
+    parser.add_argument("--quick", action="store_true", help="Skip the 100k-user store")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="zoo-bench-")
+    try:
+        results = run(args.quick, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        return 0 if compare(results, args.baseline, args.threshold) else 1
+    for name, result in results.items():
+        print(f"{name:32} median {result['median_s'] * 1000:10.3f}ms  min {result['min_s'] * 1000:10.3f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,142 @@
+"""Multi-process load test: one store process plus N workers on a fake gateway.
+
+Starts main.py as the single-writer store service, then N worker processes
+that connect to it the way sharded gateway workers do and drive the real
+slash-command coroutines with fake interactions. A shared group of users is
+played by every worker at once, so per-user leases are exercised across
+processes. Afterwards the persisted coins and hatch counts must reconcile with
+what the workers reported to the players.
+
+    python clustertest.py --workers 4 --users 400 --commands 10
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+import main
+from loadtest import LoadTest, use_virtual_clock
+
+
+class ClusterWorker(LoadTest):
+    def lease(self, user_id: int):
+        return main.store.lease(str(user_id))
+
+
+def worker_users(args: argparse.Namespace) -> List[int]:
+    return [uid for uid in range(args.users) if uid % args.workers == args.worker_index or uid < args.shared]
+
+
+async def run_worker(args: argparse.Namespace) -> Dict:
+    await main.init_remote_storage(os.environ["STORE_SOCKET"])
+    main.init_rng(f"clustertest-{args.seed}".encode("utf-8"))
+    test = ClusterWorker(args.users, args.commands, args.seed + args.worker_index, args.guilds)
+    elapsed = await test.drive(worker_users(args))
+    main.hatch_counter.flush()
+    await main.store.drain()
+    return {
+        "worker": args.worker_index,
+        **test.timing(elapsed),
+        "reported_coin_delta": test.reported_coin_delta,
+        "reported_rolls": test.reported_rolls,
+    }
+
+
+def run_cluster(args: argparse.Namespace, workdir: str) -> Dict:
+    users_path = os.path.join(workdir, "users.json")
+    main.init_storage(users_path, os.path.join(workdir, "hatch_counts.jsonl"))
+    seeder = LoadTest(args.users, 0, args.seed, args.guilds)
+    seeder.seed_store()
+    coins_before = sum(p["coins"] for p in seeder.all_profiles())
+
+    env = {
+        **os.environ,
+        "ZOO_DATA_DIR": workdir,
+        "STORE_SOCKET": os.path.join(workdir, "store.sock"),
+        "STORE_FORMAT": args.format,
+        "SHARD_COUNT": str(args.workers),
+    }
+    store_process = subprocess.Popen([sys.executable, main.__file__], env={**env, "ZOO_ROLE": "store"})
+    workers = []
+    for index in range(args.workers):
+        command = [sys.executable, os.path.abspath(__file__), "--worker-index", str(index)]
+        command += ["--workers", str(args.workers), "--users", str(args.users), "--commands", str(args.commands)]
+        command += ["--shared", str(args.shared), "--seed", str(args.seed), "--guilds", str(args.guilds)]
+        worker_env = {**env, "ZOO_ROLE": "worker", "SHARD_IDS": str(index)}
+        workers.append(subprocess.Popen(command, env=worker_env, stdout=subprocess.PIPE, text=True))
+    reports = []
+    for process in workers:
+        stdout, _ = process.communicate()
+        lines = stdout.strip().splitlines()
+        reports.append(json.loads(lines[-1]) if process.returncode == 0 and lines else {"failed": process.returncode})
+    store_process.send_signal(signal.SIGINT)
+    store_process.wait()
+
+    # Every partition: the default one in workdir and one per guild under guilds/.
+    persisted = [
+        profile
+        for path in [users_path] + glob.glob(os.path.join(workdir, "guilds", "*", "users.json"))
+        for profile in main.DataStore(path, "json").data["users"].values()
+    ]
+    hatch_paths = [os.path.join(workdir, "hatch_counts.jsonl")] + glob.glob(os.path.join(workdir, "guilds", "*", "hatch_counts.jsonl"))
+    hatches = sum(sum(main.HatchCounter(path).snapshot.values()) for path in hatch_paths)
+    ok_reports = [r for r in reports if "failed" not in r]
+    return {
+        "workers": reports,
+        "consistency": {
+            "worker_failures": len(reports) - len(ok_reports),
+            "coins_expected": coins_before + sum(r["reported_coin_delta"] for r in ok_reports),
+            "coins_actual": sum(p["coins"] for p in persisted),
+            "hatches_expected": sum(r["reported_rolls"] for r in ok_reports),
+            "hatches_actual": hatches,
+            "negative_balances": sum(1 for p in persisted if p["coins"] < 0 or p["energy"] < 0),
+        },
+    }
+
+
+def consistent(report: Dict) -> bool:
+    checks = report["consistency"]
+    return (
+        checks["worker_failures"] == 0
+        and checks["coins_expected"] == checks["coins_actual"]
+        and checks["hatches_expected"] == checks["hatches_actual"]
+        and checks["negative_balances"] == 0
+    )
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--commands", type=int, default=10, help="Commands per simulated user per worker")
+    parser.add_argument("--shared", type=int, default=20, help="Users played by every worker at once")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--format", choices=("json", "binary"), default="binary", help="Store format of the store process")
+    parser.add_argument("--guilds", type=int, default=0, help="Spread users over this many guilds (GUILD_ECONOMY applies)")
+    parser.add_argument("--worker-index", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_index is not None:
+        use_virtual_clock()
+        print(json.dumps(asyncio.run(run_worker(args))))
+        return 0
+
+    workdir = tempfile.mkdtemp(prefix="zoo-cluster-")
+    try:
+        report = run_cluster(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+    return 0 if consistent(report) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,400 @@
+"""In-process load test that drives the real slash-command coroutines.
+
+Fake interaction/response objects stand in for the Discord gateway, so
+thousands of simulated users run on one event loop against a temporary
+store. Reports throughput, latency percentiles, whether coin totals
+reconcile with what the commands reported to the players, and whether live
+events switch on and off at their boundaries under a clock driven through now().
+
+    python loadtest.py --users 500 --commands 20
+    GUILD_ECONOMY=separate python loadtest.py --guilds 8
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import discord
+from discord import app_commands
+
+import main
+import replay
+from bench import synthetic_profile
+
+COMMAND_MIX: List[Tuple[str, int]] = [
+    ("hunt", 30),
+    ("battle", 20),
+    ("battle_pvp", 5),
+    ("balance", 10),
+    ("zoo", 10),
+    ("sell", 10),
+    ("sell_bulk", 3),
+    ("buy", 4),
+    ("daily", 5),
+    ("team_add", 5),
+    ("stats", 3),
+    ("index", 2),
+    ("replay", 2),
+]
+
+COINS_GAINED = re.compile(r"💰 Coins: \+(\d+)")
+COINS_SPENT = re.compile(r"💰 Coins spent: (\d+)")
+FOOD_SALE = re.compile(r"Value after use: (\d+) coins")
+ENERGY_USED = re.compile(r"🔋 Energy used: (\d+)")
+
+
+def render(content: Optional[str], embed: Optional[discord.Embed]) -> str:
+    parts = [content or ""]
+    if embed is not None:
+        parts.append(embed.title or "")
+        parts.append(embed.description or "")
+        parts.extend(f"{field.name}: {field.value}" for field in embed.fields)
+    return "\n".join(parts)
+
+
+def economy(profile: Dict) -> Tuple:
+    # The profile fields the ledger can rebuild; zero counts are equivalent to absent.
+    return (
+        profile.get("coins", 0),
+        profile.get("energy", 0),
+        {k: v for k, v in profile.get("zoo", {}).items() if v},
+        {k: v for k, v in profile.get("foods", {}).items() if v},
+        {k: v for k, v in profile.get("equipped_foods", {}).items() if v},
+    )
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.bot = False
+        self.name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+
+
+class FakeMessage:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+
+    async def edit(self, content: Optional[str] = None, embed: Optional[discord.Embed] = None, **kwargs) -> None:
+        self.interaction.record(content, embed)
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, **kwargs) -> None:
+        self._done = True
+
+    async def send_message(
+        self, content: Optional[str] = None, *, embed: Optional[discord.Embed] = None, view=None, **kwargs
+    ) -> None:
+        self._done = True
+        self.interaction.record(content, embed)
+        if view is not None and hasattr(view, "confirmed"):
+            # Players always press "Yes" on confirmation prompts.
+            view.confirmed = True
+            view.stop()
+
+
+class FakeInteraction:
+    def __init__(self, user_id: int, guild_id: Optional[int] = None):
+        self.user = FakeUser(user_id)
+        self.guild_id = guild_id
+        self.response = FakeResponse(self)
+        self.type = discord.InteractionType.application_command
+        self.command = None
+        self.extras: Dict = {}
+        self.outputs: List[str] = []
+
+    def record(self, content: Optional[str], embed: Optional[discord.Embed]) -> None:
+        self.outputs.append(render(content, embed))
+
+    async def edit_original_response(
+        self, content: Optional[str] = None, embed: Optional[discord.Embed] = None, **kwargs
+    ) -> None:
+        self.record(content, embed)
+
+    async def original_response(self) -> FakeMessage:
+        return FakeMessage(self)
+
+
+class LoadTest:
+    def __init__(self, users: int, commands: int, seed: int, guilds: int = 0):
+        self.users = users
+        self.commands = commands
+        self.guilds = guilds
+        self.rng = random.Random(seed)
+        self.latencies: Dict[str, List[float]] = {name: [] for name, _ in COMMAND_MIX}
+        self.errors: Dict[str, int] = {name: 0 for name, _ in COMMAND_MIX}
+        self.reported_coin_delta = 0
+        self.reported_rolls = 0
+        team = main.client.tree.get_command("team")
+        self.team_group = team
+        self.team_add = team.get_command("add")
+
+    def guild_of(self, user_id: int) -> Optional[int]:
+        # Users play in DMs, or spread over `guilds` guilds.
+        return 1000 + user_id % self.guilds if self.guilds else None
+
+    def stores(self) -> List[main.DataStore]:
+        return [partition.store for partition in main.partitions.opened.values() if partition.store]
+
+    def all_profiles(self) -> List[Dict]:
+        return [profile for store in self.stores() for profile in store.data["users"].values()]
+
+    def hatch_total(self) -> int:
+        counters = [partition.hatch_counter for partition in main.partitions.opened.values()]
+        return sum(sum(c.snapshot.values()) + sum(c.pending.values()) for c in counters)
+
+    def seed_store(self) -> None:
+        by_guild: Dict[Optional[int], List[Dict]] = {}
+        for uid in range(self.users):
+            profile = synthetic_profile(str(uid), self.rng)
+            for slot, role in (("slot1", "TANK"), ("slot2", "ATTACK"), ("slot3", "SUPPORT")):
+                animal = self.rng.choice([a for a in main.catalog.animals.values() if a.role == role and a.rarity_index <= 2])
+                profile["zoo"][animal.animal_id] = profile["zoo"].get(animal.animal_id, 0) + 1
+                profile["team"][slot] = animal.animal_id
+            by_guild.setdefault(self.guild_of(uid), []).append(profile)
+        for guild_id, profiles in by_guild.items():
+            token = main.current_guild.set(guild_id)
+            main.store.save_profiles(profiles)
+            for profile in profiles:
+                main.index_team(profile)
+            main.current_guild.reset(token)
+
+    async def invoke(self, name: str, interaction: FakeInteraction) -> None:
+        if name == "hunt":
+            await main.hunt.callback(interaction, self.rng.choice((5, 25, 50, 100)))
+        elif name == "battle":
+            await main.battle.callback(interaction)
+        elif name == "battle_pvp":
+            await main.battle.callback(interaction, app_commands.Choice(name="PvP", value="pvp"))
+        elif name == "balance":
+            await main.balance.callback(interaction)
+        elif name == "zoo":
+            await main.zoo.callback(interaction)
+        elif name == "sell":
+            if self.rng.random() < 0.5:
+                mode, target = app_commands.Choice(name="Rarity", value="rarity"), "common"
+            else:
+                mode, target = app_commands.Choice(name="Animal", value="animal"), self.rng.choice(["cow", "pig", "ant"])
+            await main.sell.callback(interaction, mode, target, self.rng.choice(("1", "3", "all")))
+        elif name == "sell_bulk":
+            targets = self.rng.choice(("common", "common, uncommon", "cow, pig, foods", "animals"))
+            await main.sell_bulk.callback(interaction, targets, self.rng.choice((0, 1, 5)))
+        elif name == "buy":
+            items = self.rng.choice(("honey x2", "apple, carrot x3", "bread 1, corn 2, honey", "steak x5"))
+            await main.buy.callback(interaction, items)
+        elif name == "daily":
+            await main.daily.callback(interaction)
+        elif name == "team_add":
+            await self.team_add.callback(self.team_group, interaction, self.rng.choice(["cow", "pig", "goat"]), 1)
+        elif name == "stats":
+            await main.stats.callback(interaction, self.rng.choice(list(main.catalog.aliases)))
+        elif name == "index":
+            await main.index.callback(interaction)
+        elif name == "replay":
+            await main.replay_command.callback(interaction, self.rng.randint(1, 3))
+
+    def lease(self, user_id: int):
+        # A single process needs no per-user lease; clustertest.py overrides this.
+        return contextlib.nullcontext()
+
+    async def user_session(self, user_id: int) -> None:
+        names = [name for name, _ in COMMAND_MIX]
+        weights = [weight for _, weight in COMMAND_MIX]
+        await main.enter_guild(self.guild_of(user_id))
+        for name in self.rng.choices(names, weights, k=self.commands):
+            interaction = FakeInteraction(user_id, self.guild_of(user_id))
+            started = time.perf_counter()
+            try:
+                async with self.lease(user_id):
+                    await self.invoke(name, interaction)
+            except Exception as exc:
+                self.errors[name] += 1
+                print(f"❌ {name} raised {exc!r}")
+            self.latencies[name].append(time.perf_counter() - started)
+            for text in interaction.outputs:
+                if "Battle Failed" in text:
+                    self.errors[name] += 1
+                self.reported_coin_delta += sum(int(x) for x in COINS_GAINED.findall(text))
+                self.reported_coin_delta += sum(int(x) for x in FOOD_SALE.findall(text))
+                self.reported_coin_delta -= sum(int(x) for x in COINS_SPENT.findall(text))
+                self.reported_rolls += sum(int(x) for x in ENERGY_USED.findall(text))
+            # Yield so sessions interleave the way concurrent gateway events would.
+            await asyncio.sleep(0)
+
+    async def drive(self, user_ids) -> float:
+        started = time.perf_counter()
+        await asyncio.gather(*(self.user_session(uid) for uid in user_ids))
+        return time.perf_counter() - started
+
+    def timing(self, elapsed: float) -> Dict:
+        total = sum(len(values) for values in self.latencies.values())
+        return {
+            "commands": total,
+            "elapsed_s": elapsed,
+            "throughput_per_s": total / elapsed if elapsed else 0.0,
+            "latency_ms": {
+                name: {
+                    "count": len(values),
+                    "p50": statistics.median(values) * 1000,
+                    "p99": sorted(values)[min(len(values) - 1, int(len(values) * 0.99))] * 1000,
+                }
+                for name, values in self.latencies.items()
+                if values
+            },
+            "errors": self.errors,
+        }
+
+    async def run(self) -> Dict:
+        await main.offloader.start()
+        self.seed_store()
+        bases = {store.path: json.loads(json.dumps(dict(store.data["users"]))) for store in self.stores()}
+        since = main.now()
+        coins_before = sum(p["coins"] for p in self.all_profiles())
+        hatches_before = self.hatch_total()
+        elapsed = await self.drive(range(self.users))
+
+        profiles = self.all_profiles()
+        coins_after = sum(p["coins"] for p in profiles)
+        hatches_after = self.hatch_total()
+        await main.partitions.flush()
+        ledger_mismatches = disk_mismatches = 0
+        for partition in main.partitions.opened.values():
+            store = partition.store
+            if store is None:
+                continue
+            base = bases.get(store.path, {})
+            persisted = main.DataStore(store.path, store.format).data["users"]
+            # Rebuilding every profile from the pre-run state plus the ledger must
+            # reproduce the live economy exactly.
+            replay.replay(partition.ledger.directory, base, since, float("inf"))
+            ledger_mismatches += sum(
+                1 for uid, profile in store.data["users"].items() if economy(base.get(uid, {})) != economy(profile)
+            )
+            disk_mismatches += sum(
+                1 for uid, profile in store.data["users"].items() if persisted.get(uid, {}).get("coins") != profile["coins"]
+            )
+        return {
+            "users": self.users,
+            **self.timing(elapsed),
+            "consistency": {
+                "coins_expected": coins_before + self.reported_coin_delta,
+                "coins_actual": coins_after,
+                "hatches_expected": hatches_before + self.reported_rolls,
+                "hatches_actual": hatches_after,
+                "disk_mismatches": disk_mismatches,
+                "ledger_mismatches": ledger_mismatches,
+                "negative_balances": sum(1 for p in profiles if p["coins"] < 0 or p["energy"] < 0),
+                "event_boundary_errors": event_boundary_errors(sample_schedule()) + event_boundary_errors(main.events),
+            },
+        }
+
+
+def consistent(report: Dict) -> bool:
+    checks = report["consistency"]
+    return (
+        checks["coins_expected"] == checks["coins_actual"]
+        and checks["hatches_expected"] == checks["hatches_actual"]
+        and checks["disk_mismatches"] == 0
+        and checks["ledger_mismatches"] == 0
+        and checks["negative_balances"] == 0
+        and checks["event_boundary_errors"] == 0
+    )
+
+
+# Back to back events, then a gap, so handovers are covered whatever
+# --events holds: A runs [100, 200), B [200, 300), C [400, 500).
+def sample_schedule() -> main.EventSchedule:
+    rarity = next(iter(main.catalog.sell_values))
+    data = {
+        "events": [
+            {"name": "A", "start": 100, "end": 200, "coins": 2},
+            {"name": "B", "start": 200, "end": 300, "sell": {rarity: 2}},
+            {"name": "C", "start": 400, "end": 500, "drop": {rarity: 2}},
+        ]
+    }
+    return main.EventSchedule(main.catalog, main.parse_events(data, main.catalog))
+
+
+# Drives now() across every start and end, forwards and then backwards, and
+# counts the moments where current() disagrees with the event that should be live.
+def event_boundary_errors(schedule: main.EventSchedule) -> int:
+    moments = sorted({t for e in schedule.events for t in (e.start - 0.001, e.start, (e.start + e.end) / 2, e.end - 0.001, e.end)})
+    clock, errors = main.now, 0
+    try:
+        for ts in moments + moments[::-1]:
+            main.now = lambda: ts
+            expected = next((e for e in schedule.events if e.start <= ts < e.end), None)
+            if schedule.current().event != expected:
+                print(f"❌ At {ts} the live event is {schedule.current().event}, expected {expected}")
+                errors += 1
+    finally:
+        main.now = clock
+    return errors
+
+
+def use_virtual_clock() -> None:
+    # Every call to now() jumps past the 10s hunt/battle cooldowns.
+    clock = [time.time()]
+
+    def virtual_now() -> float:
+        clock[0] += 11
+        return clock[0]
+
+    main.now = virtual_now
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--commands", type=int, default=20, help="Commands per simulated user")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--respect-cooldowns", action="store_true", help="Use the wall clock instead of skipping cooldowns")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    parser.add_argument("--offload", choices=("none", "thread", "process"), help="Offload pool kind (default: OFFLOAD_EXECUTOR)")
+    parser.add_argument("--events", help="Live event schedule to run under (default: EVENTS_PATH)")
+    parser.add_argument("--guilds", type=int, default=0, help="Spread users over this many guilds (GUILD_ECONOMY applies)")
+    args = parser.parse_args()
+    if args.offload:
+        main.offloader.kind = args.offload
+
+    if not args.respect_cooldowns:
+        use_virtual_clock()
+
+    workdir = tempfile.mkdtemp(prefix="zoo-load-")
+    try:
+        main.init_storage(os.path.join(workdir, "users.json"), os.path.join(workdir, "hatch_counts.jsonl"))
+        main.init_rng(f"loadtest-{args.seed}".encode("utf-8"))
+        if args.events:
+            main.events = main.EventSchedule.from_file(args.events, main.catalog)
+        report = asyncio.run(LoadTest(args.users, args.commands, args.seed, args.guilds).run())
+    finally:
+        main.offloader.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if consistent(report) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,17 +1,57 @@
+import argparse
+import asyncio
+import contextlib
+import cProfile
+import gzip
+import hashlib
+import hmac
+import io
 import json
+import mmap
+import multiprocessing
 import os
+import pstats
 import random
+import re
+import signal
+import struct
+import subprocess
+import sys
+import threading
 import time
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, deque
+from collections.abc import MutableMapping
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Collection, Deque, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
 
 import discord
 from discord import app_commands
 
-TOKEN = os.getenv("DISCORD_TOKEN")
+try:
+    import zstandard
+except ImportError:  # optional: gzip is used when zstandard is not installed
+    zstandard = None
+
+PROCESS_STARTED = time.perf_counter()
 
-if not TOKEN:
-    raise RuntimeError("DISCORD_TOKEN environment variable is not set!")
+TOKEN = os.getenv("DISCORD_TOKEN")
+# Set MESSAGE_CONTENT_INTENT=0 to run slash-only: the gateway stops streaming
+# message bodies and the !help / -data prefix commands are served as /help and /data.
+MESSAGE_CONTENT_INTENT = os.getenv("MESSAGE_CONTENT_INTENT", "1") != "0"
+OWNER_IDS = {int(x) for x in os.getenv("OWNER_IDS", "").split(",") if x.strip().isdigit()}
+# Set by the --workers launcher: "store" for the single-writer store process,
+# "worker" for gateway processes that each own SHARD_IDS out of SHARD_COUNT.
+ZOO_ROLE = os.getenv("ZOO_ROLE", "")
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_IDS = [int(x) for x in os.getenv("SHARD_IDS", "").split(",") if x.strip().isdigit()]
+SUPERVISOR_PID = int(os.getenv("ZOO_SUPERVISOR_PID", "0"))
 
 
 # ==============================
@@ -46,18 +86,74 @@ class Food:
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_FILE_PATH = os.path.join(BASE_DIR, "users.json")
-
+DATA_DIR = os.getenv("ZOO_DATA_DIR", BASE_DIR)
+# Animals, foods and rarity tables; reloaded in place by /reload (or SIGHUP).
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(BASE_DIR, "catalog.json"))
+# Scheduled live events (optional); reloaded together with the catalog.
+EVENTS_PATH = os.getenv("EVENTS_PATH", os.path.join(DATA_DIR, "events.json"))
+DATA_FILE_PATH = os.path.join(DATA_DIR, "users.json")
+# "json" keeps users.json as the live store; "binary" keeps a memory-mapped
+# users.snap instead and writes users.json only on export and shutdown.
+STORE_FORMAT = os.getenv("STORE_FORMAT", "json")
+HATCH_COUNTS_PATH = os.path.join(DATA_DIR, "hatch_counts.jsonl")
+RNG_SECRET_PATH = os.path.join(DATA_DIR, "rng_secret")
+BACKUP_DIR = os.path.join(DATA_DIR, "backups")
+BACKUP_COMPRESSION = os.getenv("BACKUP_COMPRESSION", "zstd" if zstandard else "gzip")
+BACKUP_INTERVAL = 3600.0
+BACKUP_FULL_EVERY = 24 * 3600.0
+BACKUP_KEEP_FULL = 3
+LEDGER_DIR = os.path.join(DATA_DIR, "ledger")
+# The files above are the default partition: DMs, plus every guild playing on
+# the global economy. A guild's own partition lives in guilds/<guild id>/ with
+# the same layout; it always holds the guild's hatch counts, and its profiles,
+# ledger and backups too once the guild runs a separate economy.
+GUILDS_DIR = os.path.join(DATA_DIR, "guilds")
+# "global" (one profile per player across guilds) or "separate" (one per guild).
+# GUILD_ECONOMY_OVERRIDES switches single guilds, e.g. "1234=separate,5678=global".
+GUILD_ECONOMY = os.getenv("GUILD_ECONOMY", "global")
+GUILD_ECONOMY_OVERRIDES = {
+    int(guild): mode.strip()
+    for guild, _, mode in (item.partition("=") for item in os.getenv("GUILD_ECONOMY_OVERRIDES", "").split(","))
+    if guild.strip()
+}
+LEDGER_SEGMENT_BYTES = 16 * 1024 * 1024
+HATCH_FLUSH_INTERVAL = 60.0
+# Width of a /battle pvp matchmaking bucket, in team power (foods included).
+PVP_POWER_BUCKET = 5.0
+# Battles kept per player for /replay (fixed when replays.bin is created).
+REPLAY_KEEP = int(os.getenv("REPLAY_KEEP", "10"))
+# Profiles untouched for this long move to their partition's cold archive
+# (users.cold) and come back on their next command; 0 keeps everyone hot.
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL = 3600.0
+# Profiles archived per run, which bounds how long a run holds the loop.
+ARCHIVE_BATCH = 10_000
+HATCH_COMPACT_LINES = 500
+STORE_SOCKET = os.getenv("STORE_SOCKET", os.path.join(DATA_DIR, "store.sock"))
+REMOTE_CACHE_USERS = 10_000
+# Each process of a cluster exports its own metrics file.
+PROCESS_TAG = {"store": "-store", "worker": "-shards" + "-".join(map(str, SHARD_IDS))}.get(ZOO_ROLE, "")
+METRICS_PATH = os.path.join(DATA_DIR, f"metrics{PROCESS_TAG}.prom")
+METRICS_EXPORT_INTERVAL = 30.0
+LOOP_LAG_INTERVAL = 0.5
+# Stall watchdog is off unless STALL_THRESHOLD_MS is set to a positive value.
+STALL_THRESHOLD = float(os.getenv("STALL_THRESHOLD_MS", "0")) / 1000
+STALL_CHECK_INTERVAL = 0.05
+STALL_REPORT_TOP = 10
+PROFILE_DEFAULT_SECONDS = 10
+PROFILE_MAX_SECONDS = 120
+PROFILE_SAMPLE_INTERVAL = 0.005
+# CPU-heavy command work can run in a "thread" or "process" pool. A command is
+# offloaded once its work units (hunt rolls, 1 per battle, 1 per /index render)
+# reach its threshold; a threshold of 0 keeps that command inline.
+OFFLOAD_EXECUTOR = os.getenv("OFFLOAD_EXECUTOR", "none")
+OFFLOAD_WORKERS = int(os.getenv("OFFLOAD_WORKERS", str(min(4, os.cpu_count() or 1))))
+OFFLOAD_THRESHOLDS = {
+    "hunt": int(os.getenv("OFFLOAD_HUNT_ROLLS", "2000")),
+    "battle": int(os.getenv("OFFLOAD_BATTLE", "0")),
+    "index": int(os.getenv("OFFLOAD_INDEX", "0")),
+}
 
-RARITY_ORDER = [
-    ("COMMON", "⚪"),
-    ("UNCOMMON", "🟢"),
-    ("RARE", "🔵"),
-    ("EPIC", "🟣"),
-    ("LEGENDARY", "🟡"),
-    ("SPECIAL", "🌈"),
-    ("HIDDEN", "⚫"),
-]
 
 ROLE_EMOJI = {
     "TANK": "🛡️",
@@ -66,193 +162,676 @@ ROLE_EMOJI = {
 }
 
 
-def build_animals() -> Dict[str, Animal]:
-    animals: List[Animal] = []
+class PrefixTrie:
+    __slots__ = ("children", "matches")
 
-    def add(
-        rarity: str,
-        rarity_index: int,
-        role: str,
-        animal_id: str,
-        emoji: str,
-        hp: int,
-        atk: int,
-        defense: int,
-        aliases: List[str],
-    ):
-        animals.append(
-            Animal(
-                animal_id=animal_id,
-                emoji=emoji,
-                rarity=rarity,
-                rarity_index=rarity_index,
-                role=role,
-                hp=hp,
-                atk=atk,
-                defense=defense,
-                aliases=aliases,
-            )
-        )
+    def __init__(self):
+        self.children: Dict[str, "PrefixTrie"] = {}
+        self.matches: List[str] = []
+
+    def insert(self, key: str, item_id: str) -> None:
+        node = self
+        if item_id not in node.matches:
+            node.matches.append(item_id)
+        for ch in key.lower():
+            node = node.children.setdefault(ch, PrefixTrie())
+            if item_id not in node.matches:
+                node.matches.append(item_id)
+
+    def lookup(self, prefix: str) -> List[str]:
+        node = self
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return node.matches
+
+
+def build_trie(items: Dict[str, List[str]]) -> PrefixTrie:
+    trie = PrefixTrie()
+    for item_id, keys in items.items():
+        for key in keys:
+            trie.insert(key, item_id)
+    return trie
 
-    rarity_map = {name: idx for idx, (name, _) in enumerate(RARITY_ORDER)}
-
-    # COMMON
-    add("COMMON", rarity_map["COMMON"], "ATTACK", "mouse", "🐁", 7, 6, 1, ["mouse", "m"])
-    add("COMMON", rarity_map["COMMON"], "ATTACK", "chicken", "🐔", 7, 5, 1, ["chicken", "chick"])
-    add("COMMON", rarity_map["COMMON"], "ATTACK", "fish", "🐟", 7, 5, 1, ["fish"])
-    add("COMMON", rarity_map["COMMON"], "TANK", "pig", "🐖", 10, 3, 3, ["pig"])
-    add("COMMON", rarity_map["COMMON"], "TANK", "cow", "🐄", 11, 3, 3, ["cow"])
-    add("COMMON", rarity_map["COMMON"], "TANK", "ram", "🐏", 9, 4, 3, ["ram"])
-    add("COMMON", rarity_map["COMMON"], "TANK", "sheep", "🐑", 9, 3, 4, ["sheep"])
-    add("COMMON", rarity_map["COMMON"], "TANK", "goat", "🐐", 8, 4, 3, ["goat"])
-    add("COMMON", rarity_map["COMMON"], "SUPPORT", "bug", "🐛", 7, 3, 3, ["bug"])
-    add("COMMON", rarity_map["COMMON"], "SUPPORT", "ant", "🐜", 6, 3, 3, ["ant"])
-    add("COMMON", rarity_map["COMMON"], "SUPPORT", "bird", "🐦", 7, 3, 3, ["bird"])
-
-    # UNCOMMON
-    add("UNCOMMON", rarity_map["UNCOMMON"], "ATTACK", "dog", "🐕", 8, 7, 2, ["dog"])
-    add("UNCOMMON", rarity_map["UNCOMMON"], "ATTACK", "cat", "🐈", 8, 7, 2, ["cat"])
-    add("UNCOMMON", rarity_map["UNCOMMON"], "ATTACK", "snake", "🐍", 8, 8, 2, ["snake"])
-    add("UNCOMMON", rarity_map["UNCOMMON"], "TANK", "horse", "🐎", 13, 4, 4, ["horse"])
-    add("UNCOMMON", rarity_map["UNCOMMON"], "TANK", "boar", "🐗", 12, 5, 4, ["boar"])
-    add("UNCOMMON", rarity_map["UNCOMMON"], "TANK", "deer", "🦌", 12, 4, 5, ["deer"])
-    add("UNCOMMON", rarity_map["UNCOMMON"], "TANK", "turtle", "🐢", 14, 2, 5, ["turtle"])
-    add("UNCOMMON", rarity_map["UNCOMMON"], "SUPPORT", "tropicalfish", "🐠", 8, 4, 4, ["tropicalfish", "tfish"])
-
-    # RARE
-    add("RARE", rarity_map["RARE"], "ATTACK", "wolf", "🐺", 9, 9, 3, ["wolf"])
-    add("RARE", rarity_map["RARE"], "ATTACK", "fox", "🦊", 9, 9, 3, ["fox"])
-    add("RARE", rarity_map["RARE"], "ATTACK", "dolphin", "🐬", 10, 8, 3, ["dolphin"])
-    add("RARE", rarity_map["RARE"], "TANK", "crocodile", "🐊", 15, 5, 6, ["crocodile", "croc"])
-    add("RARE", rarity_map["RARE"], "SUPPORT", "raccoon", "🦝", 9, 4, 5, ["raccoon"])
-    add("RARE", rarity_map["RARE"], "SUPPORT", "owl", "🦉", 9, 3, 6, ["owl"])
-    add("RARE", rarity_map["RARE"], "SUPPORT", "parrot", "🦜", 8, 4, 5, ["parrot"])
-
-    # EPIC
-    add("EPIC", rarity_map["EPIC"], "TANK", "elephant", "🐘", 18, 4, 8, ["elephant", "ele"])
-    add("EPIC", rarity_map["EPIC"], "TANK", "hippo", "🦛", 19, 4, 8, ["hippo"])
-    add("EPIC", rarity_map["EPIC"], "TANK", "llama", "🦙", 16, 5, 7, ["llama"])
-    add("EPIC", rarity_map["EPIC"], "TANK", "giraffe", "🦒", 17, 5, 7, ["giraffe"])
-    add("EPIC", rarity_map["EPIC"], "SUPPORT", "swan_epic", "🦢", 11, 4, 7, ["swan"])
-    add("EPIC", rarity_map["EPIC"], "SUPPORT", "flamingo", "🦩", 10, 5, 6, ["flamingo"])
-
-    # LEGENDARY
-    add("LEGENDARY", rarity_map["LEGENDARY"], "ATTACK", "shark", "🦈", 14, 11, 4, ["shark"])
-    add("LEGENDARY", rarity_map["LEGENDARY"], "TANK", "mammoth", "🦣", 22, 5, 9, ["mammoth"])
-    add("LEGENDARY", rarity_map["LEGENDARY"], "TANK", "seal", "🦭", 20, 6, 8, ["seal"])
-    add("LEGENDARY", rarity_map["LEGENDARY"], "TANK", "whale", "🐳", 24, 4, 10, ["whale"])
-
-    # SPECIAL
-    add("SPECIAL", rarity_map["SPECIAL"], "SUPPORT", "octopus", "🐙", 12, 5, 7, ["octopus"])
-    add("SPECIAL", rarity_map["SPECIAL"], "SUPPORT", "butterfly", "🦋", 10, 4, 6, ["butterfly"])
-
-    # HIDDEN
-    add("HIDDEN", rarity_map["HIDDEN"], "ATTACK", "dragon", "🐉", 16, 13, 5, ["dragon"])
-    add("HIDDEN", rarity_map["HIDDEN"], "TANK", "trex", "🦖", 25, 7, 10, ["trex", "t-rex"])
-    add("HIDDEN", rarity_map["HIDDEN"], "SUPPORT", "unicorn", "🦄", 14, 6, 8, ["unicorn"])
-
-    return {a.animal_id: a for a in animals}
-
-
-ANIMALS = build_animals()
-LORE = {a.animal_id: f"Stories say the {a.animal_id.replace('_', ' ')} thrives in distant lands." for a in ANIMALS.values()}
-ALIASES: Dict[str, str] = {}
-for animal in ANIMALS.values():
-    for alias in animal.aliases + [animal.emoji]:
-        ALIASES[alias] = animal.animal_id
-
-
-def build_foods() -> Dict[str, Food]:
-    foods: List[Food] = []
-
-    def add(
-        food_id: str,
-        emoji: str,
-        rarity: str,
-        cost: int,
-        hp_bonus: int,
-        atk_bonus: int,
-        def_bonus: int,
-        ability: str,
-        aliases: List[str],
-    ):
-        foods.append(
-            Food(
-                food_id=food_id,
-                emoji=emoji,
-                rarity=rarity,
-                cost=cost,
-                hp_bonus=hp_bonus,
-                atk_bonus=atk_bonus,
-                def_bonus=def_bonus,
-                ability=ability,
-                aliases=aliases,
+
+def power(animal: Animal) -> float:
+    return animal.hp * 1.0 + animal.atk * 1.5 + animal.defense * 1.2
+
+
+def index_window(center: int, count: int) -> Tuple[int, ...]:
+    return tuple(idx for idx in (center - 1, center, center + 1) if 0 <= idx < count)
+
+
+# Everything derived from catalog.json, compiled once per load. Commands read
+# the module-level `catalog` once and keep that object for their whole run, so
+# a reload (one rebinding of `catalog`) never mixes two versions mid-hunt or
+# mid-battle. Treat every field as read-only.
+@dataclass(frozen=True)
+class Catalog:
+    version: str
+    data: Dict
+    rarity_order: Tuple[Tuple[str, str], ...]
+    rarity_symbols: Mapping[str, str]
+    animals: Mapping[str, Animal]
+    foods: Mapping[str, Food]
+    aliases: Mapping[str, str]
+    food_aliases: Mapping[str, str]
+    lore: Mapping[str, str]
+    drop_table: Tuple[Tuple[float, str], ...]
+    sell_values: Mapping[str, int]
+    rarity_pools: Mapping[str, Tuple[Animal, ...]]
+    drop_rarities: Tuple[str, ...]
+    drop_cum_weights: Tuple[float, ...]
+    powers: Mapping[str, float]
+    # (role, rarity window) -> enemy candidates, in catalog order.
+    enemy_pools: Mapping[Tuple[str, Tuple[int, ...]], Tuple[Animal, ...]]
+    animal_trie: PrefixTrie
+    food_trie: PrefixTrie
+    # Set on live-event overlays (apply_event) only.
+    coin_multiplier: float = 1.0
+    event: Optional["LiveEvent"] = None
+    base: Optional["Catalog"] = None
+
+    def __reduce__(self):
+        # Offload jobs ship the catalog by version; pool workers already hold
+        # it, and rebuild an event overlay from its base once.
+        if self.event is not None:
+            return apply_event, (self.base, self.event)
+        return catalog_by_version, (self.version,)
+
+
+def is_count(value, minimum: int = 0) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value >= minimum
+
+
+def validate_catalog(data: Dict) -> List[str]:
+    problems: List[str] = []
+    rarities = data.get("rarities")
+    if not isinstance(rarities, list) or not rarities:
+        return ["rarities: expected a non-empty list"]
+    names = [r.get("name") for r in rarities]
+    if len(set(names)) != len(names):
+        problems.append("rarities: duplicate names")
+    for r in rarities:
+        if not isinstance(r.get("drop_chance"), (int, float)) or r["drop_chance"] < 0:
+            problems.append(f"rarity {r.get('name')}: drop_chance must be >= 0")
+        if not is_count(r.get("sell_value")):
+            problems.append(f"rarity {r.get('name')}: sell_value must be an int >= 0")
+    if not problems and abs(sum(r["drop_chance"] for r in rarities) - 100.0) > 1e-6:
+        problems.append("rarities: drop chances must add up to 100")
+
+    for key, stats in (("animals", ("hp", "atk", "def")), ("foods", ("cost", "hp", "atk", "def"))):
+        entries = data.get(key)
+        if not isinstance(entries, list) or not entries:
+            problems.append(f"{key}: expected a non-empty list")
+            continue
+        seen: Set[str] = set()
+        alias_owner: Dict[str, str] = {}
+        for entry in entries:
+            item_id = entry.get("id")
+            if not isinstance(item_id, str) or not item_id or item_id in seen:
+                problems.append(f"{key}: missing or duplicate id {item_id!r}")
+                continue
+            seen.add(item_id)
+            if entry.get("rarity") not in names:
+                problems.append(f"{item_id}: unknown rarity {entry.get('rarity')!r}")
+            if key == "animals" and entry.get("role") not in ROLE_EMOJI:
+                problems.append(f"{item_id}: unknown role {entry.get('role')!r}")
+            for stat in stats:
+                if not is_count(entry.get(stat), 1 if stat == "hp" and key == "animals" else 0):
+                    problems.append(f"{item_id}: {stat} must be a non-negative int")
+            if not isinstance(entry.get("emoji"), str) or not entry["emoji"]:
+                problems.append(f"{item_id}: missing emoji")
+            aliases = entry.get("aliases")
+            if not isinstance(aliases, list) or not aliases or not all(isinstance(a, str) and a for a in aliases):
+                problems.append(f"{item_id}: aliases must be a non-empty list of strings")
+                continue
+            for alias in aliases:
+                owner = alias_owner.setdefault(alias.lower(), item_id)
+                if owner != item_id:
+                    problems.append(f"{item_id}: alias {alias!r} already belongs to {owner}")
+    if problems:
+        return problems
+
+    # Hunts must be able to land every rarity they can roll, and an enemy team
+    # must exist for every team a player can field.
+    for r in rarities:
+        if r["drop_chance"] > 0 and not any(a["rarity"] == r["name"] for a in data["animals"]):
+            problems.append(f"rarity {r['name']}: has a drop chance but no animals")
+    rank = {name: idx for idx, name in enumerate(names)}
+    for center in range(len(names)):
+        window = index_window(center, len(names))
+        for role in ROLE_EMOJI:
+            if not any(a["role"] == role and rank[a["rarity"]] in window for a in data["animals"]):
+                problems.append(f"no {role} enemy for rarity window {[names[idx] for idx in window]}")
+    return problems
+
+
+def compile_catalog(data: Dict) -> Catalog:
+    problems = validate_catalog(data)
+    if problems:
+        raise ValueError("Invalid catalog:\n" + "\n".join(problems[:20]))
+    rarity_order = tuple((r["name"], r["emoji"]) for r in data["rarities"])
+    rank = {name: idx for idx, (name, _) in enumerate(rarity_order)}
+    animals = {
+        a["id"]: Animal(a["id"], a["emoji"], a["rarity"], rank[a["rarity"]], a["role"], a["hp"], a["atk"], a["def"], list(a["aliases"]))
+        for a in data["animals"]
+    }
+    foods = {
+        f["id"]: Food(f["id"], f["emoji"], f["rarity"], f["cost"], f["hp"], f["atk"], f["def"], f["ability"], list(f["aliases"]))
+        for f in data["foods"]
+    }
+    aliases: Dict[str, str] = {}
+    for animal in animals.values():
+        for alias in animal.aliases + [animal.emoji]:
+            aliases[alias] = animal.animal_id
+    food_aliases: Dict[str, str] = {}
+    for food in foods.values():
+        for alias in food.aliases + [food.emoji]:
+            food_aliases[alias] = food.food_id
+    lore = {
+        a["id"]: a.get("lore") or f"Stories say the {a['id'].replace('_', ' ')} thrives in distant lands." for a in data["animals"]
+    }
+    drop_table = tuple((float(r["drop_chance"]), r["name"]) for r in data["rarities"])
+    enemy_pools = {}
+    for center in range(len(rarity_order)):
+        window = index_window(center, len(rarity_order))
+        for role in ROLE_EMOJI:
+            enemy_pools[(role, window)] = tuple(a for a in animals.values() if a.role == role and a.rarity_index in window)
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return Catalog(
+        version=hashlib.sha256(canonical).hexdigest()[:12],
+        data=data,
+        rarity_order=rarity_order,
+        rarity_symbols=MappingProxyType(dict(rarity_order)),
+        animals=MappingProxyType(animals),
+        foods=MappingProxyType(foods),
+        aliases=MappingProxyType(aliases),
+        food_aliases=MappingProxyType(food_aliases),
+        lore=MappingProxyType(lore),
+        drop_table=drop_table,
+        sell_values=MappingProxyType({r["name"]: r["sell_value"] for r in data["rarities"]}),
+        rarity_pools=MappingProxyType(
+            {rarity: tuple(a for a in animals.values() if a.rarity == rarity) for rarity, _ in rarity_order}
+        ),
+        drop_rarities=tuple(rarity for _, rarity in drop_table),
+        drop_cum_weights=tuple(sum(chance for chance, _ in drop_table[: idx + 1]) for idx in range(len(drop_table))),
+        powers=MappingProxyType({animal_id: power(animal) for animal_id, animal in animals.items()}),
+        enemy_pools=MappingProxyType(enemy_pools),
+        animal_trie=build_trie({a.animal_id: [a.animal_id, a.emoji] + a.aliases for a in animals.values()}),
+        food_trie=build_trie({f.food_id: [f.food_id, f.emoji] + f.aliases for f in foods.values()}),
+    )
+
+
+def load_catalog(path: str = CATALOG_PATH) -> Catalog:
+    with open(path, "r", encoding="utf-8") as f:
+        return compile_catalog(json.load(f))
+
+
+# Every version loaded by this process, so offload jobs can name theirs.
+CATALOG_VERSIONS: Dict[str, Catalog] = {}
+
+
+def catalog_by_version(version: str) -> Catalog:
+    return CATALOG_VERSIONS[version]
+
+
+def install_catalog(new: Catalog) -> None:
+    global catalog
+    CATALOG_VERSIONS[new.version] = new
+    catalog = new
+
+
+catalog: Catalog
+install_catalog(load_catalog())
+
+
+# ==============================
+# Live events
+# ==============================
+
+
+def parse_timestamp(value) -> float:
+    # Unix seconds or ISO 8601 (UTC when no offset is given).
+    try:
+        return float(value)
+    except ValueError:
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.timestamp()
+
+
+# A time-boxed overlay on the catalog: per-rarity multipliers for drop chances
+# (renormalized to 100) and sell values, and a battle coin multiplier.
+@dataclass(frozen=True)
+class LiveEvent:
+    name: str
+    start: float
+    end: float
+    drop: Tuple[Tuple[str, float], ...] = ()
+    sell: Tuple[Tuple[str, float], ...] = ()
+    coins: float = 1.0
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{int(self.start)}"
+
+
+def apply_event(base: Catalog, event: LiveEvent) -> Catalog:
+    version = f"{base.version}+{event.key}"
+    if version in CATALOG_VERSIONS:
+        return CATALOG_VERSIONS[version]
+    drop, sell = dict(event.drop), dict(event.sell)
+    weighted = [(chance * drop.get(rarity, 1.0), rarity) for chance, rarity in base.drop_table]
+    scale = 100.0 / sum(chance for chance, _ in weighted)
+    drop_table = tuple((chance * scale, rarity) for chance, rarity in weighted)
+    derived = replace(
+        base,
+        version=version,
+        drop_table=drop_table,
+        drop_cum_weights=tuple(sum(chance for chance, _ in drop_table[: idx + 1]) for idx in range(len(drop_table))),
+        sell_values=MappingProxyType({r: round(value * sell.get(r, 1.0)) for r, value in base.sell_values.items()}),
+        coin_multiplier=event.coins,
+        event=event,
+        base=base,
+    )
+    CATALOG_VERSIONS[version] = derived
+    return derived
+
+
+def parse_events(data: Dict, base: Catalog) -> List[LiveEvent]:
+    problems: List[str] = []
+    parsed: List[LiveEvent] = []
+    for entry in data.get("events", []):
+        name = entry.get("name") or "?"
+        try:
+            start, end = parse_timestamp(entry["start"]), parse_timestamp(entry["end"])
+        except (KeyError, TypeError, ValueError):
+            problems.append(f"{name}: start and end must be Unix seconds or ISO 8601")
+            continue
+        if end <= start:
+            problems.append(f"{name}: ends before it starts")
+        # Only factors that pass are kept, so a bad one is reported with the
+        # rest instead of failing on its own.
+        factors: Dict[str, Tuple[Tuple[str, float], ...]] = {}
+        for key in ("drop", "sell"):
+            table = entry.get(key, {})
+            if not isinstance(table, dict):
+                problems.append(f"{name}: {key} must map rarities to multipliers")
+                table = {}
+            valid = []
+            for rarity, factor in table.items():
+                if rarity not in base.sell_values:
+                    problems.append(f"{name}: unknown rarity {rarity!r} in {key}")
+                elif not isinstance(factor, (int, float)) or factor < 0:
+                    problems.append(f"{name}: {key} multiplier for {rarity} must be >= 0")
+                else:
+                    valid.append((rarity, float(factor)))
+            factors[key] = tuple(sorted(valid))
+        coins = entry.get("coins", 1.0)
+        if not isinstance(coins, (int, float)) or coins < 0:
+            problems.append(f"{name}: coins multiplier must be >= 0")
+            coins = 1.0
+        drop = factors["drop"]
+        if drop and not any(chance * dict(drop).get(r, 1.0) for chance, r in base.drop_table):
+            problems.append(f"{name}: drop multipliers leave nothing to roll")
+        parsed.append(LiveEvent(name, start, end, drop, factors["sell"], float(coins)))
+    parsed.sort(key=lambda event: event.start)
+    for previous, event in zip(parsed, parsed[1:]):
+        if event.start < previous.end:
+            problems.append(f"{event.name}: overlaps {previous.name}")
+    if problems:
+        raise ValueError("Invalid events:\n" + "\n".join(problems[:20]))
+    return parsed
+
+
+# The catalog in effect at each moment. Every overlay is compiled when the
+# schedule is built, so going live is only a pointer switch. current() costs
+# one now() and one range check until the next boundary passes.
+class EventSchedule:
+    def __init__(self, base: Catalog, events: List[LiveEvent]):
+        self.events = events
+        self.times: List[float] = []
+        self.catalogs: List[Catalog] = [base]
+        for event in events:
+            if self.times and self.times[-1] == event.start:
+                # Back to back: the next event replaces the gap.
+                self.catalogs[-1] = apply_event(base, event)
+            else:
+                self.times.append(event.start)
+                self.catalogs.append(apply_event(base, event))
+            self.times.append(event.end)
+            self.catalogs.append(base)
+        self.active = base
+        self.active_from = self.active_until = 0.0
+
+    @classmethod
+    def from_file(cls, path: str, base: Catalog) -> "EventSchedule":
+        if not os.path.exists(path):
+            return cls(base, [])
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(base, parse_events(json.load(f), base))
+
+    def current(self) -> Catalog:
+        ts = now()
+        if not self.active_from <= ts < self.active_until:
+            self._seek(ts)
+        return self.active
+
+    def _seek(self, ts: float) -> None:
+        idx = bisect_right(self.times, ts)
+        self.active = self.catalogs[idx]
+        self.active_from = self.times[idx - 1] if idx else float("-inf")
+        self.active_until = self.times[idx] if idx < len(self.times) else float("inf")
+        metrics.set("zoo_event_active", 1 if self.active.event else 0)
+
+    def upcoming(self) -> List[LiveEvent]:
+        ts = now()
+        return [event for event in self.events if event.end > ts]
+
+
+events = EventSchedule.from_file(EVENTS_PATH, catalog)
+EVENT_CHECK_INTERVAL = 60.0
+
+
+# Commands switch on their own through events.current(); this loop only
+# announces starts and ends and keeps the gauge right when nobody is playing.
+async def live_event_loop() -> None:
+    announced: Optional[LiveEvent] = None
+    while True:
+        active = events.current().event
+        if active != announced:
+            print(f"🎉 Live event started: {active.name}" if active else f"🎉 Live event ended: {announced.name}")
+            announced = active
+        await asyncio.sleep(min(EVENT_CHECK_INTERVAL, max(0.05, events.active_until - now())))
+
+
+# ==============================
+# Metrics
+# ==============================
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation.
+        rank = q * self.count
+        seen = 0
+        for idx, amount in enumerate(self.counts):
+            seen += amount
+            if seen >= rank and amount:
+                return LATENCY_BUCKETS[min(idx, len(LATENCY_BUCKETS) - 1)]
+        return 0.0
+
+
+# Histograms are keyed by (metric name, preformatted Prometheus label string).
+class Metrics:
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+
+    def observe(self, name: str, value: float, labels: str = "") -> None:
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1.0) -> None:
+        self.counters[name] = self.counters.get(name, 0.0) + amount
+
+    def set(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def render(self) -> str:
+        lines: List[str] = []
+        typed = set()
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, amount in zip(LATENCY_BUCKETS, histogram.counts):
+                cumulative += amount
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {histogram.total}")
+            lines.append(f"{name}_count{suffix} {histogram.count}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+        for name, value in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str = METRICS_PATH) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def summary(self) -> List[str]:
+        lines: List[str] = []
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if not histogram.count:
+                continue
+            label = labels.split('"')[1] if labels else name.replace("zoo_", "").replace("_seconds", "")
+            lines.append(
+                f"{label}: n={histogram.count} avg={histogram.total / histogram.count * 1000:.2f}ms "
+                f"p50≤{histogram.quantile(0.5) * 1000:g}ms p99≤{histogram.quantile(0.99) * 1000:g}ms"
             )
-        )
+        return lines
 
-    add("apple", "🍎", "COMMON", 10, 2, 0, 0, "Sweet heal boosts HP slightly.", ["apple"])
-    add("carrot", "🥕", "COMMON", 10, 1, 1, 0, "Crunchy bite adds small ATK.", ["carrot"])
-    add("berry", "🫐", "COMMON", 12, 0, 1, 1, "Balanced snack for nimble critters.", ["berry"])
-    add("bread", "🍞", "COMMON", 15, 2, 0, 1, "Comfort food with light defense.", ["bread"])
-    add("corn", "🌽", "COMMON", 15, 1, 2, 0, "Energy burst improves strikes.", ["corn"])
-
-    add("honey", "🍯", "UNCOMMON", 30, 3, 1, 1, "Sticky glaze toughens hides.", ["honey"])
-    add("seaweed", "🪸", "UNCOMMON", 35, 2, 2, 1, "Ocean greens steady the mind.", ["seaweed", "kelp"])
-    add("mushroom", "🍄", "UNCOMMON", 35, 1, 2, 2, "Forest spores sharpen senses.", ["mushroom", "shroom"])
-    add("coconut", "🥥", "UNCOMMON", 40, 4, 0, 2, "Hard shell blocks blows.", ["coconut"])
-
-    add("sushi", "🍣", "RARE", 80, 3, 4, 2, "Fresh cuts fuel precision strikes.", ["sushi"])
-    add("cheese", "🧀", "RARE", 75, 5, 2, 1, "Rich flavor fortifies bodies.", ["cheese"])
-    add("pepper", "🌶️", "RARE", 85, 0, 6, 1, "Spicy heat ignites fury.", ["pepper", "chili"])
-    add("egg", "🥚", "RARE", 80, 4, 2, 2, "Protein pack grows resilient shells.", ["egg"])
-
-    add("steak", "🥩", "EPIC", 200, 6, 6, 2, "Prime cut empowers champions.", ["steak"])
-    add("ramen", "🍜", "EPIC", 210, 4, 5, 4, "Hearty bowl restores focus.", ["ramen", "noodles"])
-    add("salmon", "🍣", "EPIC", 220, 5, 5, 3, "Omega boost sharpens instincts.", ["salmon"])
-    add("truffle", "🍄", "EPIC", 230, 3, 6, 5, "Rare aroma inspires bravery.", ["truffle"])
-
-    add("golden_apple", "🍏", "LEGENDARY", 500, 10, 6, 6, "Mythic fruit renews life.", ["gapple", "goldapple"])
-    add("phoenix_pepper", "🪽", "LEGENDARY", 520, 4, 12, 4, "Flame-kissed spice scorches foes.", ["phoenixpepper", "firepepper"])
-    add("royal_honey", "🍯", "LEGENDARY", 510, 8, 5, 8, "Regal nectar hardens armor.", ["royalhoney"])
-
-    add("stardust", "✨", "SPECIAL", 900, 12, 10, 10, "Falling star radiance empowers all stats.", ["stardust"])
-    add("moon_berry", "🌙", "SPECIAL", 880, 14, 8, 8, "Night bloom calms and heals.", ["moonberry"])
-
-    add("dragons_feast", "🍖", "HIDDEN", 1500, 16, 16, 12, "Legendary banquet awakens ancient power.", ["dragonfeast", "dfeast"])
-    add("unicorn_cake", "🍰", "HIDDEN", 1550, 14, 12, 14, "Shimmering icing shields allies.", ["unicorncake", "ucake"])
-    add("abyssal_ink", "🪶", "HIDDEN", 1600, 12, 18, 10, "Void ink sharpens lethal focus.", ["ink", "abyssalink"])
-
-    add("ancient_seed", "🪴", "SPECIAL", 950, 18, 6, 12, "Grows protective vines mid-battle.", ["ancientseed", "seed"])
-
-    return {f.food_id: f for f in foods}
-
-
-FOODS = build_foods()
-FOOD_ALIASES: Dict[str, str] = {}
-for food in FOODS.values():
-    for alias in food.aliases + [food.emoji]:
-        FOOD_ALIASES[alias] = food.food_id
-
-
-DROP_TABLE: List[Tuple[float, str]] = [
-    (62.0, "COMMON"),
-    (24.0, "UNCOMMON"),
-    (9.0, "RARE"),
-    (3.0, "EPIC"),
-    (1.2, "LEGENDARY"),
-    (0.5, "SPECIAL"),
-    (0.3, "HIDDEN"),
-]
-
-RARITY_SELL_VALUE = {
-    "COMMON": 1,
-    "UNCOMMON": 3,
-    "RARE": 8,
-    "EPIC": 20,
-    "LEGENDARY": 60,
-    "SPECIAL": 120,
-    "HIDDEN": 250,
-}
+
+metrics = Metrics()
+
+
+async def metrics_export_loop() -> None:
+    while True:
+        await asyncio.sleep(METRICS_EXPORT_INTERVAL)
+        try:
+            metrics.export()
+        except OSError as exc:
+            print(f"❌ Metrics export failed: {exc}")
+
+
+async def loop_lag_monitor() -> None:
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        metrics.observe("zoo_event_loop_lag_seconds", max(0.0, time.perf_counter() - started - LOOP_LAG_INTERVAL))
+
+
+# Startup runs as timed phases: login, then store load and command sync in the
+# background while the gateway connects. Interactions that arrive before the
+# store is loaded get a short "warming up" reply.
+class Startup:
+    def __init__(self):
+        self.ready = False
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, name: str) -> None:
+        elapsed = time.perf_counter() - PROCESS_STARTED
+        metrics.set(f"zoo_startup_{name}_at_seconds", elapsed)
+        print(f"⏱️ {name} at {elapsed * 1000:.0f}ms since process start")
+
+    async def phase(self, name: str, awaitable):
+        started = time.perf_counter()
+        result = await awaitable
+        duration = time.perf_counter() - started
+        self.phases[name] = duration
+        metrics.set(f"zoo_startup_{name}_seconds", duration)
+        print(f"⏱️ {name} took {duration * 1000:.0f}ms")
+        return result
+
+
+startup = Startup()
+
+
+# Code objects of command callbacks and prefix handlers, filled in setup_hook, so
+# a sampled stack can be tagged with the command that was running.
+COMMAND_CODES: Dict[object, str] = {}
+
+
+def register_command_codes(tree: app_commands.CommandTree) -> None:
+    for command in tree.walk_commands():
+        if isinstance(command, app_commands.Command):
+            COMMAND_CODES[command.callback.__code__] = command.qualified_name
+    for prefix, handler in PREFIX_ROUTES.items():
+        COMMAND_CODES.setdefault(handler.__code__, "!help" if handler is prefix_help else prefix)
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"
+
+
+def command_for_frame(frame) -> str:
+    while frame is not None:
+        name = COMMAND_CODES.get(frame.f_code)
+        if name:
+            return name
+        frame = frame.f_back
+    return "idle"
+
+
+# A coroutine on the loop bumps a heartbeat; a daemon thread notices when the
+# heartbeat goes stale and samples the loop thread's stack while it is still
+# blocked. Stalls are keyed by (command, innermost repo frame) and accumulated.
+class StallWatchdog:
+    def __init__(self, threshold: float, interval: float = STALL_CHECK_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.heartbeat = time.perf_counter()
+        self.loop_thread_id: Optional[int] = None
+        # key -> [stalls, total seconds, worst seconds]
+        self.stalls: Dict[Tuple[str, str], List[float]] = {}
+        self._current: Optional[Tuple[float, Tuple[str, str], float]] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        self.loop_thread_id = threading.get_ident()
+        asyncio.get_running_loop().create_task(self._beat())
+        threading.Thread(target=self._watch, name="stall-watchdog", daemon=True).start()
+
+    async def _beat(self) -> None:
+        while True:
+            self.heartbeat = time.perf_counter()
+            await asyncio.sleep(self.interval)
+
+    def _attribute(self, frame) -> Tuple[str, str]:
+        command = command_for_frame(frame)
+        innermost = frame_label(frame) if frame is not None else "unknown"
+        while frame is not None and not frame.f_code.co_filename.startswith(BASE_DIR):
+            frame = frame.f_back
+        return command, frame_label(frame) if frame is not None else innermost
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            beat = self.heartbeat
+            lag = time.perf_counter() - beat - self.interval
+            if lag < self.threshold:
+                self._current = None
+                continue
+            if self._current and self._current[0] == beat:
+                # Same stall still in progress: extend its duration rather than counting it twice.
+                _, key, previous = self._current
+                self._current = (beat, key, lag)
+                self._record(key, lag - previous, lag, new=False)
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            key = self._attribute(frame)
+            self._current = (beat, key, lag)
+            self._record(key, lag, lag, new=True)
+
+    def _record(self, key: Tuple[str, str], added: float, lag: float, new: bool) -> None:
+        with self._lock:
+            entry = self.stalls.setdefault(key, [0, 0.0, 0.0])
+            if new:
+                entry[0] += 1
+            entry[1] += added
+            entry[2] = max(entry[2], lag)
+
+    def report(self, top: int = STALL_REPORT_TOP) -> List[str]:
+        with self._lock:
+            ranked = sorted(self.stalls.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        return [
+            f"{command} → {blocker}: {int(count)}x total={total * 1000:.0f}ms worst={worst * 1000:.0f}ms"
+            for (command, blocker), (count, total, worst) in ranked
+        ]
+
+
+stall_watchdog = StallWatchdog(STALL_THRESHOLD) if STALL_THRESHOLD > 0 else None
+
+
+# Nothing runs between sessions; a session is one sampler thread (or one
+# cProfile hook on the loop thread) that exists only for its duration.
+class ProfilerSession:
+    active = False
+
+    @staticmethod
+    def sample(thread_id: int, seconds: float, interval: float = PROFILE_SAMPLE_INTERVAL) -> bytes:
+        stacks: Counter = Counter()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                command = command_for_frame(frame)
+                names: List[str] = []
+                while frame is not None:
+                    names.append(frame.f_code.co_name + " (" + os.path.basename(frame.f_code.co_filename) + ")")
+                    frame = frame.f_back
+                stacks[command + ";" + ";".join(reversed(names))] += 1
+            time.sleep(interval)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()).encode("utf-8")
+
+    @staticmethod
+    async def run(seconds: float, mode: str) -> Tuple[str, bytes]:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+            buffer = io.StringIO()
+            pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(60)
+            return f"profile-{stamp}.txt", buffer.getvalue().encode("utf-8")
+        data = await asyncio.to_thread(ProfilerSession.sample, threading.get_ident(), seconds)
+        return f"profile-{stamp}.collapsed", data
+
+
+def parse_profile_args(content: str) -> Tuple[float, str]:
+    seconds: float = PROFILE_DEFAULT_SECONDS
+    mode = "sample"
+    for part in content.split()[1:]:
+        if part.isdigit():
+            seconds = min(PROFILE_MAX_SECONDS, max(1, int(part)))
+        elif part in ("sample", "cprofile"):
+            mode = part
+    return seconds, mode
 
 
 # ==============================
@@ -260,17 +839,525 @@ RARITY_SELL_VALUE = {
 # ==============================
 
 
+SNAPSHOT_MAGIC = b"ZOOSNAP1"
+SNAPSHOT_NO_SLOT = 0xFF
+SLOT_KEYS = ("slot1", "slot2", "slot3")
+# Layout 2 added the daily cooldown and the hunt/battle RNG counters and seeds.
+# Layout 1 snapshots (no "layout" in the header) are still read.
+SNAPSHOT_LAYOUT = 2
+SNAPSHOT_RNG_COMMANDS = ("hunt", "battle")
+# Presence bits for the layout 2 fields, so a missing key stays missing:
+# bit 0 the daily cooldown, bits 1-2 the counters and bits 3-4 the seeds, by command.
+SNAPSHOT_HAS_DAILY = 1
+# Fields with a fixed-width encoding; anything else in a profile (or a core value
+# the layout cannot represent) is kept verbatim in the record's JSON extras.
+SNAPSHOT_CORE_KEYS = frozenset(
+    (
+        "user_id", "coins", "energy", "zoo", "team", "foods", "equipped_foods", "equipped_food_wins", "cooldowns",
+        "last_enemy_signature", "rng_counters", "last_seeds",
+    )
+)
+
+
+def fits_u32(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value < 2**32
+
+
+def fits_u64(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value < 2**64
+
+
+# Binary snapshot layout:
+#   magic | u32 header length | JSON header (catalog id order, layout, count) |
+#   fixed-width records | JSON extras blobs
+# Animal and food ids are stored as ordinals into the header's id lists, so a
+# snapshot stays readable after the catalog changes. Only the current layout
+# is written.
+class SnapshotCodec:
+    def __init__(self, animal_ids: List[str], food_ids: List[str], layout: int = SNAPSHOT_LAYOUT):
+        self.animal_ids = list(animal_ids)
+        self.food_ids = list(food_ids)
+        self.layout = layout
+        self.animal_index = {animal_id: idx for idx, animal_id in enumerate(self.animal_ids)}
+        self.food_index = {food_id: idx for idx, food_id in enumerate(self.food_ids)}
+        a, f = len(self.animal_ids), len(self.food_ids)
+        if layout == 1:
+            self.record = struct.Struct(f"<Qqq{a}I{f}I3B3B3I2d3BII")
+        else:
+            # ... | cooldowns hunt, battle, daily | signature | presence | counters | seeds | extras
+            self.record = struct.Struct(f"<Qqq{a}I{f}I3B3B3I3d3BB2I2QII")
+
+    @classmethod
+    def for_catalog(cls) -> "SnapshotCodec":
+        return cls(list(catalog.animals), list(catalog.foods))
+
+    def same_layout(self, other: "SnapshotCodec") -> bool:
+        return self.layout == other.layout and self.animal_ids == other.animal_ids and self.food_ids == other.food_ids
+
+    def _slots(self, mapping, index: Dict[str, int]) -> Optional[List[int]]:
+        if not isinstance(mapping, dict) or set(mapping) - set(SLOT_KEYS):
+            return None
+        values = []
+        for slot in SLOT_KEYS:
+            value = mapping.get(slot)
+            if value is None:
+                values.append(SNAPSHOT_NO_SLOT)
+            elif value in index:
+                values.append(index[value])
+            else:
+                return None
+        return values
+
+    def _counts(self, counts: Dict, index: Dict[str, int], extras: Dict, key: str) -> List[int]:
+        values = [0] * len(index)
+        unknown = {}
+        for item_id, amount in counts.items():
+            idx = index.get(item_id)
+            if idx is None or not fits_u32(amount):
+                unknown[item_id] = amount
+            else:
+                values[idx] = amount
+        if unknown:
+            extras[key] = unknown
+        return values
+
+    def encode(self, profile: Dict) -> Tuple[List, bytes]:
+        extras = {key: value for key, value in profile.items() if key not in SNAPSHOT_CORE_KEYS}
+        values: List = [int(profile["user_id"])]
+        for key in ("coins", "energy"):
+            amount = profile.get(key, 0)
+            if isinstance(amount, int) and -(2**63) <= amount < 2**63:
+                values.append(amount)
+            else:
+                values.append(0)
+                extras[key] = amount
+        values += self._counts(profile.get("zoo", {}), self.animal_index, extras, "zoo")
+        values += self._counts(profile.get("foods", {}), self.food_index, extras, "foods")
+        for key, index in (("team", self.animal_index), ("equipped_foods", self.food_index)):
+            slots = self._slots(profile.get(key, {}), index)
+            if slots is None:
+                extras[key] = profile[key]
+                slots = [SNAPSHOT_NO_SLOT] * 3
+            values += slots
+        wins = profile.get("equipped_food_wins", {})
+        if isinstance(wins, dict) and not set(wins) - set(SLOT_KEYS) and all(fits_u32(wins.get(s, 0)) for s in SLOT_KEYS):
+            values += [wins.get(slot, 0) for slot in SLOT_KEYS]
+        else:
+            extras["equipped_food_wins"] = wins
+            values += [0, 0, 0]
+        present = 0
+        cooldowns = profile.get("cooldowns", {})
+        if isinstance(cooldowns, dict) and set(cooldowns) <= {"hunt", "battle", "daily"}:
+            values += [float(cooldowns.get(key, 0.0)) for key in ("hunt", "battle", "daily")]
+            present |= SNAPSHOT_HAS_DAILY if "daily" in cooldowns else 0
+        else:
+            extras["cooldowns"] = cooldowns
+            values += [0.0, 0.0, 0.0]
+        signature = profile.get("last_enemy_signature")
+        parts = signature.split("|") if isinstance(signature, str) else []
+        if signature is None:
+            values += [SNAPSHOT_NO_SLOT] * 3
+        elif len(parts) == 3 and all(part in self.animal_index for part in parts):
+            values += [self.animal_index[part] for part in parts]
+        else:
+            extras["last_enemy_signature"] = signature
+            values += [SNAPSHOT_NO_SLOT] * 3
+        rng: List[int] = []
+        for key, shift, fits in (("rng_counters", 1, fits_u32), ("last_seeds", 3, fits_u64)):
+            mapping = profile.get(key)
+            if key not in profile:
+                rng += [0, 0]
+            elif (
+                isinstance(mapping, dict)
+                and mapping
+                and set(mapping) <= set(SNAPSHOT_RNG_COMMANDS)
+                and all(map(fits, mapping.values()))
+            ):
+                for bit, command in enumerate(SNAPSHOT_RNG_COMMANDS):
+                    present |= (1 << (shift + bit)) if command in mapping else 0
+                    rng.append(mapping.get(command, 0))
+            else:
+                extras[key] = mapping
+                rng += [0, 0]
+        values += [present] + rng
+        blob = json.dumps(extras, separators=(",", ":")).encode("utf-8") if extras else b""
+        return values, blob
+
+    def decode(self, record: bytes, extras_blob: bytes) -> Dict:
+        values = self.record.unpack(record)
+        a, f = len(self.animal_ids), len(self.food_ids)
+        pos = 3
+        zoo = {self.animal_ids[i]: n for i, n in enumerate(values[pos : pos + a]) if n}
+        pos += a
+        foods = {self.food_ids[i]: n for i, n in enumerate(values[pos : pos + f]) if n}
+        pos += f
+        team = {s: None if v == SNAPSHOT_NO_SLOT else self.animal_ids[v] for s, v in zip(SLOT_KEYS, values[pos : pos + 3])}
+        pos += 3
+        equipped = {s: None if v == SNAPSHOT_NO_SLOT else self.food_ids[v] for s, v in zip(SLOT_KEYS, values[pos : pos + 3])}
+        pos += 3
+        wins = dict(zip(SLOT_KEYS, values[pos : pos + 3]))
+        pos += 3
+        cooldowns = {"hunt": values[pos], "battle": values[pos + 1]}
+        daily = values[pos + 2] if self.layout > 1 else None
+        pos += 2 if self.layout == 1 else 3
+        signature_ids = values[pos : pos + 3]
+        signature = None
+        if signature_ids[0] != SNAPSHOT_NO_SLOT:
+            signature = "|".join(self.animal_ids[i] for i in signature_ids)
+        pos += 3
+        rng: Dict[str, Dict[str, int]] = {}
+        if self.layout > 1:
+            present = values[pos]
+            if present & SNAPSHOT_HAS_DAILY:
+                cooldowns["daily"] = daily
+            for key, shift, first in (("rng_counters", 1, pos + 1), ("last_seeds", 3, pos + 3)):
+                for bit, command in enumerate(SNAPSHOT_RNG_COMMANDS):
+                    if present & (1 << (shift + bit)):
+                        rng.setdefault(key, {})[command] = values[first + bit]
+        profile = {
+            "user_id": str(values[0]),
+            "coins": values[1],
+            "energy": values[2],
+            "zoo": zoo,
+            "team": team,
+            "foods": foods,
+            "equipped_foods": equipped,
+            "equipped_food_wins": wins,
+            "cooldowns": cooldowns,
+            "last_enemy_signature": signature,
+            **rng,
+        }
+        if extras_blob:
+            extras = json.loads(extras_blob)
+            for key in ("zoo", "foods"):
+                if key in extras:
+                    profile[key].update(extras.pop(key))
+            profile.update(extras)
+        return profile
+
+
+class Snapshot:
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:8] != SNAPSHOT_MAGIC:
+            raise RuntimeError(f"{path} is not a users snapshot.")
+        (header_len,) = struct.unpack_from("<I", self.map, 8)
+        self.header = json.loads(self.map[12 : 12 + header_len])
+        self.codec = SnapshotCodec(self.header["animals"], self.header["foods"], self.header.get("layout", 1))
+        self.rows_start = 12 + header_len
+        self.count = self.header["count"]
+        self.extras_start = self.rows_start + self.count * self.codec.record.size
+
+    def row_ids(self) -> Dict[str, int]:
+        size = self.codec.record.size
+        unpack = struct.Struct("<Q").unpack_from
+        return {str(unpack(self.map, self.rows_start + row * size)[0]): row for row in range(self.count)}
+
+    def raw(self, row: int) -> Tuple[bytes, bytes]:
+        size = self.codec.record.size
+        offset = self.rows_start + row * size
+        record = self.map[offset : offset + size]
+        extras_offset, extras_len = struct.unpack_from("<II", record, size - 8)
+        start = self.extras_start + extras_offset
+        return record, self.map[start : start + extras_len]
+
+    def decode(self, row: int) -> Dict:
+        return self.codec.decode(*self.raw(row))
+
+    def close(self) -> None:
+        self.map.close()
+        self.file.close()
+
+
+# Users mapping over a snapshot: rows are decoded into plain dicts on first access
+# and stay decoded; untouched rows are copied byte-for-byte on the next write.
+class LazyUsers(MutableMapping):
+    def __init__(self, snapshot: Optional[Snapshot] = None, decoded: Optional[Dict[str, Dict]] = None):
+        self.snapshot = snapshot
+        self.rows: Dict[str, int] = snapshot.row_ids() if snapshot else {}
+        self.decoded: Dict[str, Dict] = decoded or {}
+        # Packed records of decoded profiles, reused by later writes until the profile is saved again.
+        self.encoded: Dict[str, Tuple[bytes, bytes]] = {}
+        self.encoded_codec: Optional[SnapshotCodec] = None
+
+    def __getitem__(self, user_id: str) -> Dict:
+        profile = self.decoded.get(user_id)
+        if profile is None:
+            profile = self.snapshot.decode(self.rows.pop(user_id))
+            self.decoded[user_id] = profile
+        return profile
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self.decoded or user_id in self.rows
+
+    def __setitem__(self, user_id: str, profile: Dict) -> None:
+        self.rows.pop(user_id, None)
+        self.encoded.pop(user_id, None)
+        self.decoded[user_id] = profile
+
+    def __delitem__(self, user_id: str) -> None:
+        self.encoded.pop(user_id, None)
+        if self.decoded.pop(user_id, None) is None:
+            del self.rows[user_id]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from list(self.decoded)
+        yield from list(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.decoded) + len(self.rows)
+
+    def peek(self, user_id: str) -> Optional[Dict]:
+        if user_id in self.decoded:
+            return self.decoded[user_id]
+        row = self.rows.get(user_id)
+        return self.snapshot.decode(row) if row is not None else None
+
+    # Runs on the event loop: decoded profiles are packed here (or reused while
+    # unchanged) and untouched rows are only listed, so the returned job reads
+    # nothing a command can change and may run in a thread. finish() then
+    # swaps in the file it wrote.
+    def prepare(self, version: int) -> Callable[[str], Tuple[int, List[str], int]]:
+        codec = SnapshotCodec.for_catalog()
+        if self.encoded_codec is None or not self.encoded_codec.same_layout(codec):
+            self.encoded, self.encoded_codec = {}, codec
+        size = codec.record.size
+        for user_id, profile in self.decoded.items():
+            if user_id not in self.encoded:
+                values, blob = codec.encode(profile)
+                self.encoded[user_id] = (codec.record.pack(*values, 0, 0)[: size - 8], blob)
+        packed = [self.encoded[user_id] for user_id in self.decoded]
+        rows = list(self.rows.items())
+        snapshot = self.snapshot
+
+        def write(path: str) -> Tuple[int, List[str], int]:
+            raw_copy = snapshot is not None and snapshot.codec.same_layout(codec)
+            records = bytearray()
+            extras = bytearray()
+
+            def append(record: bytes, blob: bytes) -> None:
+                records.extend(record)
+                records.extend(struct.pack("<II", len(extras), len(blob)))
+                extras.extend(blob)
+
+            for record, blob in packed:
+                append(record, blob)
+            for _, row in rows:
+                if raw_copy:
+                    record, blob = snapshot.raw(row)
+                    append(record[: size - 8], blob)
+                else:
+                    values, blob = codec.encode(snapshot.decode(row))
+                    append(codec.record.pack(*values, 0, 0)[: size - 8], blob)
+
+            header = {
+                "version": version,
+                "animals": codec.animal_ids,
+                "foods": codec.food_ids,
+                "layout": codec.layout,
+                "count": len(packed) + len(rows),
+            }
+            header = json.dumps(header).encode("utf-8")
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(SNAPSHOT_MAGIC + struct.pack("<I", len(header)) + header)
+                f.write(records)
+                f.write(extras)
+                written = f.tell()
+            os.replace(tmp_path, path)
+            return written, [user_id for user_id, _ in rows], len(packed)
+
+        return write
+
+    def finish(self, path: str, order: List[str], first_raw: int) -> None:
+        previous, self.snapshot = self.snapshot, Snapshot(path)
+        positions = {user_id: first_raw + idx for idx, user_id in enumerate(order)}
+        # Rows decoded while the file was written are no longer rows; the rest moved.
+        self.rows = {user_id: positions[user_id] for user_id in self.rows}
+        if previous:
+            previous.close()
+
+    def write(self, path: str, version: int) -> int:
+        written, order, first_raw = self.prepare(version)(path)
+        self.finish(path, order, first_raw)
+        return written
+
+
+COLD_INDEX_MAGIC = b"ZOOCOLD1"
+SEEN_MAGIC = b"ZOOSEEN1"
+COLD_CODECS = ("zlib", "zstd")
+
+
+def read_id_arrays(f, count: int, *typecodes: str) -> List[array]:
+    arrays = []
+    for typecode in typecodes:
+        values = array(typecode)
+        values.frombytes(f.read(values.itemsize * count))
+        if sys.byteorder == "big":
+            values.byteswap()
+        arrays.append(values)
+    return arrays
+
+
+def write_id_arrays(path: str, magic: bytes, header: bytes, *arrays: array) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(magic + header + struct.pack("<Q", len(arrays[0])))
+        for values in arrays:
+            if sys.byteorder == "big":
+                values = array(values.typecode, values)
+                values.byteswap()
+            values.tofile(f)
+    os.replace(tmp_path, path)
+
+
+# Dormant profiles moved out of the hot store. users.cold holds one compressed
+# JSON profile after another; users.cold.idx maps user id -> (offset, length)
+# as three sorted parallel arrays (20 bytes a profile in memory), searched with
+# bisect. A rehydrated profile's entry stays behind until the next compaction;
+# the hot copy always wins.
+class ColdArchive:
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.ids, self.offsets, self.lengths = array("Q"), array("Q"), array("I")
+        self.codec = "zstd" if zstandard else "zlib"
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                if f.read(8) != COLD_INDEX_MAGIC:
+                    raise RuntimeError(f"{self.index_path} is not a cold archive index.")
+                codec, count = struct.unpack("<BQ", f.read(9))
+                self.codec = COLD_CODECS[codec]
+                self.ids, self.offsets, self.lengths = read_id_arrays(f, count, "Q", "Q", "I")
+            if self.codec == "zstd" and zstandard is None:
+                raise RuntimeError(f"{self.path} is zstd-compressed; install zstandard to read it.")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _find(self, user_id: str) -> int:
+        if not user_id.isdigit():
+            return -1
+        key = int(user_id)
+        idx = bisect_left(self.ids, key)
+        return idx if idx < len(self.ids) and self.ids[idx] == key else -1
+
+    def __contains__(self, user_id: str) -> bool:
+        return self._find(user_id) >= 0
+
+    def user_ids(self) -> Iterator[str]:
+        return (str(user_id) for user_id in self.ids)
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        idx = self._find(user_id)
+        if idx < 0:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(self.offsets[idx])
+            blob = f.read(self.lengths[idx])
+        if self.codec == "zstd":
+            return json.loads(zstandard.ZstdDecompressor().decompress(blob))
+        return json.loads(zlib.decompress(blob))
+
+    def _compressor(self) -> Callable[[bytes], bytes]:
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=10).compress
+        return lambda data: zlib.compress(data, 6)
+
+    # add() and compact() run in a thread during archive runs: they leave the
+    # live arrays and users.cold as readers see them and return the new index,
+    # which install() swaps in on the loop.
+
+    # Appends the serialized profiles and fsyncs them before the index names
+    # them, so a crash leaves at worst an unreferenced tail (and the profile
+    # still hot). Appending moves no existing entry.
+    def add(self, profiles: Dict[str, bytes]) -> Tuple[array, array, array]:
+        compress = self._compressor()
+        entries: Dict[int, Tuple[int, int]] = {}
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            for user_id, data in profiles.items():
+                blob = compress(data)
+                f.write(blob)
+                entries[int(user_id)] = (offset, len(blob))
+                offset += len(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        merged = dict(zip(self.ids, zip(self.offsets, self.lengths)))
+        merged.update(entries)
+        return self._write_index(self.index_path, sorted(merged.items()))
+
+    def _write_index(self, path: str, entries: List[Tuple[int, Tuple[int, int]]]) -> Tuple[array, array, array]:
+        ids = array("Q", (user_id for user_id, _ in entries))
+        offsets = array("Q", (offset for _, (offset, _) in entries))
+        lengths = array("I", (length for _, (_, length) in entries))
+        write_id_arrays(path, COLD_INDEX_MAGIC, struct.pack("<B", COLD_CODECS.index(self.codec)), ids, offsets, lengths)
+        return ids, offsets, lengths
+
+    def stale_bytes(self, hot: Iterable[str]) -> int:
+        return sum(self.lengths[idx] for idx in map(self._find, hot) if idx >= 0)
+
+    # Writes the archive without the entries of profiles that are hot again
+    # to side files, or returns None while those are under half the archive.
+    # The dropped copies may be the only ones on disk, so callers flush the
+    # hot store first.
+    def compact(self, hot: Collection[str]) -> Optional[Tuple[array, array, array]]:
+        if self.stale_bytes(hot) <= sum(self.lengths) // 2:
+            return None
+        kept: List[Tuple[int, Tuple[int, int]]] = []
+        with open(self.path, "rb") as src, open(self.path + ".next", "wb") as dst:
+            for user_id, offset, length in zip(self.ids, self.offsets, self.lengths):
+                if str(user_id) in hot:
+                    continue
+                src.seek(offset)
+                kept.append((user_id, (dst.tell(), length)))
+                dst.write(src.read(length))
+            dst.flush()
+            os.fsync(dst.fileno())
+        return self._write_index(self.index_path + ".next", kept)
+
+    # On the loop: the arrays change in one step, so a get() never pairs the
+    # new index with the old file. After a compaction both files are renamed
+    # into place first.
+    def install(self, index: Tuple[array, array, array], compacted: bool = False) -> None:
+        if compacted:
+            os.replace(self.path + ".next", self.path)
+            os.replace(self.index_path + ".next", self.index_path)
+        self.ids, self.offsets, self.lengths = index
+
+
 class DataStore:
-    def __init__(self, path: str = DATA_FILE_PATH):
+    def __init__(self, path: str = DATA_FILE_PATH, store_format: str = STORE_FORMAT):
         self.path = path
+        self.format = store_format
+        self.snapshot_path = os.path.splitext(path)[0] + ".snap"
+        self.seen_path = os.path.splitext(path)[0] + ".seen"
         self.data = self._load_data()
+        self.cold = ColdArchive(os.path.splitext(path)[0] + ".cold")
+        # Last load or save per hot user, persisted by archive runs and on
+        # shutdown. Users without a time count from when the store opened.
+        self.opened_at = time.time()
+        self.seen: Dict[str, float] = self._load_seen()
+        # Users saved since the backup manager last serialized them.
+        self.dirty: Set[str] = set(self.data["users"])
+        # JSON format: each profile's serialized form as of its last save, so a
+        # write only serializes the users saved since the previous one.
+        self.encoded: Dict[str, bytes] = {}
+        self.encoded_users: Optional[Dict] = None
+        self.unwritten: Set[str] = set()
+        self.write_requested = False
+        self.writer: Optional[asyncio.Task] = None
 
     def _load_data(self) -> Dict:
         dir_name = os.path.dirname(self.path)
         if dir_name:
             os.makedirs(dir_name, exist_ok=True)
+        if self.format == "binary" and os.path.exists(self.snapshot_path):
+            snapshot = Snapshot(self.snapshot_path)
+            return {"version": snapshot.header["version"], "users": LazyUsers(snapshot)}
         if not os.path.exists(self.path):
-            initial_content = {"version": 2, "users": {}, "global": {"hatch_counts": {}}}
+            initial_content = {"version": 2, "users": {}}
             with open(self.path, "w", encoding="utf-8") as f:
                 json.dump(initial_content, f, indent=2)
         try:
@@ -282,10 +1369,35 @@ class DataStore:
 
         if "version" not in data or "users" not in data:
             raise RuntimeError("users.json is missing required keys. Aborting startup.")
-        data.setdefault("global", {"hatch_counts": {}})
+        if self.format == "binary":
+            # First start in binary mode: import users.json and write the snapshot.
+            data["users"] = LazyUsers(decoded=data["users"])
+            data["users"].write(self.snapshot_path, data["version"])
         return data
 
-    def _default_profile(self, user_id: str) -> Dict:
+    def _load_seen(self) -> Dict[str, float]:
+        if not os.path.exists(self.seen_path):
+            return {}
+        with open(self.seen_path, "rb") as f:
+            if f.read(8) != SEEN_MAGIC:
+                print(f"⚠️ Ignoring unreadable {os.path.basename(self.seen_path)}")
+                return {}
+            (count,) = struct.unpack("<Q", f.read(8))
+            ids, times = read_id_arrays(f, count, "Q", "d")
+        return {str(user_id): seen for user_id, seen in zip(ids, times)}
+
+    def save_seen(self) -> None:
+        self._write_seen(dict(self.seen), frozenset(self.data["users"]))
+
+    # Takes copies, so archive runs can write the file from a thread.
+    def _write_seen(self, seen: Dict[str, float], hot: Collection[str]) -> None:
+        rows = sorted((int(user_id), t) for user_id, t in seen.items() if user_id in hot and user_id.isdigit())
+        write_id_arrays(
+            self.seen_path, SEEN_MAGIC, b"", array("Q", (user_id for user_id, _ in rows)), array("d", (t for _, t in rows))
+        )
+
+    @staticmethod
+    def _default_profile(user_id: str) -> Dict:
         team = {"slot1": None, "slot2": None, "slot3": None}
         return {
             "user_id": user_id,
@@ -301,9 +1413,16 @@ class DataStore:
         }
 
     def load_profile(self, user_id: str) -> Dict:
+        started = time.perf_counter()
         if user_id not in self.data.get("users", {}):
-            self.data["users"][user_id] = self._default_profile(user_id)
-            self._write_data()
+            profile = self.cold.get(user_id)
+            if profile is not None:
+                metrics.inc("zoo_store_rehydrated_total")
+            self.data["users"][user_id] = profile or self._default_profile(user_id)
+            self.dirty.add(user_id)
+            self.unwritten.add(user_id)
+            self._request_write()
+        self.seen[user_id] = time.time()
         profile = self.data["users"][user_id]
         profile.setdefault("cooldowns", {"hunt": 0.0, "battle": 0.0})
         profile.setdefault("team", {"slot1": None, "slot2": None, "slot3": None})
@@ -312,19 +1431,1573 @@ class DataStore:
         profile.setdefault("foods", {})
         profile.setdefault("equipped_foods", {"slot1": None, "slot2": None, "slot3": None})
         profile.setdefault("equipped_food_wins", {"slot1": 0, "slot2": 0, "slot3": 0})
+        metrics.observe("zoo_store_load_profile_seconds", time.perf_counter() - started)
         return profile
 
+    def peek_profile(self, user_id: str) -> Optional[Dict]:
+        # Read-only lookup for hot paths (autocomplete) that must never create or
+        # persist a profile. In memory only: archived players get no suggestions.
+        users = self.data.get("users", {})
+        return users.peek(user_id) if isinstance(users, LazyUsers) else users.get(user_id)
+
+    # peek_profile that also reads the cold archive, for backups and store peeks.
+    def peek_any(self, user_id: str) -> Optional[Dict]:
+        profile = self.peek_profile(user_id)
+        return profile if profile is not None else self.cold.get(user_id)
+
     def save_profile(self, profile: Dict) -> None:
-        self.data.setdefault("users", {})[profile["user_id"]] = profile
-        self._write_data()
+        self.save_profiles([profile])
+
+    def save_profiles(self, profiles: List[Dict]) -> None:
+        users = self.data.setdefault("users", {})
+        seen = time.time()
+        for profile in profiles:
+            users[profile["user_id"]] = profile
+            self.dirty.add(profile["user_id"])
+            self.unwritten.add(profile["user_id"])
+            self.seen[profile["user_id"]] = seen
+        self._request_write()
+
+    # On the event loop the users file is written behind the saves: one write
+    # in a thread at a time per store, picking up every save that landed while
+    # the previous one ran, so partitions write in parallel and a command never
+    # waits on the disk. Without a running loop (tools, benchmarks) it is
+    # written at once.
+    def _request_write(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_data()
+            return
+        self.write_requested = True
+        if self.writer is None:
+            self.writer = loop.create_task(self._write_behind())
+
+    async def _write_behind(self) -> None:
+        try:
+            while self.write_requested:
+                self.write_requested = False
+                job = self._prepare_write()
+                self._finish_write(await asyncio.to_thread(job))
+        except Exception as exc:
+            # The next save retries; encoded profiles are kept, so nothing is lost.
+            print(f"❌ Writing {os.path.basename(self.path)} failed: {exc!r}")
+        finally:
+            self.writer = None
+
+    # Waits for the write in flight and any it leaves requested.
+    async def flush(self) -> None:
+        while self.writer is not None:
+            await asyncio.shield(self.writer)
 
     def _write_data(self) -> None:
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, indent=2)
+        self._finish_write(self._prepare_write()())
+
+    # Serializes the profiles saved since the last write (JSON format). Called
+    # where the store was opened (a thread) too, so the first save does not
+    # serialize every profile on the loop.
+    def encode_pending(self) -> None:
+        users = self.data["users"]
+        if self.encoded_users is not users:
+            self.encoded, self.encoded_users = {}, users
+            self.unwritten = set(users)
+        for user_id in self.unwritten:
+            profile = users.get(user_id)
+            if profile is None:
+                self.encoded.pop(user_id, None)
+            else:
+                self.encoded[user_id] = json.dumps(profile, separators=(",", ":")).encode("utf-8")
+        self.unwritten = set()
+
+    # Runs on the loop and captures everything the write needs; the returned
+    # job touches no live profile, so it may run in a thread.
+    def _prepare_write(self) -> Callable[[], Tuple[float, Any]]:
+        if self.format == "binary":
+            job = self.data["users"].prepare(self.data["version"])
+            path = self.snapshot_path
+        else:
+            self.encode_pending()
+            head = json.dumps({key: value for key, value in self.data.items() if key != "users"})[:-1].encode("utf-8")
+            blobs = list(self.encoded.items())
+            path = self.path
+
+            def job(path: str) -> int:
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(head + b', "users": {')
+                    for idx, (user_id, blob) in enumerate(blobs):
+                        f.write((b",\n" if idx else b"\n") + json.dumps(user_id).encode("utf-8") + b": " + blob)
+                    f.write(b"\n}}\n")
+                    written = f.tell()
+                os.replace(tmp_path, path)
+                return written
+
+        def timed() -> Tuple[float, Any]:
+            started = time.perf_counter()
+            result = job(path)
+            return time.perf_counter() - started, result
+
+        return timed
+
+    def _finish_write(self, outcome: Tuple[float, Any]) -> None:
+        elapsed, result = outcome
+        if self.format == "binary":
+            written, order, first_raw = result
+            self.data["users"].finish(self.snapshot_path, order, first_raw)
+        else:
+            written = result
+        metrics.observe("zoo_store_write_seconds", elapsed)
+        metrics.inc("zoo_store_bytes_written_total", written)
+        metrics.set("zoo_store_last_write_bytes", written)
+
+    # Moves up to ARCHIVE_BATCH hot profiles last seen before `cutoff` into the
+    # cold archive. They are picked and serialized on the loop; compression,
+    # fsyncs and the index and seen files are written in a thread. The archive
+    # is durable before the hot store drops them, so a crash in between only
+    # leaves a stale cold copy behind the hot one.
+    async def archive_dormant(self, cutoff: float) -> int:
+        users = self.data["users"]
+        dormant = [
+            user_id
+            for user_id in users
+            if user_id.isdigit() and self.seen.get(user_id, self.opened_at) < cutoff
+        ][:ARCHIVE_BATCH]
+        if not dormant:
+            return 0
+        blobs = {user_id: json.dumps(self.peek_profile(user_id), separators=(",", ":")).encode("utf-8") for user_id in dormant}
+        self.cold.install(await asyncio.to_thread(self.cold.add, blobs))
+        # Players who came back while the batch was written stay hot; their cold copy is stale.
+        dormant = [user_id for user_id in dormant if user_id in users and self.seen.get(user_id, self.opened_at) < cutoff]
+        for user_id in dormant:
+            del users[user_id]
+            self.seen.pop(user_id, None)
+        self.unwritten.update(dormant)
+        self._request_write()
+        # Rehydrated profiles leave dead bytes behind; compaction drops them
+        # once they dominate, which needs their hot copies on disk first.
+        await self.flush()
+        compacted = await asyncio.to_thread(self.cold.compact, frozenset(users))
+        if compacted is not None:
+            self.cold.install(compacted, compacted=True)
+        await asyncio.to_thread(self._write_seen, dict(self.seen), frozenset(users))
+        metrics.inc("zoo_store_archived_total", len(dormant))
+        return len(dormant)
+
+    # Every profile, hot then archived, without loading any into the hot store.
+    def profiles(self) -> Iterator[Tuple[str, Dict]]:
+        users = self.data["users"]
+        for user_id in users:
+            yield user_id, self.peek_profile(user_id)
+        for user_id in self.cold.user_ids():
+            if user_id not in users:
+                yield user_id, self.cold.get(user_id)
+
+    def export_json(self, path: Optional[str] = None) -> None:
+        plain = dict(self.profiles())
+        tmp_path = (path or self.path) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({**self.data, "users": plain}, f, indent=2)
+        os.replace(tmp_path, path or self.path)
+
+
+# Hatch counts live outside users.json, one file per partition. Hunts add to a process-local
+# buffer; flush() appends the buffered deltas as one JSON line to a small side
+# file and folds them into the snapshot that /index and /stats read from.
+class HatchCounter:
+    def __init__(self, path: str = HATCH_COUNTS_PATH, seed: Optional[Dict[str, int]] = None):
+        self.path = path
+        self.pending: Counter = Counter()
+        self.snapshot: Dict[str, int] = {}
+        self.lines = 0
+        self._load(seed or {})
+
+    def _load(self, seed: Dict[str, int]) -> None:
+        if not os.path.exists(self.path):
+            self.snapshot = {k: int(v) for k, v in seed.items() if v}
+            self._compact()
+            return
+        totals: Counter = Counter()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    totals.update(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"⚠️ Skipping corrupt line in {os.path.basename(self.path)}")
+                    continue
+                self.lines += 1
+        self.snapshot = dict(totals)
+
+    def add(self, counts: Dict[str, int]) -> None:
+        self.pending.update(counts)
+
+    def get(self, animal_id: str) -> int:
+        return self.snapshot.get(animal_id, 0)
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        delta = dict(self.pending)
+        self.pending.clear()
+        for animal_id, amount in delta.items():
+            self.snapshot[animal_id] = self.snapshot.get(animal_id, 0) + amount
+        if self.lines >= HATCH_COMPACT_LINES:
+            self._compact()
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(delta, separators=(",", ":")) + "\n")
+        self.lines += 1
+
+    def _compact(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self.snapshot, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.path)
+        self.lines = 1
+
+
+async def hatch_flush_loop() -> None:
+    while True:
+        await asyncio.sleep(HATCH_FLUSH_INTERVAL)
+        try:
+            hatch_counter.flush()
+        except OSError as exc:
+            print(f"❌ Hatch count flush failed: {exc}")
+
+
+# Complete teams of a partition, for /battle pvp. Each entry is the team key
+# (animals, then equipped foods) with its power and rarity center, taken when
+# the team last changed. Teams sit in buckets by (rarity center, power //
+# PVP_POWER_BUCKET); every center keeps its non-empty buckets sorted, so the
+# nearest opponent is a bisect away and no profile is read. Changes are
+# appended to teams.jsonl as [user id, entry or null] and replayed on start.
+class TeamIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Tuple[Tuple[Optional[str], ...], float, int]] = {}
+        self.buckets: Dict[Tuple[int, int], List[str]] = {}
+        self.positions: Dict[str, int] = {}
+        self.levels: Dict[int, List[int]] = {}
+        self.lines = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        user_id, entry = json.loads(line)
+                    except ValueError:
+                        print(f"⚠️ Skipping corrupt line in {os.path.basename(path)}")
+                        continue
+                    self._set(user_id, entry)
+                    self.lines += 1
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def bucket(entry) -> Tuple[int, int]:
+        return entry[2], int(entry[1] // PVP_POWER_BUCKET)
+
+    def _set(self, user_id: str, entry: Optional[List]) -> None:
+        previous = self.entries.pop(user_id, None)
+        if previous is not None:
+            bucket = self.bucket(previous)
+            members = self.buckets[bucket]
+            # Swap-remove: the last member takes the leaving one's place.
+            moved = members.pop()
+            if moved != user_id:
+                members[self.positions[user_id]] = moved
+                self.positions[moved] = self.positions[user_id]
+            del self.positions[user_id]
+            if not members:
+                del self.buckets[bucket]
+                level = self.levels[bucket[0]]
+                level.pop(bisect_left(level, bucket[1]))
+        if entry is None:
+            return
+        entry = (tuple(entry[0]), float(entry[1]), int(entry[2]))
+        self.entries[user_id] = entry
+        bucket = self.bucket(entry)
+        members = self.buckets.get(bucket)
+        if members is None:
+            members = self.buckets[bucket] = []
+            level = self.levels.setdefault(bucket[0], [])
+            level.insert(bisect_left(level, bucket[1]), bucket[1])
+        self.positions[user_id] = len(members)
+        members.append(user_id)
+
+    # Indexes existing teams when teams.jsonl is missing (first start with
+    # /battle pvp, or the file was removed), then writes the file once.
+    def backfill(self, profiles: Iterable[Tuple[str, Dict]]) -> None:
+        for user_id, profile in profiles:
+            if not profile.get("team"):
+                continue
+            entry = team_entry({"team": profile["team"], "equipped_foods": profile.get("equipped_foods") or {}})
+            if entry is not None:
+                self._set(user_id, entry)
+        self._compact()
+        if self.entries:
+            print(f"✅ Indexed {len(self.entries)} pvp teams into {os.path.basename(self.path)}")
+
+    def update(self, user_id: str, entry: Optional[List]) -> None:
+        current = self.entries.get(user_id)
+        if current == (None if entry is None else (tuple(entry[0]), float(entry[1]), int(entry[2]))):
+            return
+        self._set(user_id, entry)
+        if self.lines >= 2 * len(self.entries) + 1000:
+            self._compact()
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps([user_id, entry], separators=(",", ":")) + "\n")
+        self.lines += 1
+
+    # The team closest in power among the given rarity centers, or None. Two
+    # buckets either side of the target per center are enough to skip past
+    # the player's own entry.
+    def find(
+        self, user_id: str, power: float, centers: List[int], rng: random.Random = random
+    ) -> Optional[Tuple[str, Tuple[Optional[str], ...]]]:
+        target = int(power // PVP_POWER_BUCKET)
+        own = self.bucket(self.entries[user_id]) if user_id in self.entries else None
+        candidates = []
+        for center in centers:
+            level = self.levels.get(center, [])
+            idx = bisect_left(level, target)
+            candidates += [(abs(b - target), center, b) for b in level[max(0, idx - 2) : idx + 2]]
+        for _, center, b in sorted(candidates):
+            members = self.buckets[(center, b)]
+            if own != (center, b):
+                pick = rng.randrange(len(members))
+            elif len(members) > 1:
+                # Draw from everyone but the player, without retrying.
+                pick = rng.randrange(len(members) - 1)
+                pick += pick >= self.positions[user_id]
+            else:
+                continue
+            opponent = members[pick]
+            return opponent, self.entries[opponent][0]
+        return None
+
+    def _compact(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for user_id, entry in self.entries.items():
+                f.write(json.dumps([user_id, list(entry)], separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.path)
+        self.lines = len(self.entries)
+
+
+# Recent battles for /replay, kept out of the profiles. replays.bin is a
+# header (magic, battles kept, slot size) followed by one ring per player:
+#   user u64 | next slot u8 | used slots u8 | REPLAY_KEEP slots
+# A slot is a length byte and one packed battle:
+#   ts u32 | flags u8 (won, pvp) | deaths u8 | [opponent u64 if pvp]
+#   6 animal ordinals u16 | 6 x (hp, atk, def) u16 | per death: round u8, side/attacker/target u8
+# The hits between deaths follow from the stats, so /replay re-runs them;
+# see replay_phases. Animal ordinals index replays.ids, one id per line,
+# which only ever grows. Rings are found on first use, not at startup.
+REPLAY_MAGIC = b"ZOOREPL1"
+REPLAY_FILE_HEADER = struct.Struct("<HH")
+REPLAY_RING_HEADER = struct.Struct("<QBB")
+REPLAY_HEADER = struct.Struct("<IBB")
+REPLAY_BODY = struct.Struct("<6H18H")
+REPLAY_SLOT_BYTES = 80
+REPLAY_WON, REPLAY_PVP = 1, 2
+
+
+class ReplayStore:
+    def __init__(self, path: str, keep: int = REPLAY_KEEP):
+        self.path = path
+        self.ids_path = os.path.splitext(path)[0] + ".ids"
+        self.animal_ids: List[str] = []
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path, "r", encoding="utf-8") as f:
+                self.animal_ids = [line.strip() for line in f if line.strip()]
+        self.ordinals = {animal_id: idx for idx, animal_id in enumerate(self.animal_ids)}
+        self.keep = keep
+        if os.path.exists(path):
+            self.file = open(path, "r+b")
+            head = self.file.read(8 + REPLAY_FILE_HEADER.size)
+            if head[:8] != REPLAY_MAGIC:
+                raise RuntimeError(f"{path} is not a replay file.")
+            self.keep, slot_bytes = REPLAY_FILE_HEADER.unpack_from(head, 8)
+            if slot_bytes != REPLAY_SLOT_BYTES:
+                raise RuntimeError(f"{path} uses {slot_bytes}-byte slots; expected {REPLAY_SLOT_BYTES}.")
+        else:
+            self.file = open(path, "w+b")
+            self.file.write(REPLAY_MAGIC + REPLAY_FILE_HEADER.pack(keep, REPLAY_SLOT_BYTES))
+            self.file.flush()
+        self.ring_bytes = REPLAY_RING_HEADER.size + self.keep * REPLAY_SLOT_BYTES
+        self.start = 8 + REPLAY_FILE_HEADER.size
+        # user id -> [ring number, next slot, used slots]
+        self.rings: Optional[Dict[str, List[int]]] = None
+
+    def _load_rings(self) -> Dict[str, List[int]]:
+        if self.rings is None:
+            self.rings = {}
+            self.file.seek(0, os.SEEK_END)
+            count = (self.file.tell() - self.start) // self.ring_bytes
+            if count:
+                with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                    for ring in range(count):
+                        user, head, used = REPLAY_RING_HEADER.unpack_from(view, self.start + ring * self.ring_bytes)
+                        self.rings[str(user)] = [ring, head, used]
+        return self.rings
+
+    def _ordinal(self, animal_id: str) -> int:
+        ordinal = self.ordinals.get(animal_id)
+        if ordinal is None:
+            ordinal = self.ordinals[animal_id] = len(self.animal_ids)
+            self.animal_ids.append(animal_id)
+            with open(self.ids_path, "a", encoding="utf-8") as f:
+                f.write(animal_id + "\n")
+        return ordinal
+
+    def encode(self, record: Dict) -> bytes:
+        opponent, kills = record.get("opponent"), record["kills"]
+        flags = (REPLAY_WON if record["win"] else 0) | (REPLAY_PVP if opponent else 0)
+        blob = bytearray(REPLAY_HEADER.pack(record["ts"], flags, len(kills)))
+        if opponent:
+            blob += struct.pack("<Q", opponent)
+        stats = [value for triple in record["stats"] for value in triple]
+        if max(stats) > 0xFFFF:
+            stats = [min(0xFFFF, value) for value in stats]
+        blob += REPLAY_BODY.pack(*[self._ordinal(animal_id) for animal_id in record["animals"]], *stats)
+        for rnd, side, slot, target in kills:
+            blob += bytes((rnd, side << 4 | slot << 2 | target))
+        return bytes(blob)
+
+    def decode(self, blob: bytes) -> Dict:
+        ts, flags, deaths = REPLAY_HEADER.unpack_from(blob)
+        pos = REPLAY_HEADER.size
+        opponent = None
+        if flags & REPLAY_PVP:
+            (opponent,) = struct.unpack_from("<Q", blob, pos)
+            pos += 8
+        values = REPLAY_BODY.unpack_from(blob, pos)
+        pos += REPLAY_BODY.size
+        kills = [[blob[i], blob[i + 1] >> 4, blob[i + 1] >> 2 & 3, blob[i + 1] & 3] for i in range(pos, pos + 2 * deaths, 2)]
+        animals = [self.animal_ids[o] if o < len(self.animal_ids) else "?" for o in values[:6]]
+        stats = [list(values[i : i + 3]) for i in range(6, 24, 3)]
+        return {"ts": ts, "win": bool(flags & REPLAY_WON), "opponent": opponent, "animals": animals, "stats": stats, "kills": kills}
+
+    def add(self, user_id: str, record: Dict) -> None:
+        if not user_id.isdigit():
+            return
+        blob = self.encode(record)
+        rings = self._load_rings()
+        entry = rings.get(user_id)
+        if entry is None:
+            entry = rings[user_id] = [len(rings), 0, 0]
+            self.file.seek(self.start + entry[0] * self.ring_bytes)
+            self.file.write(bytes(self.ring_bytes))
+        ring, head, used = entry
+        offset = self.start + ring * self.ring_bytes
+        self.file.seek(offset + REPLAY_RING_HEADER.size + head * REPLAY_SLOT_BYTES)
+        self.file.write(bytes((len(blob),)) + blob)
+        entry[1], entry[2] = (head + 1) % self.keep, min(self.keep, used + 1)
+        self.file.seek(offset)
+        self.file.write(REPLAY_RING_HEADER.pack(int(user_id), entry[1], entry[2]))
+        self.file.flush()
+
+    # Newest first.
+    def get(self, user_id: str) -> List[Dict]:
+        entry = self._load_rings().get(user_id)
+        if entry is None:
+            return []
+        ring, head, used = entry
+        self.file.seek(self.start + ring * self.ring_bytes + REPLAY_RING_HEADER.size)
+        slots = self.file.read(self.keep * REPLAY_SLOT_BYTES)
+        records = []
+        for step in range(1, used + 1):
+            pos = ((head - step) % self.keep) * REPLAY_SLOT_BYTES
+            records.append(self.decode(slots[pos + 1 : pos + 1 + slots[pos]]))
+        return records
+
+    def close(self) -> None:
+        self.file.close()
+
+
+# Every economic mutation is appended to a binary ledger so balances can be
+# audited and any profile (or the whole store) rebuilt at a point in time; see
+# replay.py. Segment layout:
+#   magic | u32 header length | JSON header (catalog id order and version, created) | events
+# Each event is a fixed header followed by `items` catalog deltas:
+#   ts f64 | user u64 | kind u8 | coins i64 | energy i32 | seed u64 | aux f64 | items u16
+#   item: type u8 (animal, food, equip) | catalog ordinal u16 | delta i32
+# For equip items the delta is the slot number. aux holds the battle's enemy
+# multiplier. A sealed segment gets a sidecar .idx listing, per user, the first
+# and last event time and the offset of every event, so one user's history is
+# read without scanning.
+LEDGER_MAGIC = b"ZOOLEDG1"
+LEDGER_INDEX_MAGIC = b"ZOOLIDX1"
+LEDGER_KINDS = ("daily", "hunt", "battle", "sell", "sell_food", "use", "buy", "pvp")
+LEDGER_EVENT = struct.Struct("<dQBqiQdH")
+LEDGER_ITEM = struct.Struct("<BHi")
+LEDGER_INDEX_ENTRY = struct.Struct("<QddI")
+LEDGER_ANIMAL, LEDGER_FOOD, LEDGER_EQUIP = 0, 1, 2
+
+
+class LedgerSegment:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = f.read()
+        if self.data[:8] != LEDGER_MAGIC:
+            raise RuntimeError(f"{os.path.basename(path)} is not a ledger segment")
+        (header_len,) = struct.unpack_from("<I", self.data, 8)
+        self.header = json.loads(self.data[12 : 12 + header_len])
+        self.start = 12 + header_len
+
+    def event_at(self, offset: int) -> Tuple[Tuple, int]:
+        ts, user, kind, coins, energy, seed, aux, count = LEDGER_EVENT.unpack_from(self.data, offset)
+        pos = offset + LEDGER_EVENT.size
+        items = [LEDGER_ITEM.unpack_from(self.data, pos + i * LEDGER_ITEM.size) for i in range(count)]
+        return (ts, user, kind, coins, energy, seed, aux, items), pos + count * LEDGER_ITEM.size
+
+    def events(self, offsets: Optional[List[int]] = None, start: int = 0) -> Iterator[Tuple]:
+        if offsets is not None:
+            for offset in offsets:
+                if offset >= start:
+                    yield self.event_at(offset)[0]
+            return
+        pos, end = max(self.start, start), len(self.data)
+        # A crash can leave a torn final event; stop at the last complete one.
+        while pos + LEDGER_EVENT.size <= end:
+            count = LEDGER_EVENT.unpack_from(self.data, pos)[7]
+            if pos + LEDGER_EVENT.size + count * LEDGER_ITEM.size > end:
+                break
+            event, pos = self.event_at(pos)
+            yield event
+
+    def build_index(self) -> Dict[int, Tuple[float, float, List[int]]]:
+        index: Dict[int, Tuple[float, float, List[int]]] = {}
+        pos, end = self.start, len(self.data)
+        while pos + LEDGER_EVENT.size <= end:
+            ts, user, *_, count = LEDGER_EVENT.unpack_from(self.data, pos)
+            if pos + LEDGER_EVENT.size + count * LEDGER_ITEM.size > end:
+                break
+            first, _, offsets = index.get(user, (ts, ts, []))
+            offsets.append(pos)
+            index[user] = (first, ts, offsets)
+            pos += LEDGER_EVENT.size + count * LEDGER_ITEM.size
+        return index
+
+    def index(self) -> Dict[int, Tuple[float, float, List[int]]]:
+        index_path = os.path.splitext(self.path)[0] + ".idx"
+        if not os.path.exists(index_path):
+            return self.build_index()
+        with open(index_path, "rb") as f:
+            blob = f.read()
+        if blob[:8] != LEDGER_INDEX_MAGIC:
+            return self.build_index()
+        (count,) = struct.unpack_from("<I", blob, 8)
+        pos = 12
+        index = {}
+        for _ in range(count):
+            user, first, last, n = LEDGER_INDEX_ENTRY.unpack_from(blob, pos)
+            pos += LEDGER_INDEX_ENTRY.size
+            index[user] = (first, last, list(struct.unpack_from(f"<{n}I", blob, pos)))
+            pos += 4 * n
+        return index
+
+
+def write_ledger_index(path: str, index: Dict[int, Tuple[float, float, List[int]]]) -> None:
+    parts = [LEDGER_INDEX_MAGIC, struct.pack("<I", len(index))]
+    for user in sorted(index):
+        first, last, offsets = index[user]
+        parts.append(LEDGER_INDEX_ENTRY.pack(user, first, last, len(offsets)))
+        parts.append(struct.pack(f"<{len(offsets)}I", *offsets))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"".join(parts))
+    os.replace(tmp_path, path)
+
+
+def ledger_segments(directory: str) -> List[str]:
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if name.startswith("segment-") and name.endswith(".zlg"))
+    return [os.path.join(directory, name) for name in names]
+
+
+class Ledger:
+    def __init__(self, directory: str = LEDGER_DIR):
+        self.directory = directory
+        self.file = None
+        self.path = ""
+        self.size = 0
+        self.index: Dict[int, Tuple[float, float, List[int]]] = {}
+        os.makedirs(directory, exist_ok=True)
+        # Segments left without an index by a crash are indexed before moving on.
+        for path in ledger_segments(directory):
+            index_path = os.path.splitext(path)[0] + ".idx"
+            if not os.path.exists(index_path):
+                write_ledger_index(index_path, LedgerSegment(path).build_index())
+        self._open_segment()
+
+    def _open_segment(self, extra_animals: Tuple[str, ...] = (), extra_foods: Tuple[str, ...] = ()) -> None:
+        existing = ledger_segments(self.directory)
+        number = int(os.path.basename(existing[-1])[8:-4]) + 1 if existing else 1
+        self.path = os.path.join(self.directory, f"segment-{number:06d}.zlg")
+        codec = SnapshotCodec(list(catalog.animals) + list(extra_animals), list(catalog.foods) + list(extra_foods))
+        self.animal_index, self.food_index = codec.animal_index, codec.food_index
+        header = {"animal_ids": codec.animal_ids, "food_ids": codec.food_ids, "catalog": catalog.version, "created": now()}
+        header = json.dumps(header).encode("utf-8")
+        self.file = open(self.path, "ab")
+        self.file.write(LEDGER_MAGIC + struct.pack("<I", len(header)) + header)
+        self.file.flush()
+        self.size = self.file.tell()
+        self.index = {}
+
+    def seal(self) -> None:
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        write_ledger_index(os.path.splitext(self.path)[0] + ".idx", self.index)
+
+    # Where the next event will go; backups record it so replay.py starts there.
+    def position(self) -> Dict:
+        return {"segment": os.path.basename(self.path), "offset": self.size}
+
+    # Called after a catalog reload so each segment names the catalog its events used.
+    def rotate(self) -> None:
+        self.seal()
+        self._open_segment()
+
+    def record(
+        self,
+        user_id: str,
+        kind: str,
+        coins: int = 0,
+        energy: int = 0,
+        animals: Optional[Dict[str, int]] = None,
+        foods: Optional[Dict[str, int]] = None,
+        equip: Optional[Tuple[int, str]] = None,
+        seed: int = 0,
+        aux: float = 0.0,
+    ) -> None:
+        new_animals = [a for a in animals or () if a not in self.animal_index]
+        new_foods = [f for f in list(foods or ()) + ([equip[1]] if equip else []) if f not in self.food_index]
+        if new_animals or new_foods:
+            # The catalog changed since this segment was opened. Ids this
+            # process has not loaded yet (a cluster store whose reload is still
+            # pending) are carried in the new header as well.
+            self.seal()
+            self._open_segment(
+                tuple(a for a in dict.fromkeys(new_animals) if a not in catalog.animals),
+                tuple(f for f in dict.fromkeys(new_foods) if f not in catalog.foods),
+            )
+        items = [(LEDGER_ANIMAL, self.animal_index[a], delta) for a, delta in (animals or {}).items()]
+        items += [(LEDGER_FOOD, self.food_index[f], delta) for f, delta in (foods or {}).items()]
+        if equip:
+            items.append((LEDGER_EQUIP, self.food_index[equip[1]], equip[0]))
+        ts = now()
+        user = int(user_id)
+        blob = LEDGER_EVENT.pack(ts, user, LEDGER_KINDS.index(kind), coins, energy, seed, aux, len(items))
+        blob += b"".join(LEDGER_ITEM.pack(*item) for item in items)
+        offset = self.size
+        self.file.write(blob)
+        self.file.flush()
+        self.size += len(blob)
+        first, _, offsets = self.index.get(user, (ts, ts, []))
+        offsets.append(offset)
+        self.index[user] = (first, ts, offsets)
+        metrics.inc("zoo_ledger_events_total")
+        metrics.inc("zoo_ledger_bytes_total", len(blob))
+        if self.size >= LEDGER_SEGMENT_BYTES:
+            self.seal()
+            self._open_segment()
+
+
+# Apply one decoded ledger event to a profile; replay.py folds these over a base.
+def apply_ledger_event(profile: Dict, event: Tuple, animal_ids: List[str], food_ids: List[str]) -> None:
+    _, _, _, coins, energy, _, _, items = event
+    profile["coins"] = profile.get("coins", 0) + coins
+    profile["energy"] = profile.get("energy", 0) + energy
+    for item_type, ordinal, delta in items:
+        if item_type == LEDGER_ANIMAL:
+            zoo = profile.setdefault("zoo", {})
+            zoo[animal_ids[ordinal]] = zoo.get(animal_ids[ordinal], 0) + delta
+        elif item_type == LEDGER_FOOD:
+            foods = profile.setdefault("foods", {})
+            foods[food_ids[ordinal]] = foods.get(food_ids[ordinal], 0) + delta
+        else:
+            profile.setdefault("equipped_foods", {})[f"slot{delta}"] = food_ids[ordinal]
+
+
+# Backups are built from a cache of per-user JSON bytes. Only users saved since
+# the last snapshot are re-serialized on the loop; the immutable bytes are then
+# compressed and written by a worker thread while the bot keeps running.
+# Full backups are plain users.json documents (gzip or zstd); incrementals have
+# the same shape but hold only users changed since their base full backup.
+class BackupManager:
+    def __init__(
+        self,
+        store: DataStore,
+        hatch_counter: HatchCounter,
+        directory: str = BACKUP_DIR,
+        compression: str = BACKUP_COMPRESSION,
+        ledger: Optional["Ledger"] = None,
+    ):
+        self.store = store
+        self.hatch_counter = hatch_counter
+        self.ledger = ledger
+        self.directory = directory
+        self.compression = compression if compression != "zstd" or zstandard else "gzip"
+        self.serialized: Dict[str, bytes] = {}
+        self.changed_since_full: Set[str] = set()
+        self.last_full: Optional[str] = None
+        self.last_full_at = 0.0
+        self.lock = asyncio.Lock()
+
+    def _serialize(self, user_id: str) -> None:
+        profile = self.store.peek_any(user_id)
+        if profile is None:
+            self.serialized.pop(user_id, None)
+        else:
+            self.serialized[user_id] = json.dumps(profile, separators=(",", ":")).encode("utf-8")
+
+    # Returns the store as of one instant: profiles saved while the first pass
+    # yielded are serialized again in a final pass that does not yield, so the
+    # caller can stamp the result with the ledger position right after it.
+    async def snapshot(self) -> Dict[str, bytes]:
+        dirty, self.store.dirty = self.store.dirty, set()
+        if not self.serialized:
+            # Archived profiles are never dirty after a restart; the first
+            # snapshot reads them once so full backups still cover everyone.
+            dirty |= set(self.store.cold.user_ids())
+        for count, user_id in enumerate(dirty, start=1):
+            self._serialize(user_id)
+            if count % 500 == 0:
+                await asyncio.sleep(0)
+        late, self.store.dirty = self.store.dirty, set()
+        for user_id in late:
+            self._serialize(user_id)
+        self.changed_since_full |= dirty | late
+        return dict(self.serialized)
+
+    async def backup(self, full: bool = True) -> str:
+        async with self.lock:
+            snapshot = await self.snapshot()
+            # Nothing may yield between the snapshot and these stamps.
+            created = now()
+            position = self.ledger.position() if self.ledger else None
+            full = full or self.last_full is None
+            if full:
+                users = snapshot
+            else:
+                users = {uid: snapshot[uid] for uid in self.changed_since_full if uid in snapshot}
+            header = {
+                "version": self.store.data.get("version", 2),
+                "kind": "full" if full else "incremental",
+                "created": created,
+                "ledger": position,
+                "base": None if full else os.path.basename(self.last_full),
+                "hatch_counts": dict(self.hatch_counter.snapshot),
+            }
+            path = await asyncio.to_thread(self._write, header, users)
+            if full:
+                self.changed_since_full = set()
+                self.last_full = path
+                self.last_full_at = header["created"]
+            await asyncio.to_thread(self._rotate)
+            return path
+
+    def _open(self, path: str):
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=10).stream_writer(open(path, "wb"))
+        return gzip.open(path, "wb", compresslevel=6)
+
+    def _write(self, header: Dict, users: Dict[str, bytes]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        created = header["created"]
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(created)) + f"{int(created * 1000) % 1000:03d}"
+        extension = "zst" if self.compression == "zstd" else "gz"
+        path = os.path.join(self.directory, f"users-{stamp}-{header['kind']}.json.{extension}")
+        tmp_path = path + ".tmp"
+        with self._open(tmp_path) as f:
+            f.write(json.dumps(header)[:-1].encode("utf-8") + b', "users": {')
+            for idx, (user_id, blob) in enumerate(users.items()):
+                f.write((b"," if idx else b"") + json.dumps(user_id).encode("utf-8") + b":" + blob)
+            f.write(b"}}")
+        os.replace(tmp_path, path)
+        return path
+
+    def _rotate(self) -> None:
+        names = sorted(name for name in os.listdir(self.directory) if name.startswith("users-") and not name.endswith(".tmp"))
+        fulls = [name for name in names if "-full." in name]
+        if len(fulls) <= BACKUP_KEEP_FULL:
+            return
+        # Everything older than the oldest retained full backup can go.
+        cutoff = fulls[-BACKUP_KEEP_FULL]
+        for name in names:
+            if name < cutoff:
+                os.remove(os.path.join(self.directory, name))
+
+
+async def backup_loop() -> None:
+    while True:
+        await asyncio.sleep(BACKUP_INTERVAL)
+        for partition in list(partitions.opened.values()):
+            manager = partition.backups
+            if manager is None:
+                continue
+            try:
+                await manager.backup(full=now() - manager.last_full_at >= BACKUP_FULL_EVERY)
+            except OSError as exc:
+                print(f"❌ Backup of partition {partition.key} failed: {exc}")
+
+
+async def archive_loop() -> None:
+    if ARCHIVE_AFTER_DAYS <= 0:
+        return
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+        cutoff = time.time() - ARCHIVE_AFTER_DAYS * 86400
+        for partition in list(partitions.opened.values()):
+            if partition.store is None:
+                continue
+            try:
+                archived = await partition.store.archive_dormant(cutoff)
+            except OSError as exc:
+                print(f"❌ Archiving partition {partition.key} failed: {exc}")
+                continue
+            if archived:
+                print(f"🧊 Archived {archived} dormant profiles in partition {partition.key}")
+            await asyncio.sleep(0)
+
+
+# ==============================
+# Guild partitions
+# ==============================
+
+DEFAULT_PARTITION = "default"
+ECONOMY_MODES = ("global", "separate")
+# Guild of the interaction being handled; None in DMs and outside interactions.
+current_guild: ContextVar[Optional[int]] = ContextVar("current_guild", default=None)
+
+if {GUILD_ECONOMY, *GUILD_ECONOMY_OVERRIDES.values()} - set(ECONOMY_MODES):
+    raise RuntimeError("GUILD_ECONOMY and GUILD_ECONOMY_OVERRIDES take global or separate.")
+
+
+def guild_economy(guild_id: Optional[int]) -> str:
+    if guild_id is None:
+        return "global"
+    return GUILD_ECONOMY_OVERRIDES.get(guild_id, GUILD_ECONOMY)
+
+
+# Partition holding the guild's player profiles (and their ledger and backups).
+def profile_partition(guild_id: Optional[int]) -> str:
+    return str(guild_id) if guild_economy(guild_id) == "separate" else DEFAULT_PARTITION
+
+
+# Partition holding the guild's hatch counts; every guild has its own.
+def hatch_partition(guild_id: Optional[int]) -> str:
+    return DEFAULT_PARTITION if guild_id is None else str(guild_id)
+
+
+# One slice of the state with its own files and its own writer. A guild on the
+# global economy only keeps hatch counts here.
+class Partition:
+    def __init__(
+        self,
+        key: str,
+        directory: str,
+        economy: bool,
+        path: Optional[str] = None,
+        hatch_path: Optional[str] = None,
+        ledger_dir: Optional[str] = None,
+    ):
+        self.key = key
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.store: Optional[DataStore] = None
+        self.ledger: Optional[Ledger] = None
+        self.backups: Optional[BackupManager] = None
+        self.teams: Optional[TeamIndex] = None
+        self.replays: Optional[ReplayStore] = None
+        seed: Dict[str, int] = {}
+        if economy:
+            self.store = DataStore(path or os.path.join(directory, "users.json"))
+            if self.store.format != "binary":
+                self.store.encode_pending()
+            self.ledger = Ledger(ledger_dir or os.path.join(directory, "ledger"))
+            teams_path = os.path.join(directory, "teams.jsonl")
+            backfill = not os.path.exists(teams_path)
+            self.teams = TeamIndex(teams_path)
+            if backfill:
+                self.teams.backfill(self.store.profiles())
+            self.replays = ReplayStore(os.path.join(directory, "replays.bin"))
+            # Older users.json files carried the counters inline; they seed the side file once.
+            seed = self.store.data.pop("global", {}).get("hatch_counts", {})
+        self.hatch_counter = HatchCounter(hatch_path or os.path.join(directory, "hatch_counts.jsonl"), seed=seed)
+        if economy:
+            self.backups = BackupManager(self.store, self.hatch_counter, os.path.join(directory, "backups"), ledger=self.ledger)
+
+    def close(self) -> None:
+        self.hatch_counter.flush()
+        if self.ledger:
+            self.ledger.seal()
+        if self.store:
+            self.store.save_seen()
+            self.replays.close()
+        if self.store and self.store.format == "binary":
+            self.store.export_json()
+
+
+# Partitions are opened on first use. The default partition is the one that
+# existed before guilds were split out, so an existing users.json simply
+# becomes it and nothing is copied.
+class Partitions:
+    def __init__(self, default: Partition, directory: str = GUILDS_DIR):
+        self.directory = directory
+        self.opened: Dict[str, Partition] = {DEFAULT_PARTITION: default}
+        self.opening: Dict[str, asyncio.Task] = {}
+
+    def _create(self, key: str) -> Partition:
+        if not key.isdigit():
+            raise ValueError(f"Invalid partition key {key!r}")
+        economy = guild_economy(int(key)) == "separate"
+        return Partition(key, os.path.join(self.directory, key), economy)
+
+    def _add(self, partition: Partition) -> Partition:
+        self.opened[partition.key] = partition
+        metrics.set("zoo_partitions_open", len(self.opened))
+        return partition
+
+    # Interactions and store frames open their partitions here first, reading
+    # the files in a thread; get() then finds them without touching the disk.
+    async def open(self, *keys: str) -> None:
+        for key in keys:
+            if key in self.opened:
+                continue
+            task = self.opening.get(key)
+            if task is None:
+                task = self.opening[key] = asyncio.create_task(self._open_later(key))
+            await asyncio.shield(task)
+
+    async def _open_later(self, key: str) -> None:
+        try:
+            self._add(await asyncio.to_thread(self._create, key))
+        finally:
+            del self.opening[key]
+
+    # Code outside an interaction (tools, loops) may still open a partition inline.
+    def get(self, key: str) -> Partition:
+        partition = self.opened.get(key)
+        if partition is None:
+            partition = self._add(self._create(key))
+        return partition
+
+    def profiles(self) -> Partition:
+        return self.get(profile_partition(current_guild.get()))
+
+    def hatches(self) -> Partition:
+        return self.get(hatch_partition(current_guild.get()))
+
+    async def flush(self) -> None:
+        for partition in list(self.opened.values()):
+            if partition.store:
+                await partition.store.flush()
+
+    def close(self) -> None:
+        for partition in self.opened.values():
+            partition.close()
+
+
+# Installed as the module-level store, hatch_counter and ledger. Attribute
+# access goes to the partition of the current guild, so command code keeps
+# calling store.load_profile(user_id); tools and code outside an interaction
+# see the default partition.
+class PartitionedStore:
+    def __init__(self, partitions: Partitions):
+        self.partitions = partitions
+
+    def __getattr__(self, name: str):
+        return getattr(self.partitions.profiles().store, name)
+
+
+class PartitionedHatchCounter:
+    def __init__(self, partitions: Partitions):
+        self.partitions = partitions
+
+    def __getattr__(self, name: str):
+        return getattr(self.partitions.hatches().hatch_counter, name)
+
+    def flush(self) -> None:
+        for partition in list(self.partitions.opened.values()):
+            partition.hatch_counter.flush()
+
+
+class PartitionedLedger:
+    def __init__(self, partitions: Partitions):
+        self.partitions = partitions
+
+    def __getattr__(self, name: str):
+        return getattr(self.partitions.profiles().ledger, name)
+
+    def seal(self) -> None:
+        for partition in list(self.partitions.opened.values()):
+            if partition.ledger:
+                partition.ledger.seal()
+
+    def rotate(self) -> None:
+        for partition in list(self.partitions.opened.values()):
+            if partition.ledger:
+                partition.ledger.rotate()
+
+
+class PartitionedTeamIndex:
+    def __init__(self, partitions: Partitions):
+        self.partitions = partitions
+
+    def __getattr__(self, name: str):
+        return getattr(self.partitions.profiles().teams, name)
+
+
+class PartitionedReplays:
+    def __init__(self, partitions: Partitions):
+        self.partitions = partitions
+
+    def __getattr__(self, name: str):
+        return getattr(self.partitions.profiles().replays, name)
+
+
+# Created by init_storage() so the game logic can be imported (benchmarks, tools)
+# without touching users.json.
+partitions: Partitions
+store: DataStore
+hatch_counter: HatchCounter
+ledger: Ledger
+teams: TeamIndex
+replays: ReplayStore
+
+
+def init_storage(
+    path: str = DATA_FILE_PATH, hatch_path: str = HATCH_COUNTS_PATH, ledger_dir: Optional[str] = None
+) -> None:
+    global partitions, store, hatch_counter, ledger, teams, replays
+    root = os.path.dirname(os.path.abspath(path))
+    default = Partition(DEFAULT_PARTITION, root, True, path, hatch_path, ledger_dir)
+    partitions = Partitions(default, os.path.join(root, "guilds"))
+    store = PartitionedStore(partitions)
+    hatch_counter = PartitionedHatchCounter(partitions)
+    ledger = PartitionedLedger(partitions)
+    teams = PartitionedTeamIndex(partitions)
+    replays = PartitionedReplays(partitions)
+
+
+# Start of every interaction and prefix command: scopes the routers to the
+# guild and opens its partitions off the loop if this process holds them.
+async def enter_guild(guild_id: Optional[int]) -> None:
+    current_guild.set(guild_id)
+    if startup.ready and not isinstance(store, RemoteStore):
+        await partitions.open(profile_partition(guild_id), hatch_partition(guild_id))
+
+
+# ==============================
+# Store service (multi-process mode)
+# ==============================
+
+# With --workers the bot runs as one store process plus gateway workers that
+# each own a slice of the shards. The store process is the only writer of the
+# users file, hatch counts and backups; workers reach it over a Unix socket
+# with length-prefixed JSON frames, each carrying a batch of ops. A worker
+# leases a user for the length of a command, so a player acting in two shards
+# at once is serialized instead of racing on their profile. Ops name the
+# partition they touch; leases are per partition and user.
+FRAME_HEADER = struct.Struct("<I")
+FRAME_MAX_BYTES = 64 * 1024 * 1024
+
+
+def write_frame(writer: asyncio.StreamWriter, payload: Dict) -> None:
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    writer.write(FRAME_HEADER.pack(len(body)) + body)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Dict]:
+    try:
+        (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+        if length > FRAME_MAX_BYTES:
+            raise ConnectionError(f"Frame of {length} bytes exceeds the limit")
+        return json.loads(await reader.readexactly(length))
+    except asyncio.IncompleteReadError:
+        return None
+
+
+def lease_key(op: Dict) -> str:
+    return f"{op['partition']}:{op['user_id']}"
+
+
+class StoreServer:
+    # Ops that may wait (for a lease or a backup) run in their own task so they
+    # never hold up the rest of a worker's traffic. Workers send them alone.
+    DEFERRED_OPS = frozenset(("acquire", "backup"))
+
+    def __init__(self, socket_path: str = STORE_SOCKET):
+        self.socket_path = socket_path
+        self.leases: Dict[str, asyncio.StreamWriter] = {}
+        self.waiters: Dict[str, Deque[Tuple[asyncio.StreamWriter, asyncio.Future]]] = {}
+
+    async def serve(self) -> None:
+        init_storage()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        loop.add_signal_handler(signal.SIGHUP, on_reload_signal)
+        tasks = [asyncio.create_task(coro) for coro in (hatch_flush_loop(), backup_loop(), archive_loop(), metrics_export_loop())]
+        server = await asyncio.start_unix_server(self.handle, path=self.socket_path)
+        print(f"🗄️ Store service listening on {self.socket_path}")
+        await stop.wait()
+        server.close()
+        for task in tasks:
+            task.cancel()
+        await partitions.flush()
+        partitions.close()
+        metrics.export()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.socket_path)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while (frame := await read_frame(reader)) is not None:
+                if any(op["op"] in self.DEFERRED_OPS for op in frame["ops"]):
+                    asyncio.create_task(self.reply_later(writer, frame))
+                    continue
+                try:
+                    # A guild's first frame opens its partition in a thread, not inside apply().
+                    await partitions.open(*{op["partition"] for op in frame["ops"]})
+                    write_frame(writer, {"id": frame["id"], "results": self.apply(writer, frame["ops"])})
+                except Exception as exc:
+                    print(f"❌ Store batch failed: {exc!r}")
+                    write_frame(writer, {"id": frame["id"], "error": repr(exc)})
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.drop(writer)
+            writer.close()
+
+    def apply(self, owner: asyncio.StreamWriter, ops: List[Dict]) -> List[Any]:
+        started = time.perf_counter()
+        results: List[Any] = []
+        saves: Dict[str, List[Dict]] = {}
+        for op in ops:
+            kind = op["op"]
+            partition = partitions.get(op["partition"])
+            if kind == "save":
+                saves.setdefault(partition.key, []).append(op["profile"])
+                results.append(None)
+            elif kind == "release":
+                self.release(owner, lease_key(op))
+                results.append(None)
+            elif kind == "peek":
+                results.append(partition.store.peek_any(op["user_id"]))
+            elif kind == "hatch":
+                partition.hatch_counter.add(op["counts"])
+                results.append(partition.hatch_counter.snapshot)
+            elif kind == "ledger":
+                partition.ledger.record(*op["event"])
+                results.append(None)
+            elif kind == "team":
+                partition.teams.update(op["user_id"], op["entry"])
+                results.append(None)
+            elif kind == "match":
+                results.append(partition.teams.find(op["user_id"], op["power"], op["centers"]))
+            elif kind == "replay":
+                partition.replays.add(op["user_id"], op["record"])
+                results.append(None)
+            elif kind == "replays":
+                results.append(partition.replays.get(op["user_id"]))
+            else:
+                raise ValueError(f"Unknown store op {kind!r}")
+        for key, profiles in saves.items():
+            # One write per partition per frame, however many profiles it carries.
+            partitions.get(key).store.save_profiles(profiles)
+        metrics.inc("zoo_store_frames_total")
+        metrics.observe("zoo_store_frame_ops", len(ops))
+        metrics.observe("zoo_store_frame_seconds", time.perf_counter() - started)
+        return results
+
+    async def reply_later(self, writer: asyncio.StreamWriter, frame: Dict) -> None:
+        try:
+            await partitions.open(*{op["partition"] for op in frame["ops"]})
+            results = []
+            for op in frame["ops"]:
+                if op["op"] == "acquire":
+                    await self.acquire(writer, lease_key(op))
+                    results.append(partitions.get(op["partition"]).store.load_profile(op["user_id"]))
+                elif op["op"] == "backup":
+                    results.append(await partitions.get(op["partition"]).backups.backup(full=op["full"]))
+                else:
+                    results.extend(self.apply(writer, [op]))
+            reply = {"id": frame["id"], "results": results}
+        except asyncio.CancelledError:
+            reply = {"id": frame["id"], "error": "cancelled"}
+        except Exception as exc:
+            print(f"❌ Store op failed: {exc!r}")
+            reply = {"id": frame["id"], "error": repr(exc)}
+        if not writer.is_closing():
+            write_frame(writer, reply)
+
+    async def acquire(self, owner: asyncio.StreamWriter, key: str) -> None:
+        holder = self.leases.get(key)
+        if holder is None or holder is owner:
+            self.leases[key] = owner
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(key, deque()).append((owner, future))
+        metrics.inc("zoo_store_lease_waits_total")
+        # release() hands the lease to this waiter before resolving the future.
+        await future
+
+    def release(self, owner: asyncio.StreamWriter, key: str) -> None:
+        if self.leases.get(key) is not owner:
+            # The command gave up before its lease was granted.
+            for waiter, future in self.waiters.get(key, ()):
+                if waiter is owner:
+                    future.cancel()
+            return
+        del self.leases[key]
+        self.hand_over(key)
+
+    def hand_over(self, key: str) -> None:
+        queue = self.waiters.get(key)
+        while queue:
+            owner, future = queue.popleft()
+            if not future.done():
+                self.leases[key] = owner
+                future.set_result(None)
+                break
+        if queue is not None and not queue:
+            del self.waiters[key]
+
+    def drop(self, owner: asyncio.StreamWriter) -> None:
+        for queue in self.waiters.values():
+            for waiter, future in queue:
+                if waiter is owner:
+                    future.cancel()
+        for key in [key for key, holder in self.leases.items() if holder is owner]:
+            del self.leases[key]
+            self.hand_over(key)
+
+
+# Worker-side stand-in for DataStore. Profiles of leased users are cached
+# locally so command code keeps its synchronous load/save calls; saves and
+# releases queued during one loop iteration go out as a single frame. Cache
+# and leases are keyed by (profile partition of the current guild, user id).
+class RemoteStore:
+    format = "remote"
+
+    def __init__(self, socket_path: str = STORE_SOCKET):
+        self.socket_path = socket_path
+        self.cache: Dict[Tuple[str, str], Dict] = {}
+        self.depth: Counter = Counter()
+        self.granting: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.pending_saves: Dict[Tuple[str, str], Dict] = {}
+        self.pending_ops: List[Tuple[Dict, Optional[Callable[[Any], None]]]] = []
+        self.flush_scheduled = False
+        self.replies: Dict[int, asyncio.Future] = {}
+        self.next_id = 0
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self, attempts: int = 100) -> None:
+        # Workers start alongside the store process, so wait for its socket.
+        for _ in range(attempts):
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError(f"Store service is not reachable at {self.socket_path}")
+        asyncio.create_task(self._read_replies())
+
+    async def _read_replies(self) -> None:
+        while (frame := await read_frame(self.reader)) is not None:
+            future = self.replies.pop(frame["id"], None)
+            if future is None or future.done():
+                continue
+            if "error" in frame:
+                future.set_exception(RuntimeError(f"Store service error: {frame['error']}"))
+            else:
+                future.set_result(frame["results"])
+        print("❌ Store service connection closed")
+        for future in self.replies.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Store service connection closed"))
+        self.replies.clear()
+
+    def request(self, ops: List[Dict]) -> asyncio.Future:
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.replies[self.next_id] = future
+        write_frame(self.writer, {"id": self.next_id, "ops": ops})
+        metrics.inc("zoo_store_frames_total")
+        metrics.observe("zoo_store_frame_ops", len(ops))
+        return future
+
+    def queue(self, op: Dict, on_result: Optional[Callable[[Any], None]] = None) -> None:
+        self.pending_ops.append((op, on_result))
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+
+    def flush(self) -> Optional[asyncio.Future]:
+        self.flush_scheduled = False
+        if not self.pending_saves and not self.pending_ops:
+            return None
+        # Saves go first so a release in the same frame never overtakes them.
+        entries = [
+            ({"op": "save", "partition": partition, "profile": profile}, None)
+            for (partition, _), profile in self.pending_saves.items()
+        ]
+        entries += self.pending_ops
+        self.pending_saves, self.pending_ops = {}, []
+        future = self.request([op for op, _ in entries])
+        future.add_done_callback(lambda done: self._dispatch(done, entries))
+        return future
+
+    def _dispatch(self, future: asyncio.Future, entries: List[Tuple[Dict, Optional[Callable[[Any], None]]]]) -> None:
+        if future.cancelled():
+            return
+        if future.exception():
+            print(f"❌ Store batch failed: {future.exception()}")
+            return
+        for (_, on_result), result in zip(entries, future.result()):
+            if on_result:
+                on_result(result)
+
+    async def drain(self) -> None:
+        future = self.flush()
+        if future:
+            with contextlib.suppress(Exception):
+                await future
+
+    @staticmethod
+    def key(user_id: str) -> Tuple[str, str]:
+        return profile_partition(current_guild.get()), user_id
+
+    @contextlib.asynccontextmanager
+    async def lease(self, user_id: str):
+        key = self.key(user_id)
+        self.depth[key] += 1
+        try:
+            # Commands for a user this worker already holds share the lease.
+            if self.depth[key] == 1:
+                self.granting[key] = asyncio.ensure_future(self._acquire(key))
+            started = time.perf_counter()
+            await asyncio.shield(self.granting[key])
+            metrics.observe("zoo_store_lease_seconds", time.perf_counter() - started)
+            yield
+        finally:
+            self.depth[key] -= 1
+            if not self.depth[key]:
+                del self.depth[key]
+                self.granting.pop(key, None)
+                self.queue({"op": "release", "partition": key[0], "user_id": user_id})
+                if len(self.cache) > REMOTE_CACHE_USERS:
+                    self.cache.pop(key, None)
+
+    async def _acquire(self, key: Tuple[str, str]) -> None:
+        # Anything still queued for this user must land before the fresh copy is read.
+        self.flush()
+        (profile,) = await self.request([{"op": "acquire", "partition": key[0], "user_id": key[1]}])
+        self.cache[key] = profile
+
+    async def prefetch(self, user_id: str) -> None:
+        key = self.key(user_id)
+        if key in self.cache:
+            return
+        (profile,) = await self.request([{"op": "peek", "partition": key[0], "user_id": user_id}])
+        if profile is not None and key not in self.cache:
+            self.cache[key] = profile
 
+    async def backup(self, full: bool) -> str:
+        self.flush()
+        (path,) = await self.request([{"op": "backup", "partition": profile_partition(current_guild.get()), "full": full}])
+        return path
 
-store = DataStore()
-DAILY_COOLDOWNS: Dict[str, float] = {}
+    def load_profile(self, user_id: str) -> Dict:
+        key = self.key(user_id)
+        if key not in self.depth:
+            raise RuntimeError(f"Profile {user_id} was loaded without a lease")
+        return self.cache[key]
+
+    def peek_profile(self, user_id: str) -> Optional[Dict]:
+        return self.cache.get(self.key(user_id))
+
+    def save_profile(self, profile: Dict) -> None:
+        key = self.key(profile["user_id"])
+        self.cache[key] = profile
+        self.pending_saves[key] = profile
+        self._schedule_flush()
+
+
+# Hunts in a worker buffer counts locally, per partition; flush() ships them to
+# the store process and refreshes each snapshot with the cluster-wide totals it
+# returns. A guild's counts are first fetched when something reads them.
+class RemoteHatchCounter:
+    def __init__(self, remote: RemoteStore):
+        self.remote = remote
+        self.pending: Dict[str, Counter] = {}
+        self.snapshots: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def snapshot(self) -> Dict[str, int]:
+        key = hatch_partition(current_guild.get())
+        if key not in self.snapshots:
+            self.snapshots[key] = {}
+            self._send(key, {})
+        return self.snapshots[key]
+
+    def add(self, counts: Dict[str, int]) -> None:
+        self.pending.setdefault(hatch_partition(current_guild.get()), Counter()).update(counts)
+
+    def get(self, animal_id: str) -> int:
+        return self.snapshot.get(animal_id, 0)
+
+    def flush(self) -> None:
+        pending, self.pending = self.pending, {}
+        for key in {DEFAULT_PARTITION, *self.snapshots, *pending}:
+            self._send(key, dict(pending.get(key, {})))
+
+    def _send(self, key: str, delta: Dict[str, int]) -> None:
+        self.remote.queue({"op": "hatch", "partition": key, "counts": delta}, lambda snapshot: self._refresh(key, snapshot))
+
+    def _refresh(self, key: str, snapshot: Dict[str, int]) -> None:
+        self.snapshots[key] = snapshot
+
+
+# Workers forward ledger events to the store process, the ledger's only writer.
+class RemoteLedger:
+    def __init__(self, remote: RemoteStore):
+        self.remote = remote
+
+    def record(
+        self,
+        user_id: str,
+        kind: str,
+        coins: int = 0,
+        energy: int = 0,
+        animals: Optional[Dict[str, int]] = None,
+        foods: Optional[Dict[str, int]] = None,
+        equip: Optional[Tuple[int, str]] = None,
+        seed: int = 0,
+        aux: float = 0.0,
+    ) -> None:
+        event = [user_id, kind, coins, energy, animals, foods, equip, seed, aux]
+        self.remote.queue({"op": "ledger", "partition": profile_partition(current_guild.get()), "event": event})
+
+    def seal(self) -> None:
+        pass
+
+    def rotate(self) -> None:
+        # The store process rotates on its own reload.
+        pass
+
+
+# Team changes are queued like ledger events; matchmaking asks the store
+# process, which holds the only index of each partition.
+class RemoteTeamIndex:
+    def __init__(self, remote: RemoteStore):
+        self.remote = remote
+
+    def update(self, user_id: str, entry: Optional[List]) -> None:
+        self.remote.queue({"op": "team", "partition": profile_partition(current_guild.get()), "user_id": user_id, "entry": entry})
+
+    async def find(self, user_id: str, power: float, centers: List[int]) -> Optional[Tuple[str, Tuple[Optional[str], ...]]]:
+        # A team change queued by this command must be indexed before the lookup.
+        self.remote.flush()
+        op = {"op": "match", "partition": profile_partition(current_guild.get()), "user_id": user_id}
+        (match,) = await self.remote.request([{**op, "power": power, "centers": centers}])
+        return (match[0], tuple(match[1])) if match else None
+
+
+# Battles reach the store process as plain records; it packs them.
+class RemoteReplays:
+    def __init__(self, remote: RemoteStore):
+        self.remote = remote
+
+    def add(self, user_id: str, record: Dict) -> None:
+        self.remote.queue({"op": "replay", "partition": profile_partition(current_guild.get()), "user_id": user_id, "record": record})
+
+    async def get(self, user_id: str) -> List[Dict]:
+        self.remote.flush()
+        (records,) = await self.remote.request([{"op": "replays", "partition": profile_partition(current_guild.get()), "user_id": user_id}])
+        return records
+
+
+async def init_remote_storage(socket_path: str = STORE_SOCKET) -> None:
+    global store, hatch_counter, ledger, teams, replays
+    remote = RemoteStore(socket_path)
+    await remote.connect()
+    store = remote
+    hatch_counter = RemoteHatchCounter(remote)
+    ledger = RemoteLedger(remote)
+    teams = RemoteTeamIndex(remote)
+    replays = RemoteReplays(remote)
+    hatch_counter.flush()
+
+
+# Backs up the partition holding the current guild's profiles.
+async def create_backup(full: bool) -> str:
+    if isinstance(store, RemoteStore):
+        return await store.backup(full)
+    return await partitions.profiles().backups.backup(full=full)
+
+
+def run_cluster(workers: int, shard_count: int) -> int:
+    # Create the shared RNG secret up front so workers never race to write it.
+    load_rng_secret()
+    shard_count = max(shard_count, workers)
+    env = {
+        **os.environ,
+        "STORE_SOCKET": STORE_SOCKET,
+        "SHARD_COUNT": str(shard_count),
+        "ZOO_SUPERVISOR_PID": str(os.getpid()),
+    }
+    command = [sys.executable, os.path.abspath(__file__)]
+    store_process = subprocess.Popen(command, env={**env, "ZOO_ROLE": "store"})
+    processes = []
+    for index in range(workers):
+        shard_ids = ",".join(str(shard) for shard in range(index, shard_count, workers))
+        processes.append(subprocess.Popen(command, env={**env, "ZOO_ROLE": "worker", "SHARD_IDS": shard_ids}))
+    print(f"🧩 Started {workers} workers over {shard_count} shards")
+
+    # SIGHUP (or /reload in any worker) reloads the catalog in every process.
+    def forward_reload(signum, frame) -> None:
+        for process in [store_process] + processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGHUP)
+
+    signal.signal(signal.SIGHUP, forward_reload)
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Workers drain their queued saves before the store process stops.
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+        for process in processes:
+            process.wait()
+        if store_process.poll() is None:
+            store_process.send_signal(signal.SIGINT)
+        store_process.wait()
+    return max([process.returncode for process in processes] + [store_process.returncode, 0])
 
 
 # ==============================
@@ -334,20 +3007,68 @@ DAILY_COOLDOWNS: Dict[str, float] = {}
 
 def resolve_animal(query: str) -> Optional[Animal]:
     key = query.strip().lower()
-    animal_id = ALIASES.get(key)
+    animal_id = catalog.aliases.get(key)
     if animal_id:
-        return ANIMALS[animal_id]
+        return catalog.animals[animal_id]
     return None
 
 
 def resolve_food(query: str) -> Optional[Food]:
     key = query.strip().lower()
-    food_id = FOOD_ALIASES.get(key)
+    food_id = catalog.food_aliases.get(key)
     if food_id:
-        return FOODS[food_id]
+        return catalog.foods[food_id]
     return None
 
 
+AUTOCOMPLETE_LIMIT = 25
+
+
+def ranked_choices(
+    trie: PrefixTrie,
+    current: str,
+    owned: Dict[str, int],
+    label: Callable[[str], str],
+    value: Callable[[str], str],
+    keep: Optional[Callable[[str], bool]] = None,
+) -> List[app_commands.Choice[str]]:
+    ids = trie.lookup(current.strip().lower())
+    if keep:
+        ids = [item_id for item_id in ids if keep(item_id)]
+    ids = sorted(ids, key=lambda item_id: (-owned.get(item_id, 0), item_id))[:AUTOCOMPLETE_LIMIT]
+    return [
+        app_commands.Choice(name=f"{label(item_id)} — owned {owned.get(item_id, 0)}", value=value(item_id))
+        for item_id in ids
+    ]
+
+
+def animal_choices(
+    user_id: str, current: str, keep: Optional[Callable[[str], bool]] = None
+) -> List[app_commands.Choice[str]]:
+    profile = store.peek_profile(user_id)
+    animals = catalog.animals
+    return ranked_choices(
+        catalog.animal_trie,
+        current,
+        profile.get("zoo", {}) if profile else {},
+        lambda animal_id: f"{animals[animal_id].emoji} {animal_id.replace('_', ' ')}",
+        lambda animal_id: animals[animal_id].aliases[0],
+        keep,
+    )
+
+
+def food_choices(user_id: str, current: str) -> List[app_commands.Choice[str]]:
+    profile = store.peek_profile(user_id)
+    foods = catalog.foods
+    return ranked_choices(
+        catalog.food_trie,
+        current,
+        profile.get("foods", {}) if profile else {},
+        lambda food_id: f"{foods[food_id].emoji} {food_id.replace('_', ' ')}",
+        lambda food_id: foods[food_id].aliases[0],
+    )
+
+
 def now() -> float:
     return time.time()
 
@@ -393,13 +3114,13 @@ def add_food(profile: Dict, food_id: str, amount: int) -> None:
 
 
 def rarity_header(rarity: str) -> str:
-    symbol = dict(RARITY_ORDER)[rarity]
+    symbol = catalog.rarity_symbols[rarity]
     return f"{symbol} {rarity}"
 
 
-def coins_reward(enemy_multiplier: float) -> int:
+def coins_reward(enemy_multiplier: float, boost: float = 1.0) -> int:
     base = 10
-    scaled = round(base * enemy_multiplier)
+    scaled = round(base * enemy_multiplier * boost)
     return max(5, scaled)
 
 
@@ -416,23 +3137,33 @@ def team_def_alive(team_hp: Dict[str, int], team_animals: Dict[str, Animal]) ->
     return total
 
 
-def pick_rarity() -> str:
-    roll = random.random() * 100
+def pick_rarity(rng: random.Random = random, cat: Optional[Catalog] = None) -> str:
+    drop_table = (cat or catalog).drop_table
+    roll = rng.random() * 100
     cumulative = 0.0
-    for chance, rarity in DROP_TABLE:
+    for chance, rarity in drop_table:
         cumulative += chance
         if roll <= cumulative:
             return rarity
-    return DROP_TABLE[-1][1]
+    return drop_table[-1][1]
 
 
-def random_animal_by_rarity_and_role(allowed_indices: List[int], role: str) -> Animal:
-    candidates = [a for a in ANIMALS.values() if a.role == role and a.rarity_index in allowed_indices]
-    return random.choice(candidates)
+def pick_rarities(count: int, rng: random.Random = random, cat: Optional[Catalog] = None) -> List[str]:
+    # Batch form of pick_rarity: one choices() call draws every roll.
+    cat = cat or catalog
+    return rng.choices(cat.drop_rarities, cum_weights=cat.drop_cum_weights, k=count)
 
 
-def power(animal: Animal) -> float:
-    return animal.hp * 1.0 + animal.atk * 1.5 + animal.defense * 1.2
+def roll_animals(rolls: int, rng: random.Random = random, cat: Optional[Catalog] = None) -> List[Animal]:
+    cat = cat or catalog
+    choice, pools = rng.choice, cat.rarity_pools
+    return [choice(pools[rarity]) for rarity in pick_rarities(rolls, rng, cat)]
+
+
+def random_animal_by_rarity_and_role(
+    allowed_indices: List[int], role: str, rng: random.Random = random, cat: Optional[Catalog] = None
+) -> Animal:
+    return rng.choice((cat or catalog).enemy_pools[(role, tuple(allowed_indices))])
 
 
 def food_power(food: Optional[Food]) -> float:
@@ -448,40 +3179,710 @@ def apply_food(animal: Animal, food: Optional[Food]) -> Tuple[int, int, int]:
     return hp, atk, defense
 
 
-class MyClient(discord.Client):
+# ==============================
+# Randomness
+# ==============================
+
+
+def load_rng_secret(path: str = RNG_SECRET_PATH) -> bytes:
+    secret = os.getenv("RNG_SECRET")
+    if secret:
+        return secret.encode("utf-8")
+    if not os.path.exists(path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(os.urandom(32).hex())
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip().encode("utf-8")
+
+
+# Every hunt/battle draws from its own random.Random seeded with
+# HMAC(secret, "user:command:counter"). The counter lives in the profile and the
+# seed is kept in profile["last_seeds"], so a result can be replayed offline
+# with resimulate.py.
+class RngService:
+    def __init__(self, secret: bytes):
+        self.secret = secret
+
+    def derive_seed(self, user_id: str, command: str, counter: int) -> int:
+        message = f"{user_id}:{command}:{counter}".encode("utf-8")
+        return int.from_bytes(hmac.new(self.secret, message, hashlib.sha256).digest()[:8], "big")
+
+    def stream(self, profile: Dict, command: str) -> Tuple[int, random.Random]:
+        counters = profile.setdefault("rng_counters", {})
+        counters[command] = counters.get(command, 0) + 1
+        seed = self.derive_seed(profile["user_id"], command, counters[command])
+        profile.setdefault("last_seeds", {})[command] = seed
+        return seed, random.Random(seed)
+
+
+rng_service: RngService
+
+
+def init_rng(secret: Optional[bytes] = None) -> None:
+    global rng_service
+    rng_service = RngService(secret or load_rng_secret())
+
+
+# ==============================
+# Game logic
+# ==============================
+
+
+def rarity_window(animals: List[Animal], cat: Optional[Catalog] = None) -> List[int]:
+    avg_index = round(sum(a.rarity_index for a in animals) / len(animals))
+    return list(index_window(avg_index, len((cat or catalog).rarity_order)))
+
+
+# Food-adjusted view of a profile's team. Built once per team/food change and
+# reused by /battle and /team view; the key guards against profiles edited
+# elsewhere (another worker, a restore) without going through invalidate_team.
+@dataclass(frozen=True)
+class TeamSnapshot:
+    key: Tuple[Optional[str], ...]
+    animals: Dict[str, Animal]
+    foods: Dict[str, Optional[Food]]
+    stats: Dict[str, Tuple[int, int, int]]
+    power: float
+    avg_rarity: float
+    allowed_indices: List[int]
+
+    @property
+    def complete(self) -> bool:
+        return len(self.animals) == len(SLOT_KEYS)
+
+
+TEAM_CACHE_USERS = 50_000
+TEAM_CACHE: Dict[str, TeamSnapshot] = {}
+
+
+def team_key(profile: Dict) -> Tuple[Optional[str], ...]:
+    team, equipped = profile["team"], profile["equipped_foods"]
+    return tuple(team.get(slot) for slot in SLOT_KEYS) + tuple(equipped.get(slot) for slot in SLOT_KEYS)
+
+
+def build_team_snapshot(key: Tuple[Optional[str], ...], cat: Catalog) -> TeamSnapshot:
+    animals = {slot: cat.animals[animal_id] for slot, animal_id in zip(SLOT_KEYS, key[:3]) if animal_id in cat.animals}
+    foods = {slot: cat.foods.get(food_id) if food_id else None for slot, food_id in zip(SLOT_KEYS, key[3:])}
+    stats = {slot: apply_food(animal, foods[slot]) for slot, animal in animals.items()}
+    team_power = sum(cat.powers[animal.animal_id] + food_power(foods[slot]) for slot, animal in animals.items())
+    avg_rarity = sum(a.rarity_index for a in animals.values()) / len(animals) if animals else 0.0
+    allowed = rarity_window(list(animals.values()), cat) if animals else []
+    return TeamSnapshot(key, animals, foods, stats, team_power, avg_rarity, allowed)
+
+
+# Cached snapshots hold catalog objects; reload_catalog clears the cache.
+def team_snapshot(profile: Dict, cat: Optional[Catalog] = None) -> TeamSnapshot:
+    user_id = profile["user_id"]
+    key = team_key(profile)
+    snapshot = TEAM_CACHE.get(user_id)
+    if snapshot is None or snapshot.key != key:
+        if snapshot is None and len(TEAM_CACHE) >= TEAM_CACHE_USERS:
+            TEAM_CACHE.pop(next(iter(TEAM_CACHE)))
+        snapshot = TEAM_CACHE[user_id] = build_team_snapshot(key, cat or catalog)
+    return snapshot
+
+
+def invalidate_team(user_id: str) -> None:
+    TEAM_CACHE.pop(user_id, None)
+
+
+# Matchmaking entry for /battle pvp, or None while the team is incomplete.
+# Powers come from the base catalog, not a live event.
+def team_entry(profile: Dict) -> Optional[List]:
+    team = build_team_snapshot(team_key(profile), catalog)
+    if not team.complete:
+        return None
+    return [list(team.key), team.power, round(team.avg_rarity)]
+
+
+def index_team(profile: Dict) -> None:
+    teams.update(profile["user_id"], team_entry(profile))
+
+
+async def find_opponent(user_id: str, team: TeamSnapshot) -> Optional[Tuple[str, Tuple[Optional[str], ...]]]:
+    if isinstance(teams, RemoteTeamIndex):
+        return await teams.find(user_id, team.power, team.allowed_indices)
+    return teams.find(user_id, team.power, team.allowed_indices)
+
+
+async def recent_replays(user_id: str) -> List[Dict]:
+    if isinstance(replays, RemoteReplays):
+        return await replays.get(user_id)
+    return replays.get(user_id)
+
+
+def random_enemy_team(
+    allowed_indices: List[int], rng: random.Random = random, cat: Optional[Catalog] = None
+) -> Dict[str, Animal]:
+    return {
+        "slot1": random_animal_by_rarity_and_role(allowed_indices, "TANK", rng, cat),
+        "slot2": random_animal_by_rarity_and_role(allowed_indices, "ATTACK", rng, cat),
+        "slot3": random_animal_by_rarity_and_role(allowed_indices, "SUPPORT", rng, cat),
+    }
+
+
+def find_enemy_team(
+    allowed_indices: List[int],
+    target_power: float,
+    last_signature: Optional[str],
+    rng: random.Random = random,
+    cat: Optional[Catalog] = None,
+) -> Dict[str, Animal]:
+    cat = cat or catalog
+    best_team: Optional[Dict[str, Animal]] = None
+    best_delta = float("inf")
+    for attempt in range(50):
+        enemy_team = random_enemy_team(allowed_indices, rng, cat)
+        signature = enemy_signature(enemy_team)
+        if signature == last_signature:
+            continue
+        pwr = sum(cat.powers[a.animal_id] for a in enemy_team.values())
+        delta = abs(pwr - target_power)
+        if delta < best_delta:
+            best_delta = delta
+            best_team = enemy_team
+        if delta <= target_power * 0.07:
+            best_team = enemy_team
+            break
+    return best_team or random_enemy_team(allowed_indices, rng, cat)
+
+
+def hunt_rolls(seed: int, rolls: int, cat: Optional[Catalog] = None) -> List[str]:
+    return [animal.animal_id for animal in roll_animals(rolls, random.Random(seed), cat)]
+
+
+# Everything a battle draws from its seed, returned as plain values so it can
+# run in the offload pool: (enemy multiplier, enemy ids by slot, player hp,
+# enemy hp, player won, deaths for the replay).
+def simulate_battle(
+    player_stats: Dict[str, Tuple[int, int, int]],
+    player_power: float,
+    allowed_indices: List[int],
+    last_signature: Optional[str],
+    seed: int,
+    cat: Optional[Catalog] = None,
+) -> Tuple[float, Dict[str, str], Dict[str, int], Dict[str, int], bool, List[List[int]]]:
+    rng = random.Random(seed)
+    enemy_multiplier = rng.uniform(0.85, 1.3)
+    enemy = find_enemy_team(allowed_indices, player_power * enemy_multiplier, last_signature, rng, cat)
+    enemy_stats = {slot: (a.hp, a.atk, a.defense) for slot, a in enemy.items()}
+    player_hp, enemy_hp, player_win, kills = resolve_recorded(player_stats, enemy_stats)
+    return enemy_multiplier, {slot: a.animal_id for slot, a in enemy.items()}, player_hp, enemy_hp, player_win, kills
+
+
+def first_alive(hp_map: Dict[str, int]) -> Optional[str]:
+    for i in range(1, 4):
+        slot = f"slot{i}"
+        if hp_map[slot] > 0:
+            return slot
+    return None
+
+
+def attack_phase(
+    attacker_hp: Dict[str, int],
+    attacker_stats: Dict[str, Tuple[int, int, int]],
+    defender_hp: Dict[str, int],
+    defender_stats: Dict[str, Tuple[int, int, int]],
+    hits: Optional[List[Tuple[str, str, int, int]]] = None,
+) -> None:
+    for i in range(1, 4):
+        slot = f"slot{i}"
+        if attacker_hp.get(slot, 0) <= 0:
+            continue
+        target_slot = first_alive(defender_hp)
+        if not target_slot:
+            break
+        def_value = sum(defender_stats[s][2] for s, hp in defender_hp.items() if hp > 0)
+        dmg = max(1, attacker_stats[slot][1] - def_value)
+        defender_hp[target_slot] = max(0, defender_hp[target_slot] - dmg)
+        if hits is not None:
+            hits.append((slot, target_slot, dmg, defender_hp[target_slot]))
+
+
+# With a `phases` list, every attack phase appends its hits as (attacker slot,
+# target slot, damage, target hp left): player phases at even indices, enemy
+# phases at odd ones.
+def resolve_battle(
+    player_stats: Dict[str, Tuple[int, int, int]],
+    enemy_stats: Dict[str, Tuple[int, int, int]],
+    phases: Optional[List[List[Tuple[str, str, int, int]]]] = None,
+) -> Tuple[Dict[str, int], Dict[str, int], bool]:
+    player_hp = {slot: stats[0] for slot, stats in player_stats.items()}
+    enemy_hp = {slot: stats[0] for slot, stats in enemy_stats.items()}
+    rounds = 0
+    while first_alive(player_hp) and first_alive(enemy_hp) and rounds < 100:
+        rounds += 1
+        hits = None if phases is None else []
+        attack_phase(player_hp, player_stats, enemy_hp, enemy_stats, hits)
+        if phases is not None:
+            phases.append(hits)
+        if not first_alive(enemy_hp):
+            break
+        hits = None if phases is None else []
+        attack_phase(enemy_hp, enemy_stats, player_hp, player_stats, hits)
+        if phases is not None:
+            phases.append(hits)
+
+    player_alive = first_alive(player_hp) is not None
+    enemy_alive = first_alive(enemy_hp) is not None
+    if rounds >= 100 and player_alive and enemy_alive:
+        player_win = sum(player_hp.values()) > sum(enemy_hp.values())
+    else:
+        player_win = player_alive and not enemy_alive
+    return player_hp, enemy_hp, player_win
+
+
+# Deaths of a recorded battle as [round, side (0 player, 1 enemy), attacker
+# slot index, target slot index]. Between two deaths every round repeats the
+# same hits, so the starting stats plus these keyframes are the whole battle.
+def battle_kills(phases: List[List[Tuple[str, str, int, int]]]) -> List[List[int]]:
+    kills = []
+    for idx, hits in enumerate(phases):
+        for hit in hits:
+            if not hit[3]:
+                kills.append([idx // 2 + 1, idx % 2, SLOT_KEYS.index(hit[0]), SLOT_KEYS.index(hit[1])])
+    return kills
+
+
+def resolve_recorded(
+    player_stats: Dict[str, Tuple[int, int, int]], enemy_stats: Dict[str, Tuple[int, int, int]]
+) -> Tuple[Dict[str, int], Dict[str, int], bool, List[List[int]]]:
+    phases: List[List[Tuple[str, str, int, int]]] = []
+    player_hp, enemy_hp, player_win = resolve_battle(player_stats, enemy_stats, phases)
+    return player_hp, enemy_hp, player_win, battle_kills(phases)
+
+
+# What /replay keeps of one battle; ReplayStore packs it into a few dozen bytes.
+def battle_record(
+    player_ids: Dict[str, str],
+    player_stats: Dict[str, Tuple[int, int, int]],
+    enemy_ids: Dict[str, str],
+    enemy_stats: Dict[str, Tuple[int, int, int]],
+    player_win: bool,
+    kills: List[List[int]],
+    opponent: Optional[str] = None,
+) -> Dict:
+    return {
+        "ts": int(time.time()),
+        "win": player_win,
+        "opponent": int(opponent) if opponent else None,
+        "animals": [player_ids[slot] for slot in SLOT_KEYS] + [enemy_ids[slot] for slot in SLOT_KEYS],
+        "stats": [list(player_stats[slot]) for slot in SLOT_KEYS] + [list(enemy_stats[slot]) for slot in SLOT_KEYS],
+        "kills": kills,
+    }
+
+
+# Re-runs a recorded battle under the current rules. The second value is False
+# when the deaths no longer match the recorded ones (the rules changed since).
+def replay_phases(record: Dict) -> Tuple[List[List[Tuple[str, str, int, int]]], bool]:
+    player_stats = {slot: tuple(stats) for slot, stats in zip(SLOT_KEYS, record["stats"][:3])}
+    enemy_stats = {slot: tuple(stats) for slot, stats in zip(SLOT_KEYS, record["stats"][3:])}
+    phases: List[List[Tuple[str, str, int, int]]] = []
+    resolve_battle(player_stats, enemy_stats, phases)
+    return phases, battle_kills(phases) == record["kills"]
+
+
+def plan_rarity_sale(profile: Dict, rarity: str, sell_count: Optional[int]) -> List[Tuple[Animal, int]]:
+    plan: List[Tuple[Animal, int]] = []
+    for animal_obj in catalog.rarity_pools[rarity]:
+        available = sellable_amount(profile, animal_obj.animal_id)
+        if available <= 0:
+            continue
+        qty = available if sell_count is None else min(available, sell_count)
+        if qty > 0:
+            plan.append((animal_obj, qty))
+    return plan
+
+
+def food_sale_value(food: Food, amount: int) -> int:
+    return int(food.cost * amount * 0.5)
+
+
+# Sale targets: rarity names, "animals" / "foods" for everything, or any
+# animal or food alias. Returns (animal ids, food ids, unknown tokens).
+def parse_sale_targets(text: str, cat: Catalog) -> Tuple[List[str], List[str], List[str]]:
+    animal_ids: Dict[str, None] = {}
+    food_ids: Dict[str, None] = {}
+    unknown: List[str] = []
+    for token in text.replace(",", " ").lower().split():
+        if token.upper() in cat.rarity_pools:
+            animal_ids.update(dict.fromkeys(a.animal_id for a in cat.rarity_pools[token.upper()]))
+        elif token in ("all", "animals"):
+            animal_ids.update(dict.fromkeys(cat.animals))
+        elif token == "foods":
+            food_ids.update(dict.fromkeys(cat.foods))
+        elif token in cat.aliases:
+            animal_ids[cat.aliases[token]] = None
+        elif token in cat.food_aliases:
+            food_ids[cat.food_aliases[token]] = None
+        else:
+            unknown.append(token)
+    return list(animal_ids), list(food_ids), unknown
+
+
+# One pass over the targets: team animals and equipped foods are never sold,
+# and `keep` more of each are left behind.
+def plan_bulk_sale(
+    profile: Dict, animal_ids: List[str], food_ids: List[str], keep: int, cat: Catalog
+) -> Tuple[List[Tuple[Animal, int]], List[Tuple[Food, int]]]:
+    animals = []
+    for animal_id in animal_ids:
+        qty = sellable_amount(profile, animal_id) - keep
+        if qty > 0:
+            animals.append((cat.animals[animal_id], qty))
+    equipped = set(profile.get("equipped_foods", {}).values())
+    foods = []
+    for food_id in food_ids:
+        qty = profile["foods"].get(food_id, 0) - keep
+        if qty > 0 and food_id not in equipped:
+            foods.append((cat.foods[food_id], qty))
+    return animals, foods
+
+
+# Commits a planned sale in one save. Quantities are clamped to what is still
+# sellable, since a confirmation prompt may have waited while other commands ran.
+def finalize_sale(
+    profile: Dict,
+    changes: List[Tuple[Animal, int]],
+    cat: Optional[Catalog] = None,
+    foods: Optional[List[Tuple[Food, int]]] = None,
+) -> Tuple[int, int]:
+    sell_values = (cat or catalog).sell_values
+    total_coins = 0
+    total_sold = 0
+    removed: Dict[str, int] = {}
+    for animal_obj, qty in changes:
+        current_amount = profile["zoo"].get(animal_obj.animal_id, 0)
+        qty = min(qty, max(0, sellable_amount(profile, animal_obj.animal_id)))
+        profile["zoo"][animal_obj.animal_id] = current_amount - qty
+        removed[animal_obj.animal_id] = removed.get(animal_obj.animal_id, 0) - qty
+        total_coins += qty * sell_values[animal_obj.rarity]
+        total_sold += qty
+    equipped = set(profile.get("equipped_foods", {}).values())
+    sold_foods: Dict[str, int] = {}
+    for food_obj, qty in foods or ():
+        owned = profile["foods"].get(food_obj.food_id, 0)
+        qty = 0 if food_obj.food_id in equipped else min(qty, owned)
+        if qty <= 0:
+            continue
+        profile["foods"][food_obj.food_id] = owned - qty
+        sold_foods[food_obj.food_id] = sold_foods.get(food_obj.food_id, 0) - qty
+        total_coins += food_sale_value(food_obj, qty)
+        total_sold += qty
+    profile["coins"] += total_coins
+    store.save_profile(profile)
+    ledger.record(profile["user_id"], "sell", coins=total_coins, animals=removed, foods=sold_foods)
+    return total_sold, total_coins
+
+
+BUY_LIMIT = 99
+
+
+# Orders look like "honey x3, apple 2, pepper": comma separated foods with an
+# optional quantity. Repeated foods are merged. Returns (order, unknown tokens).
+# Returns the order, the entries naming no food, and the entries whose
+# quantity is zero.
+def parse_order(text: str) -> Tuple[List[Tuple[Food, int]], List[str], List[str]]:
+    order: Dict[str, int] = {}
+    unknown: List[str] = []
+    zero: List[str] = []
+    for token in text.split(","):
+        token = token.strip()
+        if not token:
+            continue
+        name, _, amount = token.rpartition(" ")
+        amount = amount.lower().lstrip("x×")
+        query, qty = (name, int(amount)) if name and amount.isdigit() else (token, 1)
+        food = resolve_food(query)
+        if food is None:
+            unknown.append(token)
+            continue
+        if qty <= 0:
+            zero.append(token)
+            continue
+        order[food.food_id] = order.get(food.food_id, 0) + qty
+    return [(catalog.foods[food_id], qty) for food_id, qty in order.items()], unknown, zero
+
+
+def order_cost(order: List[Tuple[Food, int]]) -> int:
+    return sum(food.cost * qty for food, qty in order)
+
+
+# Applies a whole order with one save and one ledger event, or nothing at all
+# when the player cannot afford it. Returns the coins spent, None if refused.
+# Callers turn away empty orders first; one here is a bug, not a purchase.
+def finalize_purchase(profile: Dict, order: List[Tuple[Food, int]]) -> Optional[int]:
+    if not order:
+        raise ValueError("Refusing an empty order")
+    cost = order_cost(order)
+    if cost > profile["coins"]:
+        return None
+    bought: Dict[str, int] = {}
+    for food, qty in order:
+        add_food(profile, food.food_id, qty)
+        bought[food.food_id] = bought.get(food.food_id, 0) + qty
+    profile["coins"] -= cost
+    store.save_profile(profile)
+    ledger.record(profile["user_id"], "buy", coins=-cost, foods=bought)
+    return cost
+
+
+# ==============================
+# Offload pool
+# ==============================
+
+def offload_worker_init(catalog_data: Optional[Dict] = None) -> None:
+    # Pool processes import this module once at start, then take the parent's
+    # catalog (it may have been reloaded since); Ctrl-C is handled by the parent.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if catalog_data is not None:
+        install_catalog(compile_catalog(catalog_data))
+
+
+def offload_ready() -> int:
+    return os.getpid()
+
+
+# Jobs take and return picklable values only; profile mutation stays on the loop.
+class Offloader:
+    def __init__(self, kind: str = OFFLOAD_EXECUTOR, workers: int = OFFLOAD_WORKERS, thresholds: Optional[Dict[str, int]] = None):
+        self.kind = kind
+        self.workers = workers
+        self.thresholds = dict(OFFLOAD_THRESHOLDS if thresholds is None else thresholds)
+        self.pool: Optional[Executor] = None
+
+    async def start(self) -> None:
+        if self.kind == "thread":
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="zoo-offload")
+        elif self.kind == "process":
+            self.pool = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=offload_worker_init,
+                initargs=(catalog.data,),
+            )
+        else:
+            return
+        metrics.set("zoo_offload_workers", self.workers)
+        for command, threshold in self.thresholds.items():
+            metrics.set(f"zoo_offload_{command}_threshold", threshold)
+        # Start every worker now instead of on the first heavy command.
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, offload_ready) for _ in range(self.workers)))
+
+    async def restart(self) -> None:
+        # Threads share the new catalog already. A process pool is replaced so
+        # its workers load it; jobs already queued finish on the old pool with
+        # the catalog they were submitted with.
+        if self.kind != "process" or self.pool is None:
+            return
+        old = self.pool
+        await self.start()
+        old.shutdown(wait=False)
+
+    async def call(self, command: str, work: int, func: Callable, *args):
+        threshold = self.thresholds.get(command, 0)
+        if self.pool is None or threshold <= 0 or work < threshold:
+            return func(*args)
+        started = time.perf_counter()
+        result = await asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+        metrics.observe("zoo_offload_seconds", time.perf_counter() - started, f'job="offload {command}"')
+        metrics.inc(f"zoo_offload_{command}_total")
+        return result
+
+    def shutdown(self) -> None:
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+offloader = Offloader()
+
+
+# Compile the catalog file off the loop, then swap it in with one rebinding.
+# Ids may be added but not removed: profiles, snapshots and the ledger keep
+# referring to them.
+async def reload_catalog(path: str = CATALOG_PATH) -> Catalog:
+    global events
+    new = await asyncio.to_thread(load_catalog, path)
+    dropped = sorted((set(catalog.animals) - set(new.animals)) | (set(catalog.foods) - set(new.foods)))
+    if dropped:
+        raise ValueError("Catalog drops ids still in use: " + ", ".join(dropped))
+    schedule = await asyncio.to_thread(EventSchedule.from_file, EVENTS_PATH, new)
+    old = catalog
+    install_catalog(new)
+    events = schedule
+    TEAM_CACHE.clear()
+    ledger.rotate()
+    await offloader.restart()
+    metrics.inc("zoo_catalog_reloads_total")
+    print(
+        f"📚 Catalog {old.version} -> {new.version} "
+        f"({len(new.animals)} animals, {len(new.foods)} foods, {len(schedule.events)} events)"
+    )
+    return new
+
+
+def on_reload_signal() -> None:
+    async def run() -> None:
+        try:
+            await reload_catalog()
+        except (OSError, ValueError) as exc:
+            print(f"❌ Catalog reload failed: {exc}")
+
+    asyncio.get_running_loop().create_task(run())
+
+
+# _call is private, but it is the only hook that wraps a whole invocation.
+# A worker's lease must be held from before interaction_check until the error
+# handlers and the completion dispatch are done, and it must be released on
+# every path, including a CommandNotFound raised after the check. The public
+# hooks (interaction_check, on_error, on_app_command_completion) cannot
+# guarantee that: a release missed between them would lock the player out.
+# The guild's partitions are entered there too, before any of the hooks that
+# read the store run.
+# requirements.txt pins discord.py to the releases this was checked against,
+# and a release without the hook fails here instead of silently skipping leases
+# and guild context.
+if not callable(getattr(app_commands.CommandTree, "_call", None)):
+    raise RuntimeError("This discord.py has no CommandTree._call; install the version in requirements.txt.")
+
+
+class ZooCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if startup.ready:
+            return True
+        if interaction.type is discord.InteractionType.application_command:
+            await interaction.response.send_message(WARMING_UP_MESSAGE, ephemeral=True)
+        return False
+
+    async def _call(self, interaction: discord.Interaction) -> None:
+        started = time.perf_counter()
+        await enter_guild(interaction.guild_id)
+        try:
+            if startup.ready and isinstance(store, RemoteStore):
+                user_id = str(interaction.user.id)
+                if interaction.type is discord.InteractionType.autocomplete:
+                    await store.prefetch(user_id)
+                    await super()._call(interaction)
+                else:
+                    async with store.lease(user_id):
+                        await super()._call(interaction)
+            else:
+                await super()._call(interaction)
+        finally:
+            command = interaction.command
+            name = "zoo_autocomplete_seconds" if interaction.type is discord.InteractionType.autocomplete else "zoo_command_seconds"
+            label = command.qualified_name if command else "unknown"
+            metrics.observe(name, time.perf_counter() - started, f'command="{label}"')
+
+
+class MyClient(discord.AutoShardedClient if SHARD_IDS else discord.Client):
     def __init__(self):
         intents = discord.Intents.default()
-        intents.message_content = True
-        super().__init__(intents=intents)
-        self.tree = app_commands.CommandTree(self)
+        if MESSAGE_CONTENT_INTENT:
+            intents.message_content = True
+        else:
+            intents.guild_messages = False
+            intents.dm_messages = False
+        shard_options = {"shard_ids": SHARD_IDS, "shard_count": SHARD_COUNT} if SHARD_IDS else {}
+        super().__init__(intents=intents, **shard_options)
+        self.tree = ZooCommandTree(self)
+        # Background tasks are referenced here so they are not collected and
+        # their failures are logged instead of vanishing with the task.
+        self.background: Set[asyncio.Task] = set()
+        self.failed = False
+
+    def spawn(self, name: str, coro) -> asyncio.Task:
+        task = self.loop.create_task(coro, name=name)
+        self.background.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self.background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Background task {task.get_name()} failed: {task.exception()!r}")
 
     async def setup_hook(self):
-        await self.tree.sync()
+        startup.mark("login")
+        self.spawn("metrics_export", metrics_export_loop())
+        self.spawn("loop_lag", loop_lag_monitor())
+        register_command_codes(self.tree)
+        self.add_dynamic_items(CartSelect, CartButton)
+        if stall_watchdog:
+            stall_watchdog.start()
+        # Returning here lets discord.py open the gateway while these run.
+        self.spawn("load_store", self.load_store())
+        if not SHARD_IDS or 0 in SHARD_IDS:
+            self.spawn("command_sync", self.sync_commands())
+
+    async def load_store(self):
+        try:
+            if ZOO_ROLE == "worker":
+                await startup.phase("store_load", init_remote_storage())
+            else:
+                await startup.phase("store_load", asyncio.to_thread(init_storage))
+        except Exception as exc:
+            # Without a store the bot could only ever answer "warming up".
+            print(f"❌ Store load failed, shutting down: {exc!r}")
+            self.failed = True
+            await self.close()
+            return
+        init_rng()
+        startup.ready = True
+        startup.mark("store_ready")
+        self.spawn("offload_pool", startup.phase("offload_pool", offloader.start()))
+        self.spawn("hatch_flush", hatch_flush_loop())
+        self.spawn("live_events", live_event_loop())
+        if ZOO_ROLE != "worker":
+            # In a cluster the store process owns the backup and archive schedules.
+            self.spawn("backups", backup_loop())
+            self.spawn("archive", archive_loop())
+        if hasattr(signal, "SIGHUP"):
+            self.loop.add_signal_handler(signal.SIGHUP, on_reload_signal)
+
+    async def sync_commands(self):
+        try:
+            await startup.phase("command_sync", self.tree.sync())
+            # The tree has no guild-only commands, so this clears stale dev-guild copies.
+            await self.tree.sync(guild=discord.Object(id=DEV_GUILD_ID))
+        except discord.HTTPException as exc:
+            print("❌ Command sync failed:", exc)
+
+    async def close(self):
+        if startup.ready:
+            if isinstance(store, RemoteStore):
+                hatch_counter.flush()
+                await store.drain()
+            else:
+                await partitions.flush()
+                partitions.close()
+        offloader.shutdown()
+        metrics.export()
+        await super().close()
 
 
 client = MyClient()
 
 
+async def is_owner(user: discord.abc.User) -> bool:
+    if user.id in OWNER_IDS:
+        return True
+    app = client.application or await client.application_info()
+    if app.team:
+        return any(member.id == user.id for member in app.team.members)
+    return app.owner.id == user.id
+
+
 DEV_GUILD_ID = 1452648204519739483  # your server
+WARMING_UP_MESSAGE = "⏳ The zoo is warming up. Try again in a few seconds."
+
 
 @client.event
 async def on_ready():
     print(f"Logged in as {client.user} ({client.user.id})")
-
-    # Global sync (slow, but for all servers)
-    try:
-        await client.tree.sync()
-        print("🌍 Global slash commands synced")
-    except Exception as e:
-        print("❌ Global sync failed:", e)
-
-    # Dev guild sync (instant)
-    try:
-        dev_guild = discord.Object(id=DEV_GUILD_ID)
-        await client.tree.sync(guild=dev_guild)
-        print("⚡ Dev guild slash commands synced")
-    except Exception as e:
-        print("❌ Dev guild sync failed:", e)
+    startup.mark("gateway_ready")
 
 
 def build_help_embed(page: int) -> Optional[discord.Embed]:
@@ -530,10 +3931,15 @@ def build_help_embed(page: int) -> Optional[discord.Embed]:
                 "/team remove  → remove from team  \n"
                 "/hunt <amt>   → hunt animals  \n"
                 "/battle       → fight enemy teams (embed results)  \n"
+                "/battle pvp   → fight another player's saved team  \n"
+                "/replay [n]   → replay your recent battles turn by turn  \n"
                 "/shop         → browse foods  \n"
                 "/inv          → view owned foods  \n"
                 "/use <food> <pos> → equip food (replaces old)  \n"
-                "/sell <x> <n> → sell animals or food"
+                "/sell <x> <n> → sell animals or food  \n"
+                "/sellbulk <list> → sell many at once, keep N of each  \n"
+                "/buy <foods>  → buy foods, or open a cart  \n"
+                "/events       → live and upcoming events"
             ),
             inline=False,
         )
@@ -546,7 +3952,7 @@ def build_help_embed(page: int) -> Optional[discord.Embed]:
             ),
             inline=False,
         )
-        embed.set_footer(text="Use !help 2 for battle and food rules")
+        embed.set_footer(text="Use /help 2 for battle and food rules")
         return embed
 
     if page == 2:
@@ -576,7 +3982,7 @@ def build_help_embed(page: int) -> Optional[discord.Embed]:
             name="[📘 Animal Index]",
             value=(
                 "• /index shows every animal regardless of ownership  \n"
-                "• Displays drop rates, base stats, and global hatch counts  \n"
+                "• Displays drop rates, base stats, and this server's hatch counts  \n"
                 "• Use /stats <animal> for detailed view (lore, foods)  \n"
                 "• /zoo remains your personal collection counts"
             ),
@@ -603,7 +4009,8 @@ def build_help_embed(page: int) -> Optional[discord.Embed]:
         )
         embed.add_field(
             name="[🌱 Hatch Counters]",
-            value="/stats now shows how many times each animal hatched globally.",
+            value="/stats shows how many times each animal hatched in this server. "
+            "Server counters started at 0 when they were split out; the earlier global totals remain in DMs.",
             inline=False,
         )
         embed.set_footer(text="Build smart teams — roles matter. Equip food before fighting!")
@@ -631,25 +4038,12 @@ async def help_command(interaction: discord.Interaction, page: int = 1):
     await interaction.response.send_message(embed=embed)
 
 
-def build_index_embed() -> discord.Embed:
-    embed = discord.Embed(
-        title="📘 Animal Index",
-        description=(
-            "Complete list of all animals, their roles, base stats, drop chances,\n"
-            "and global hatch counts.\n\n"
-            "For detailed information on a specific animal, use:\n"
-            "/stats <animal>\n\n"
-            "Drop rates shown per animal = (rarity total) ÷ (animals in that rarity)."
-        ),
-        color=0x2980B9,
-    )
-    drop_rate_map = rarity_drop_rate_map()
-    animals_by_rarity: Dict[str, List[Animal]] = {rarity: [] for rarity, _ in RARITY_ORDER}
-    for animal in ANIMALS.values():
-        animals_by_rarity[animal.rarity].append(animal)
-
-    for rarity, emoji in RARITY_ORDER:
-        animals = animals_by_rarity.get(rarity, [])
+def index_fields(hatch_counts: Dict[str, int], cat: Optional[Catalog] = None) -> List[Tuple[str, str]]:
+    cat = cat or catalog
+    drop_rate_map = rarity_drop_rate_map(cat)
+    fields: List[Tuple[str, str]] = []
+    for rarity, emoji in cat.rarity_order:
+        animals = cat.rarity_pools[rarity]
         if not animals:
             continue
         per_animal_rate = 0.0
@@ -664,12 +4058,29 @@ def build_index_embed() -> discord.Embed:
                         f"Role: {animal.role.title()}",
                         f"Stats: HP {animal.hp} | ATK {animal.atk} | DEF {animal.defense}",
                         f"Drop Rate: {per_animal_rate:.2f}%",
-                        f"Global Hatches: {store.data['global'].get('hatch_counts', {}).get(animal.animal_id, 0)}",
+                        f"Hatches here: {hatch_counts.get(animal.animal_id, 0)}",
                         "More Info: /stats <animal>",
                     ]
                 )
             )
-        embed.add_field(name=f"{emoji} {rarity}", value="\n\n".join(lines), inline=False)
+        fields.append((f"{emoji} {rarity}", "\n\n".join(lines)))
+    return fields
+
+
+def build_index_embed(fields: Optional[List[Tuple[str, str]]] = None) -> discord.Embed:
+    embed = discord.Embed(
+        title="📘 Animal Index",
+        description=(
+            "Complete list of all animals, their roles, base stats, drop chances,\n"
+            "and this server's hatch counts.\n\n"
+            "For detailed information on a specific animal, use:\n"
+            "/stats <animal>\n\n"
+            "Drop rates shown per animal = (rarity total) ÷ (animals in that rarity)."
+        ),
+        color=0x2980B9,
+    )
+    for name, value in index_fields(hatch_counter.snapshot) if fields is None else fields:
+        embed.add_field(name=name, value=value, inline=False)
 
     embed.set_footer(text="Use /stats <animal> for full details.")
     return embed
@@ -677,40 +4088,212 @@ def build_index_embed() -> discord.Embed:
 
 @client.tree.command(name="index", description="📘 Browse all animals and their drop rates")
 async def index(interaction: discord.Interaction):
-    embed = build_index_embed()
+    fields = await offloader.call("index", 1, index_fields, dict(hatch_counter.snapshot), events.current())
+    embed = build_index_embed(fields)
+    await interaction.response.send_message(embed=embed)
+
+
+def describe_event(event: LiveEvent) -> str:
+    parts = [f"{rarity.title()} drops x{factor:g}" for rarity, factor in event.drop]
+    parts += [f"{rarity.title()} sell value x{factor:g}" for rarity, factor in event.sell]
+    if event.coins != 1.0:
+        parts.append(f"Battle coins x{event.coins:g}")
+    return ", ".join(parts) or "No changes"
+
+
+@client.tree.command(name="events", description="🎉 Show the live event and upcoming ones")
+async def events_command(interaction: discord.Interaction):
+    embed = discord.Embed(title="🎉 Live Events", color=0xE67E22)
+    upcoming = events.upcoming()
+    if not upcoming:
+        embed.description = "No events are scheduled right now."
+    live = events.current().event
+    for event in upcoming[:10]:
+        when = f"ends <t:{int(event.end)}:R>" if event == live else f"starts <t:{int(event.start)}:R>"
+        title = f"{'🟢 LIVE: ' if event == live else ''}{event.name}"
+        embed.add_field(name=title, value=f"{describe_event(event)}\n{when}", inline=False)
     await interaction.response.send_message(embed=embed)
 
 
 HELP_ALIASES = {"!help", "!h", "!guide", "!commands"}
 
 
-def rarity_drop_rate_map() -> Dict[str, float]:
-    return {rarity: chance for chance, rarity in DROP_TABLE}
+def rarity_drop_rate_map(cat: Optional[Catalog] = None) -> Dict[str, float]:
+    return {rarity: chance for chance, rarity in (cat or catalog).drop_table}
+
+
+async def prefix_help(message: discord.Message, content: str) -> None:
+    page = parse_help_page(content)
+    embed = build_help_embed(page)
+    if not embed:
+        await message.channel.send("❌ Invalid page. Choose 1 or 2.")
+        return
+    await message.channel.send(embed=embed)
+
+
+BACKUP_UPLOAD_NOTE = (
+    "Full backups are a compressed users.json; incrementals hold users changed since their full backup.\n"
+    "Rebuild a users.json with: python restore.py <full> [incrementals...]"
+)
+
+
+async def prefix_data(message: discord.Message, content: str) -> None:
+    if not await is_owner(message.author):
+        return
+    full = "inc" not in content.split()[1:]
+    path = await create_backup(full)
+    await message.channel.send(
+        f"📂 {'Full' if full else 'Incremental'} backup ready.\n{BACKUP_UPLOAD_NOTE}",
+        file=discord.File(path, filename=os.path.basename(path)),
+    )
+
+
+async def catalog_reload_reply() -> str:
+    try:
+        if SUPERVISOR_PID:
+            # Validate here for a useful reply, then let the supervisor fan the reload out.
+            new = await asyncio.to_thread(load_catalog)
+            os.kill(SUPERVISOR_PID, signal.SIGHUP)
+            return f"📚 Catalog {new.version} sent to every cluster process."
+        new = await reload_catalog()
+    except (OSError, ValueError) as exc:
+        return f"❌ Catalog reload failed\n```\n{str(exc)[:1800]}\n```"
+    return (
+        f"📚 Catalog {new.version} loaded: {len(new.animals)} animals, {len(new.foods)} foods, "
+        f"{len(events.events)} scheduled events."
+    )
+
+
+async def prefix_reload(message: discord.Message, content: str) -> None:
+    if not await is_owner(message.author):
+        return
+    await message.channel.send(await catalog_reload_reply())
+
+
+async def prefix_profile(message: discord.Message, content: str) -> None:
+    if not await is_owner(message.author):
+        return
+    if ProfilerSession.active:
+        await message.channel.send("⏳ A profiling session is already running.")
+        return
+    seconds, mode = parse_profile_args(content)
+    ProfilerSession.active = True
+    try:
+        await message.channel.send(f"🩺 Profiling ({mode}) for {seconds}s…")
+        filename, data = await ProfilerSession.run(seconds, mode)
+    finally:
+        ProfilerSession.active = False
+    await message.channel.send(
+        f"🩺 Profile finished ({mode}, {seconds}s).", file=discord.File(io.BytesIO(data), filename=filename)
+    )
+
+
+PREFIX_ROUTES: Dict[str, Callable[[discord.Message, str], Awaitable[None]]] = {
+    alias: prefix_help for alias in HELP_ALIASES
+}
+PREFIX_ROUTES["-data"] = prefix_data
+PREFIX_ROUTES["-profile"] = prefix_profile
+PREFIX_ROUTES["-reload"] = prefix_reload
+PREFIX_CHARS = frozenset(key[0] for key in PREFIX_ROUTES)
 
 
-@client.event
 async def on_message(message: discord.Message):
-    if message.author.bot:
+    content = message.content
+    # Cheap first-character gate so ordinary chatter is dropped before any string work.
+    if not content or content[0] not in PREFIX_CHARS or message.author.bot:
         return
-    content = message.content.strip()
-    lowered = content.lower()
-    if not lowered:
+    handler = PREFIX_ROUTES.get(content.split(maxsplit=1)[0].lower())
+    if not handler:
         return
-    if any(lowered.startswith(alias) for alias in HELP_ALIASES):
-        page = parse_help_page(lowered)
-        embed = build_help_embed(page)
-        if not embed:
-            await message.channel.send("❌ Invalid page. Choose 1 or 2.")
-            return
-        await message.channel.send(embed=embed)
+    if not startup.ready:
+        await message.channel.send(WARMING_UP_MESSAGE)
         return
+    await enter_guild(message.guild.id if message.guild else None)
+    await handler(message, content.lower())
+
+
+if MESSAGE_CONTENT_INTENT:
+    client.event(on_message)
+
+
+@client.tree.command(name="data", description="📂 Download a compressed data backup (owner only)")
+@app_commands.describe(incremental="Only users changed since the last full backup")
+async def data_command(interaction: discord.Interaction, incremental: bool = False):
+    if not await is_owner(interaction.user):
+        await interaction.response.send_message("❌ Owner only.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+    path = await create_backup(not incremental)
+    await interaction.followup.send(
+        f"📂 {'Incremental' if incremental else 'Full'} backup ready.\n{BACKUP_UPLOAD_NOTE}",
+        file=discord.File(path, filename=os.path.basename(path)),
+        ephemeral=True,
+    )
+
+
+@client.tree.command(name="profile", description="🩺 Profile the live bot for N seconds (owner only)")
+@app_commands.describe(seconds="Sampling duration (1-120)", mode="sample (tagged collapsed stacks) or cprofile")
+@app_commands.choices(
+    mode=[
+        app_commands.Choice(name="Sample", value="sample"),
+        app_commands.Choice(name="cProfile", value="cprofile"),
+    ]
+)
+async def profile_command(
+    interaction: discord.Interaction, seconds: int = PROFILE_DEFAULT_SECONDS, mode: Optional[app_commands.Choice[str]] = None
+):
+    if not await is_owner(interaction.user):
+        await interaction.response.send_message("❌ Owner only.", ephemeral=True)
+        return
+    if ProfilerSession.active:
+        await interaction.response.send_message("⏳ A profiling session is already running.", ephemeral=True)
+        return
+    seconds = min(PROFILE_MAX_SECONDS, max(1, seconds))
+    mode_value = mode.value if mode else "sample"
+    ProfilerSession.active = True
+    try:
+        await interaction.response.send_message(f"🩺 Profiling ({mode_value}) for {seconds}s…", ephemeral=True)
+        filename, data = await ProfilerSession.run(seconds, mode_value)
+    finally:
+        ProfilerSession.active = False
+    await interaction.followup.send(
+        f"🩺 Profile finished ({mode_value}, {seconds}s).",
+        file=discord.File(io.BytesIO(data), filename=filename),
+        ephemeral=True,
+    )
+
+
+@client.tree.command(name="reload", description="📚 Reload the animal and food catalog (owner only)")
+async def reload_command(interaction: discord.Interaction):
+    if not await is_owner(interaction.user):
+        await interaction.response.send_message("❌ Owner only.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+    await interaction.followup.send(await catalog_reload_reply(), ephemeral=True)
+
+
+@client.tree.command(name="metrics", description="📈 Latency and storage metrics summary (owner only)")
+async def metrics_command(interaction: discord.Interaction):
+    if not await is_owner(interaction.user):
+        await interaction.response.send_message("❌ Owner only.", ephemeral=True)
+        return
+    lines = metrics.summary()
+    bytes_written = metrics.counters.get("zoo_store_bytes_written_total", 0)
+    last_write = metrics.gauges.get("zoo_store_last_write_bytes", 0)
+    lines.append(f"store bytes written: {int(bytes_written)} (last save {int(last_write)})")
+    await interaction.response.send_message("📈 Metrics\n```\n" + "\n".join(lines)[:1900] + "\n```", ephemeral=True)
 
-    if lowered.startswith("-data"):
-        store._write_data()
-        await message.channel.send(
-            "📂 Current users.json backup. Replace your local file with this copy.",
-            file=discord.File(DATA_FILE_PATH, filename="users.json"),
-        )
+
+@client.tree.command(name="stalls", description="🐢 Top event-loop stalls by command (owner only)")
+async def stalls_command(interaction: discord.Interaction):
+    if not await is_owner(interaction.user):
+        await interaction.response.send_message("❌ Owner only.", ephemeral=True)
+        return
+    if not stall_watchdog:
+        await interaction.response.send_message("Stall watchdog is off. Set STALL_THRESHOLD_MS to enable it.", ephemeral=True)
+        return
+    lines = stall_watchdog.report() or ["No stalls above threshold yet."]
+    await interaction.response.send_message("🐢 Loop stalls\n```\n" + "\n".join(lines)[:1900] + "\n```", ephemeral=True)
 
 
 @client.tree.command(name="balance", description="💼 Check your coins and energy")
@@ -727,7 +4310,7 @@ async def daily(interaction: discord.Interaction):
     user_id = str(interaction.user.id)
     profile = store.load_profile(user_id)
     now_ts = now()
-    cooldown_until = DAILY_COOLDOWNS.get(user_id, 0.0)
+    cooldown_until = profile["cooldowns"].get("daily", 0.0)
     if cooldown_until > now_ts:
         wait = format_cooldown(cooldown_until - now_ts)
         embed = discord.Embed(
@@ -742,8 +4325,9 @@ async def daily(interaction: discord.Interaction):
         return
     profile["coins"] += 100
     profile["energy"] += 40
+    profile["cooldowns"]["daily"] = now_ts + 24 * 3600
     store.save_profile(profile)
-    DAILY_COOLDOWNS[user_id] = now_ts + 24 * 3600
+    ledger.record(user_id, "daily", coins=100, energy=40)
     embed = discord.Embed(title="🎁 Daily Reward", color=0x2ECC71)
     embed.add_field(name="💰 Coins", value="+100", inline=False)
     embed.add_field(name="🔋 Energy", value="+40", inline=False)
@@ -755,9 +4339,8 @@ async def daily(interaction: discord.Interaction):
 async def zoo(interaction: discord.Interaction):
     profile = store.load_profile(str(interaction.user.id))
     lines: List[str] = []
-    for rarity, symbol in RARITY_ORDER:
-        animals = [a for a in ANIMALS.values() if a.rarity == rarity]
-        animals.sort(key=lambda a: a.animal_id)
+    for rarity, symbol in catalog.rarity_order:
+        animals = sorted(catalog.rarity_pools[rarity], key=lambda a: a.animal_id)
         entries = []
         for animal in animals:
             amount = profile["zoo"].get(animal.animal_id, 0)
@@ -773,11 +4356,11 @@ async def zoo(interaction: discord.Interaction):
 async def shop(interaction: discord.Interaction):
     embed = discord.Embed(
         title="🛒 Food Shop",
-        description="All foods are always in stock. Pick a snack and equip it with /use.",
+        description="All foods are always in stock. Buy with /buy, then equip with /use.",
         color=0xF1C40F,
     )
-    for rarity, symbol in RARITY_ORDER:
-        foods = [f for f in FOODS.values() if f.rarity == rarity]
+    for rarity, symbol in catalog.rarity_order:
+        foods = [f for f in catalog.foods.values() if f.rarity == rarity]
         if not foods:
             continue
         foods.sort(key=lambda f: f.cost)
@@ -787,10 +4370,245 @@ async def shop(interaction: discord.Interaction):
                 f"{food.emoji} {food.food_id.replace('_', ' ')} — Cost: {food.cost} | {food.ability}"
             )
         embed.add_field(name=f"{symbol} {rarity.title()}", value="\n".join(value_lines), inline=False)
-    embed.set_footer(text="Use /use <food> <slot> to equip")
+    embed.set_footer(text="/buy honey x3, apple 2 to buy, or /buy alone for a cart")
     await interaction.response.send_message(embed=embed)
 
 
+# The cart keeps no state on the bot: every component's custom_id carries the
+# owner, the catalog version and the cart itself, as hex food ordinals with
+# quantities ("zoo:cart:<user>:<version>:<action>:3.2,a.1"). Any worker can
+# handle any click, and a cart survives restarts.
+CART_ID = r"zoo:cart:(?P<user>[0-9]+):(?P<version>[0-9a-f]+):(?P<action>{}):(?P<cart>[0-9a-f.,]*)"
+CUSTOM_ID_LIMIT = 100
+CART_SELECT_ROWS = 4
+
+
+def cart_id(user_id: int, action: str, cart: Dict[str, int]) -> str:
+    ordinals = {food_id: idx for idx, food_id in enumerate(catalog.foods)}
+    encoded = ",".join(f"{ordinals[food_id]:x}.{qty:x}" for food_id, qty in cart.items())
+    return f"zoo:cart:{user_id}:{catalog.version[:8]}:{action}:{encoded}"
+
+
+# None when the cart was built against another catalog (ordinals may differ).
+def decode_cart(match: "re.Match[str]") -> Optional[Dict[str, int]]:
+    if match["version"] != catalog.version[:8]:
+        return None
+    food_ids = list(catalog.foods)
+    cart: Dict[str, int] = {}
+    try:
+        for entry in filter(None, match["cart"].split(",")):
+            ordinal, _, qty = entry.partition(".")
+            cart[food_ids[int(ordinal, 16)]] = min(BUY_LIMIT, int(qty, 16))
+    except (ValueError, IndexError):
+        return None
+    return cart
+
+
+def cart_order(cart: Dict[str, int]) -> List[Tuple[Food, int]]:
+    return [(catalog.foods[food_id], qty) for food_id, qty in cart.items() if qty > 0]
+
+
+def cart_embed(cart: Dict[str, int]) -> discord.Embed:
+    order = cart_order(cart)
+    embed = discord.Embed(title="🛒 Your Cart", color=0xF1C40F)
+    embed.description = "\n".join(
+        f"{food.emoji} {food.food_id.replace('_', ' ')} x{qty} — {food.cost * qty}" for food, qty in order
+    ) or "Pick foods below to add them."
+    embed.add_field(name="Total", value=f"💰 {order_cost(order)} coins", inline=False)
+    embed.set_footer(text="Each pick adds one. Checkout pays for everything at once.")
+    return embed
+
+
+def cart_view(user_id: int, cart: Dict[str, int]) -> discord.ui.View:
+    view = discord.ui.View(timeout=None)
+    foods = list(catalog.foods.values())
+    for row in range(min(CART_SELECT_ROWS, (len(foods) + 24) // 25)):
+        view.add_item(CartSelect(user_id, row, cart, foods[row * 25 : row * 25 + 25]))
+    view.add_item(CartButton(user_id, "b", cart, label="Checkout", emoji="✅", style=discord.ButtonStyle.success, disabled=not cart))
+    view.add_item(CartButton(user_id, "u", cart, label="Undo", emoji="↩️", disabled=not cart))
+    view.add_item(CartButton(user_id, "c", cart, label="Clear", emoji="🗑️", style=discord.ButtonStyle.danger, disabled=not cart))
+    return view
+
+
+# Component callbacks run outside the command tree, so they take the user's
+# lease themselves when the store is remote.
+def profile_lease(user_id: str):
+    return store.lease(user_id) if isinstance(store, RemoteStore) else contextlib.nullcontext()
+
+
+async def cart_owner_check(interaction: discord.Interaction, user_id: int) -> bool:
+    if not startup.ready:
+        await interaction.response.send_message(WARMING_UP_MESSAGE, ephemeral=True)
+        return False
+    # Runs in the task that then runs the callback, so this scopes the checkout too.
+    await enter_guild(interaction.guild_id)
+    if interaction.user.id != user_id:
+        await interaction.response.send_message("You cannot respond to this.", ephemeral=True)
+        return False
+    return True
+
+
+async def update_cart(interaction: discord.Interaction, user_id: int, cart: Optional[Dict[str, int]]) -> None:
+    if cart is None:
+        await interaction.response.edit_message(
+            content="🛒 The shop changed since this cart was made. Run /buy again.", embed=None, view=None
+        )
+        return
+    if len(cart_id(user_id, "s0", cart)) > CUSTOM_ID_LIMIT:
+        await interaction.response.send_message("❌ Cart is full\nCheck out first, then start a new one.", ephemeral=True)
+        return
+    await interaction.response.edit_message(embed=cart_embed(cart), view=cart_view(user_id, cart))
+
+
+class CartSelect(discord.ui.DynamicItem[discord.ui.Select], template=CART_ID.format(r"s[0-9]")):
+    def __init__(self, user_id: int, row: int, cart: Optional[Dict[str, int]], foods: Optional[List[Food]] = None):
+        self.user_id = user_id
+        self.cart = cart
+        options = [
+            discord.SelectOption(
+                label=f"{food.food_id.replace('_', ' ')} — {food.cost}",
+                value=food.food_id,
+                emoji=food.emoji,
+                description=food.ability[:100],
+            )
+            for food in foods or ()
+        ]
+        super().__init__(
+            discord.ui.Select(
+                custom_id=cart_id(user_id, f"s{row}", cart or {}),
+                placeholder="Add foods…",
+                min_values=1,
+                max_values=max(1, len(options)),
+                options=options or [discord.SelectOption(label="-", value="-")],
+                row=row,
+            )
+        )
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Select, match: "re.Match[str]"):
+        return cls(int(match["user"]), int(match["action"][1:]), decode_cart(match))
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return await cart_owner_check(interaction, self.user_id)
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        cart = self.cart
+        if cart is not None:
+            for food_id in interaction.data.get("values", ()):
+                if food_id in catalog.foods:
+                    cart[food_id] = min(BUY_LIMIT, cart.get(food_id, 0) + 1)
+        await update_cart(interaction, self.user_id, cart)
+
+
+class CartButton(discord.ui.DynamicItem[discord.ui.Button], template=CART_ID.format("[bcu]")):
+    def __init__(self, user_id: int, action: str, cart: Optional[Dict[str, int]], **kwargs):
+        self.user_id = user_id
+        self.action = action
+        self.cart = cart
+        super().__init__(discord.ui.Button(custom_id=cart_id(user_id, action, cart or {}), row=CART_SELECT_ROWS, **kwargs))
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match: "re.Match[str]"):
+        return cls(int(match["user"]), match["action"], decode_cart(match))
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return await cart_owner_check(interaction, self.user_id)
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        cart = self.cart
+        if cart is not None and self.action == "b":
+            await checkout_cart(interaction, self.user_id, cart)
+            return
+        if cart and self.action == "u":
+            last = next(reversed(cart))
+            cart[last] -= 1
+            if not cart[last]:
+                del cart[last]
+        elif cart and self.action == "c":
+            cart = {}
+        await update_cart(interaction, self.user_id, cart)
+
+
+# Message ids of carts already paid for, so a double click cannot buy twice.
+# Clicks on one message always reach the same shard, hence the same process.
+CHECKOUTS: Deque[int] = deque(maxlen=1024)
+
+
+async def checkout_cart(interaction: discord.Interaction, user_id: int, cart: Dict[str, int]) -> None:
+    message_id = interaction.message.id if interaction.message else 0
+    if message_id in CHECKOUTS:
+        await interaction.response.defer()
+        return
+    order = cart_order(cart)
+    if not order:
+        await interaction.response.send_message("🛒 Your cart is empty.", ephemeral=True)
+        return
+    CHECKOUTS.append(message_id)
+    async with profile_lease(str(user_id)):
+        profile = store.load_profile(str(user_id))
+        cost = finalize_purchase(profile, order)
+        coins = profile["coins"]
+    if cost is None:
+        CHECKOUTS.remove(message_id)
+        await interaction.response.send_message(
+            f"❌ Not enough coins\nThis cart costs {order_cost(order)}, you have {coins}.", ephemeral=True
+        )
+        return
+    await interaction.response.edit_message(
+        content=f"✅ BOUGHT\n{sale_lines([], order)}\n💰 Coins spent: {cost}", embed=None, view=None
+    )
+
+
+@client.tree.command(name="buy", description="🛍️ Buy foods, several at once")
+@app_commands.describe(items="Foods with quantities, e.g. 'honey x3, apple 2'. Leave empty to build a cart")
+async def buy(interaction: discord.Interaction, items: Optional[str] = None):
+    if not items or not items.strip():
+        await interaction.response.send_message(
+            embed=cart_embed({}), view=cart_view(interaction.user.id, {}), ephemeral=True
+        )
+        return
+    order, unknown, zero = parse_order(items)
+    if unknown:
+        await interaction.response.send_message(
+            f"❌ Unknown food\n{', '.join(unknown[:10])}\nUse food emojis or aliases, e.g. 'honey x3, apple 2'.",
+            ephemeral=True,
+        )
+        return
+    if zero:
+        await interaction.response.send_message(
+            f"❌ Invalid quantity\n{', '.join(zero[:10])}\nBuy at least 1 of each food.", ephemeral=True
+        )
+        return
+    if not order:
+        await interaction.response.send_message(
+            "❌ Empty order\nName at least one food, e.g. 'honey x3, apple 2'.", ephemeral=True
+        )
+        return
+    if any(qty > BUY_LIMIT for _, qty in order):
+        await interaction.response.send_message(f"❌ At most {BUY_LIMIT} of each food per order.", ephemeral=True)
+        return
+    profile = store.load_profile(str(interaction.user.id))
+    cost = finalize_purchase(profile, order)
+    if cost is None:
+        await interaction.response.send_message(
+            f"❌ Not enough coins\nThis order costs {order_cost(order)}, you have {profile['coins']}.", ephemeral=True
+        )
+        return
+    await interaction.response.send_message(f"✅ BOUGHT\n{sale_lines([], order)}\n💰 Coins spent: {cost}")
+
+
+@buy.autocomplete("items")
+async def buy_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    # Completes the food in the last comma-separated entry.
+    head, _, last = current.rpartition(",")
+    prefix = f"{head}, " if head else ""
+    names = [catalog.foods[food_id].aliases[0] for food_id in catalog.food_trie.lookup(last.strip().lower())]
+    return [
+        app_commands.Choice(name=(prefix + name)[:100], value=(prefix + name)[:100])
+        for name in names[:AUTOCOMPLETE_LIMIT]
+    ]
+
+
 @client.tree.command(name="inv", description="🎒 View your food inventory")
 async def inv(interaction: discord.Interaction):
     profile = store.load_profile(str(interaction.user.id))
@@ -798,10 +4616,10 @@ async def inv(interaction: discord.Interaction):
     if not profile["foods"]:
         embed.description = "You don't own any food. Visit /shop to buy some."
     else:
-        for rarity, symbol in RARITY_ORDER:
+        for rarity, symbol in catalog.rarity_order:
             entries = []
             for food_id, qty in profile["foods"].items():
-                food = FOODS.get(food_id)
+                food = catalog.foods.get(food_id)
                 if food and food.rarity == rarity and qty > 0:
                     entries.append(f"{food.emoji} {food.food_id.replace('_', ' ')} x{qty}")
             if entries:
@@ -830,13 +4648,16 @@ async def use_food(interaction: discord.Interaction, food: str, pos: int):
     slot_key = f"slot{pos}"
     previous_food = profile["equipped_foods"].get(slot_key)
     if previous_food:
-        tip = f"Replaced {FOODS[previous_food].emoji} {previous_food}. Old food was destroyed."
+        tip = f"Replaced {catalog.foods[previous_food].emoji} {previous_food}. Old food was destroyed."
     else:
         tip = ""
     profile["equipped_foods"][slot_key] = food_obj.food_id
     profile["equipped_food_wins"][slot_key] = 0
     profile["foods"][food_obj.food_id] = max(0, owned - 1)
     store.save_profile(profile)
+    invalidate_team(profile["user_id"])
+    index_team(profile)
+    ledger.record(profile["user_id"], "use", foods={food_obj.food_id: -1}, equip=(pos, food_obj.food_id))
     embed = discord.Embed(
         title="🍽️ Food Equipped",
         description=f"Slot {pos} now has {food_obj.emoji} {food_obj.food_id.replace('_', ' ')}.",
@@ -848,6 +4669,11 @@ async def use_food(interaction: discord.Interaction, food: str, pos: int):
     await interaction.response.send_message(embed=embed)
 
 
+@use_food.autocomplete("food")
+async def use_food_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    return food_choices(str(interaction.user.id), current)
+
+
 @client.tree.command(name="stats", description="📊 Show stats for an animal (emoji or alias)")
 @app_commands.describe(animal="Emoji or alias of the animal")
 async def stats(interaction: discord.Interaction, animal: str):
@@ -857,7 +4683,7 @@ async def stats(interaction: discord.Interaction, animal: str):
             "❌ Unknown animal\nTry an emoji or alias.", ephemeral=True
         )
         return
-    rarity_symbol = dict(RARITY_ORDER)[a.rarity]
+    rarity_symbol = catalog.rarity_symbols[a.rarity]
     msg = (
         f"{rarity_symbol} {a.emoji} {a.animal_id}\n"
         f"Role: {ROLE_EMOJI[a.role]} {a.role}\n\n"
@@ -865,12 +4691,17 @@ async def stats(interaction: discord.Interaction, animal: str):
         f"⚔️ ATK: {a.atk}\n"
         f"🛡️ DEF: {a.defense}\n\n"
         f"🛡️ Team DEF Aura: +{a.defense}\n"
-        f"🌱 Hatched globally: {store.data['global'].get('hatch_counts', {}).get(a.animal_id, 0)}\n\n"
-        f"📜 Lore: {LORE.get(a.animal_id, 'Mysterious origins.')}"
+        f"🌱 Hatched here: {hatch_counter.get(a.animal_id)}\n\n"
+        f"📜 Lore: {catalog.lore.get(a.animal_id, 'Mysterious origins.')}"
     )
     await interaction.response.send_message(msg)
 
 
+@stats.autocomplete("animal")
+async def stats_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    return animal_choices(str(interaction.user.id), current)
+
+
 class TeamCommands(app_commands.Group):
     def __init__(self):
         super().__init__(name="team", description="🧭 Manage your battle team slots")
@@ -888,24 +4719,20 @@ class TeamCommands(app_commands.Group):
             2: ("slot2", "⚔️ Attack"),
             3: ("slot3", "🧪 Support"),
         }
-        total_hp = 0
-        total_atk = 0
-        total_def = 0
+        team = team_snapshot(profile)
         for idx, (slot_key, label) in slot_info.items():
-            animal_id = profile["team"].get(slot_key)
-            if animal_id:
-                animal = ANIMALS[animal_id]
-                total_hp += animal.hp
-                total_atk += animal.atk
-                total_def += animal.defense
+            animal = team.animals.get(slot_key)
+            if animal:
+                hp, atk, defense = team.stats[slot_key]
+                food = team.foods[slot_key]
                 animal_name = animal.animal_id.replace("_", " ").title()
                 embed.add_field(
                     name=f"Slot {idx} — {label}",
                     value=(
-                        f"{animal.emoji} {animal_name}\n"
-                        f"❤️ HP: {animal.hp}\n"
-                        f"⚔️ ATK: {animal.atk}\n"
-                        f"🛡️ DEF: {animal.defense}"
+                        f"{animal.emoji} {animal_name}{f' + {food.emoji}' if food else ''}\n"
+                        f"❤️ HP: {hp}{f' (+{food.hp_bonus})' if food and food.hp_bonus else ''}\n"
+                        f"⚔️ ATK: {atk}{f' (+{food.atk_bonus})' if food and food.atk_bonus else ''}\n"
+                        f"🛡️ DEF: {defense}{f' (+{food.def_bonus})' if food and food.def_bonus else ''}"
                     ),
                     inline=False,
                 )
@@ -919,9 +4746,10 @@ class TeamCommands(app_commands.Group):
         embed.add_field(
             name="TEAM SUMMARY",
             value=(
-                f"🛡️ Total Team DEF: {total_def}\n"
-                f"❤️ Total Team HP: {total_hp}\n"
-                f"⚔️ Total Team ATK: {total_atk}"
+                f"🛡️ Total Team DEF: {sum(s[2] for s in team.stats.values())}\n"
+                f"❤️ Total Team HP: {sum(s[0] for s in team.stats.values())}\n"
+                f"⚔️ Total Team ATK: {sum(s[1] for s in team.stats.values())}\n"
+                f"⚡ Team Power: {team.power:.0f} (foods included)"
             ),
             inline=False,
         )
@@ -961,10 +4789,18 @@ class TeamCommands(app_commands.Group):
 
         profile["team"][f"slot{pos}"] = a.animal_id
         store.save_profile(profile)
+        invalidate_team(profile["user_id"])
+        index_team(profile)
         await interaction.response.send_message(
             f"✅ TEAM UPDATED\nSlot {pos}: {ROLE_EMOJI[a.role]} {a.emoji} {a.animal_id}"
         )
 
+    @add.autocomplete("animal")
+    async def add_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+        role = {1: "TANK", 2: "ATTACK", 3: "SUPPORT"}.get(getattr(interaction.namespace, "pos", None))
+        keep = (lambda animal_id: catalog.animals[animal_id].role == role) if role else None
+        return animal_choices(str(interaction.user.id), current, keep)
+
     @app_commands.command(name="remove", description="➖ Clear a team slot")
     @app_commands.describe(pos="Team slot to clear (1-3)")
     async def remove(self, interaction: discord.Interaction, pos: int):
@@ -976,6 +4812,8 @@ class TeamCommands(app_commands.Group):
         profile = store.load_profile(str(interaction.user.id))
         profile["team"][f"slot{pos}"] = None
         store.save_profile(profile)
+        invalidate_team(profile["user_id"])
+        index_team(profile)
         await interaction.response.send_message(
             f"✅ TEAM UPDATED\nSlot {pos} cleared."
         )
@@ -988,6 +4826,7 @@ client.tree.add_command(TeamCommands())
 @app_commands.describe(amount_coins="Coins to spend (divisible by 5)")
 async def hunt(interaction: discord.Interaction, amount_coins: int):
     profile = store.load_profile(str(interaction.user.id))
+    cat = events.current()
     now_ts = now()
     if profile["cooldowns"]["hunt"] > now_ts:
         wait = format_cooldown(profile["cooldowns"]["hunt"] - now_ts)
@@ -1016,40 +4855,54 @@ async def hunt(interaction: discord.Interaction, amount_coins: int):
         )
         return
 
+    # Only the cooldown is set before the offload await: it keeps a second hunt
+    # out meanwhile, and is all there is to undo if the roll never comes back.
+    cooldown = profile["cooldowns"]["hunt"]
+    profile["cooldowns"]["hunt"] = now_ts + 10
+    seed, _ = rng_service.stream(profile, "hunt")
+    try:
+        rolled = await offloader.call("hunt", rolls, hunt_rolls, seed, rolls, cat)
+    except BaseException:
+        profile["cooldowns"]["hunt"] = cooldown
+        raise
+    # Another command may have spent coins or energy during the await.
+    if profile["coins"] < amount_coins or profile["energy"] < rolls:
+        profile["cooldowns"]["hunt"] = cooldown
+        await interaction.response.send_message(
+            "❌ Not enough coins or energy left", ephemeral=True
+        )
+        return
+
     profile["coins"] -= amount_coins
     profile["energy"] -= rolls
-
-    results: List[Animal] = []
     before_counts = dict(profile["zoo"])
-    for _ in range(rolls):
-        rarity = pick_rarity()
-        pool = [a for a in ANIMALS.values() if a.rarity == rarity]
-        animal = random.choice(pool)
+    results = [cat.animals[animal_id] for animal_id in rolled]
+    for animal in results:
         profile["zoo"][animal.animal_id] = profile["zoo"].get(animal.animal_id, 0) + 1
-        store.data.setdefault("global", {}).setdefault("hatch_counts", {})
-        store.data["global"]["hatch_counts"][animal.animal_id] = (
-            store.data["global"]["hatch_counts"].get(animal.animal_id, 0) + 1
-        )
-        results.append(animal)
 
-    profile["cooldowns"]["hunt"] = now_ts + 10
     store.save_profile(profile)
+    ledger.record(
+        profile["user_id"], "hunt", coins=-amount_coins, energy=-rolls,
+        animals=Counter(animal.animal_id for animal in results), seed=seed,
+    )
 
-    grouped: Dict[str, Dict[str, int]] = {rarity: {} for rarity, _ in RARITY_ORDER}
+    grouped: Dict[str, Dict[str, int]] = {rarity: {} for rarity, _ in cat.rarity_order}
     for animal in results:
         grouped[animal.rarity][animal.animal_id] = grouped[animal.rarity].get(
             animal.animal_id, 0
         ) + 1
+    for counts in grouped.values():
+        hatch_counter.add(counts)
 
     lines = ["🌱 Hunt Results", "────────────────"]
 
-    for rarity, symbol in RARITY_ORDER:
+    for rarity, symbol in cat.rarity_order:
         animals = grouped[rarity]
         if not animals:
             continue
         entries = []
         for animal_id, count in sorted(animals.items()):
-            animal = ANIMALS[animal_id]
+            animal = cat.animals[animal_id]
             is_new = before_counts.get(animal_id, 0) == 0
             new_tag = " 🆕" if is_new else ""
             entries.append(f"{animal.emoji} {superscript_number(count)}{new_tag}")
@@ -1061,6 +4914,9 @@ async def hunt(interaction: discord.Interaction, amount_coins: int):
     lines.append("────────────────")
     lines.append(f"💰 Coins spent: {amount_coins}")
     lines.append(f"🔋 Energy used: {rolls}")
+    lines.append(f"🎲 Seed: {seed}")
+    if cat.event:
+        lines.append(f"🎉 {cat.event.name} is live")
 
     await interaction.response.send_message("\n".join(lines))
 
@@ -1119,18 +4975,8 @@ async def sell(
         sell_count = int(amount_lower)
 
     profile = store.load_profile(str(interaction.user.id))
-
-    def finalize_sale(changes: List[Tuple[Animal, int]]) -> Tuple[int, int]:
-        total_coins = 0
-        total_sold = 0
-        for animal_obj, qty in changes:
-            current_amount = profile["zoo"].get(animal_obj.animal_id, 0)
-            profile["zoo"][animal_obj.animal_id] = max(0, current_amount - qty)
-            total_coins += qty * RARITY_SELL_VALUE[animal_obj.rarity]
-            total_sold += qty
-        profile["coins"] += total_coins
-        store.save_profile(profile)
-        return total_sold, total_coins
+    # Prices are fixed when the command starts, even if an event ends during the prompt.
+    cat = events.current()
 
     if mode_value == "food":
         food_obj = resolve_food(target)
@@ -1161,6 +5007,7 @@ async def sell(
         profile["foods"][food_obj.food_id] = max(0, owned - sell_amount)
         profile["coins"] += int(final_value)
         store.save_profile(profile)
+        ledger.record(profile["user_id"], "sell_food", coins=int(final_value), foods={food_obj.food_id: -sell_amount})
         await interaction.response.send_message(
             f"✅ SOLD\n{food_obj.emoji} x{sell_amount}\nValue after use: {int(final_value)} coins",
         )
@@ -1198,22 +5045,13 @@ async def sell(
 
     else:
         rarity_key = target.strip().upper()
-        if rarity_key not in RARITY_SELL_VALUE:
+        if rarity_key not in catalog.sell_values:
             await interaction.response.send_message(
                 "❌ Invalid rarity\nUse common, uncommon, rare, epic, legendary, special, or hidden.",
                 ephemeral=True,
             )
             return
-        plan: List[Tuple[Animal, int]] = []
-        for animal_obj in ANIMALS.values():
-            if animal_obj.rarity != rarity_key:
-                continue
-            available = sellable_amount(profile, animal_obj.animal_id)
-            if available <= 0:
-                continue
-            qty = available if sell_all else min(available, sell_count or 0)
-            if qty > 0:
-                plan.append((animal_obj, qty))
+        plan = plan_rarity_sale(profile, rarity_key, None if sell_all else sell_count)
         if not plan:
             await interaction.response.send_message(
                 "❌ Cannot sell\nNo animals of that rarity are available (team animals are excluded).",
@@ -1236,7 +5074,7 @@ async def sell(
         if not view.confirmed:
             await message.edit(content="Sale cancelled.", embed=None, view=None)
             return
-        total_sold, total_coins = finalize_sale(plan)
+        total_sold, total_coins = finalize_sale(profile, plan, cat)
         await message.edit(
             content=f"✅ SOLD\nItems: {total_sold}\n💰 Coins: +{total_coins}",
             embed=None,
@@ -1244,148 +5082,190 @@ async def sell(
         )
         return
 
-    total_sold, total_coins = finalize_sale(plan)
+    total_sold, total_coins = finalize_sale(profile, plan, cat)
     await interaction.response.send_message(
         f"✅ SOLD\n{plan[0][0].emoji} x{total_sold}\n💰 Coins: +{total_coins}"
     )
 
 
-@client.tree.command(name="battle", description="⚔️ Battle an enemy bot for rewards")
-async def battle(interaction: discord.Interaction):
+def sale_lines(animals: List[Tuple[Animal, int]], foods: List[Tuple[Food, int]], limit: int = 1000) -> str:
+    entries = [f"{a.emoji} x{qty}" for a, qty in animals] + [f"{f.emoji} x{qty}" for f, qty in foods]
+    text = ""
+    for idx, entry in enumerate(entries):
+        if len(text) + len(entry) + 2 > limit:
+            return text + f"\n…and {len(entries) - idx} more"
+        text += ("  " if text else "") + entry
+    return text
+
+
+@client.tree.command(name="sellbulk", description="🧹 Sell many animals and foods at once (team protected)")
+@app_commands.describe(
+    targets="Animals, foods or rarities, comma separated; 'animals' or 'foods' for everything",
+    keep="How many of each to keep on top of your team (default 0)",
+)
+async def sell_bulk(interaction: discord.Interaction, targets: str, keep: int = 0):
+    if keep < 0:
+        await interaction.response.send_message("❌ Keep must be 0 or more.", ephemeral=True)
+        return
+    profile = store.load_profile(str(interaction.user.id))
+    cat = events.current()
+    animal_ids, food_ids, unknown = parse_sale_targets(targets, cat)
+    if unknown:
+        await interaction.response.send_message(
+            f"❌ Unknown target\n{', '.join(unknown[:10])}\nUse animal or food aliases, rarity names, 'animals' or 'foods'.",
+            ephemeral=True,
+        )
+        return
+    animals, foods = plan_bulk_sale(profile, animal_ids, food_ids, keep, cat)
+    if not animals and not foods:
+        await interaction.response.send_message(
+            "❌ Cannot sell\nNothing matches (team animals and equipped foods are excluded).", ephemeral=True
+        )
+        return
+
+    value = sum(qty * cat.sell_values[a.rarity] for a, qty in animals) + sum(food_sale_value(f, qty) for f, qty in foods)
+    embed = discord.Embed(title="⚠️ Confirm Sale", description="You are about to sell the following:")
+    embed.add_field(name="Items", value=sale_lines(animals, foods), inline=False)
+    embed.add_field(name="Value", value=f"💰 {value} coins", inline=False)
+    view = SellConfirmView(interaction.user.id)
+    await interaction.response.send_message(embed=embed, view=view)
+    message = await interaction.original_response()
+    await view.wait()
+    if not view.confirmed:
+        await message.edit(content="Sale cancelled.", embed=None, view=None)
+        return
+    total_sold, total_coins = finalize_sale(profile, animals, cat, foods)
+    await message.edit(content=f"✅ SOLD\nItems: {total_sold}\n💰 Coins: +{total_coins}", embed=None, view=None)
+
+
+@sell_bulk.autocomplete("targets")
+async def sell_bulk_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    # Completes the last comma-separated target and keeps the ones before it.
+    head, _, last = current.rpartition(",")
+    prefix = f"{head}, " if head else ""
+    last = last.strip().lower()
+    names = [rarity.lower() for rarity, _ in catalog.rarity_order] + ["animals", "foods"]
+    names = [name for name in names if name.startswith(last)]
+    names += [catalog.animals[animal_id].aliases[0] for animal_id in catalog.animal_trie.lookup(last)]
+    names += [catalog.foods[food_id].aliases[0] for food_id in catalog.food_trie.lookup(last)]
+    return [
+        app_commands.Choice(name=(prefix + name)[:100], value=(prefix + name)[:100])
+        for name in list(dict.fromkeys(names))[:AUTOCOMPLETE_LIMIT]
+    ]
+
+
+@sell.autocomplete("target")
+async def sell_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    mode = getattr(interaction.namespace, "mode", None)
+    mode = getattr(mode, "value", mode)
+    if mode == "food":
+        return food_choices(str(interaction.user.id), current)
+    if mode == "rarity":
+        prefix = current.strip().upper()
+        return [
+            app_commands.Choice(name=f"{symbol} {rarity.title()}", value=rarity.lower())
+            for rarity, symbol in catalog.rarity_order
+            if rarity.startswith(prefix)
+        ]
+    return animal_choices(str(interaction.user.id), current)
+
+
+@client.tree.command(name="battle", description="⚔️ Battle an enemy bot or another player's team for rewards")
+@app_commands.describe(mode="Bot (default) or PvP: fight the saved team of a player near your power")
+@app_commands.choices(
+    mode=[
+        app_commands.Choice(name="Bot", value="bot"),
+        app_commands.Choice(name="PvP", value="pvp"),
+    ]
+)
+async def battle(interaction: discord.Interaction, mode: Optional[app_commands.Choice[str]] = None):
+    pvp = (mode.value if isinstance(mode, app_commands.Choice) else str(mode)) == "pvp"
     await interaction.response.defer()
     try:
         profile = store.load_profile(str(interaction.user.id))
+        cat = events.current()
         now_ts = now()
         if profile["cooldowns"]["battle"] > now_ts:
             wait = format_cooldown(profile["cooldowns"]["battle"] - now_ts)
             await interaction.edit_original_response(content=f"⏳ Cooldown\nTry again in {wait}.")
             return
-        if not all(profile["team"][f"slot{i}"] for i in range(1, 4)):
+        team = team_snapshot(profile, cat)
+        if not team.complete:
             await interaction.edit_original_response(
                 content="❌ Team incomplete\nSet slot 1 (TANK), slot 2 (ATTACK), slot 3 (SUPPORT)."
             )
             return
+        # Entries written by older builds, or lost with teams.jsonl, refresh here.
+        index_team(profile)
 
-        player_animals: Dict[str, Animal] = {
-            f"slot{i}": ANIMALS[profile["team"][f"slot{i}"]] for i in range(1, 4)
-        }
-        player_foods: Dict[str, Optional[Food]] = {}
-        for i in range(1, 4):
-            slot = f"slot{i}"
-            food_id = profile.get("equipped_foods", {}).get(slot)
-            player_foods[slot] = FOODS.get(food_id) if food_id else None
-
-        avg_index = round(
-            sum(a.rarity_index for a in player_animals.values()) / 3
-        )
-        allowed = set()
-        for idx in (avg_index - 1, avg_index, avg_index + 1):
-            if 0 <= idx <= 6:
-                allowed.add(idx)
-        allowed_indices = sorted(allowed)
-
-        player_power = sum(power(a) + food_power(player_foods[f"slot{i}"]) for i, a in player_animals.items())
-        enemy_multiplier = random.uniform(0.85, 1.3)
-        target_power = player_power * enemy_multiplier
-
-        best_team: Optional[Dict[str, Animal]] = None
-        best_delta = float("inf")
-        last_signature = profile.get("last_enemy_signature")
-
-        for attempt in range(50):
-            enemy_team = {
-                "slot1": random_animal_by_rarity_and_role(allowed_indices, "TANK"),
-                "slot2": random_animal_by_rarity_and_role(allowed_indices, "ATTACK"),
-                "slot3": random_animal_by_rarity_and_role(allowed_indices, "SUPPORT"),
-            }
-            signature = enemy_signature(enemy_team)
-            if signature == last_signature:
-                continue
-            pwr = sum(power(a) for a in enemy_team.values())
-            delta = abs(pwr - target_power)
-            if delta < best_delta:
-                best_delta = delta
-                best_team = enemy_team
-            if abs(pwr - target_power) <= target_power * 0.07:
-                best_team = enemy_team
-                break
-
-        if not best_team:
-            best_team = {
-                "slot1": random_animal_by_rarity_and_role(allowed_indices, "TANK"),
-                "slot2": random_animal_by_rarity_and_role(allowed_indices, "ATTACK"),
-                "slot3": random_animal_by_rarity_and_role(allowed_indices, "SUPPORT"),
-            }
-
-        enemy_animals = best_team
-        profile["last_enemy_signature"] = enemy_signature(enemy_animals)
-
-        player_hp = {}
-        enemy_hp = {slot: animal.hp for slot, animal in enemy_animals.items()}
-        player_stats: Dict[str, Tuple[int, int, int]] = {}
-        for slot, animal in player_animals.items():
-            hp, atk, defense = apply_food(animal, player_foods.get(slot))
-            player_stats[slot] = (hp, atk, defense)
-            player_hp[slot] = hp
-
-        def first_alive(hp_map: Dict[str, int]) -> Optional[str]:
-            for i in range(1, 4):
-                slot = f"slot{i}"
-                if hp_map[slot] > 0:
-                    return slot
-            return None
-
-        def attack_phase(attacker_hp: Dict[str, int], attacker_stats: Dict[str, Tuple[int, int, int]], defender_hp: Dict[str, int], defender_stats: Dict[str, Tuple[int, int, int]]):
-            for i in range(1, 4):
-                slot = f"slot{i}"
-                if attacker_hp.get(slot, 0) <= 0:
-                    continue
-                target_slot = first_alive(defender_hp)
-                if not target_slot:
-                    break
-                def_value = sum(defender_stats[s][2] for s, hp in defender_hp.items() if hp > 0)
-                dmg = max(1, attacker_stats[slot][1] - def_value)
-                defender_hp[target_slot] = max(0, defender_hp[target_slot] - dmg)
-
-        rounds = 0
-        while first_alive(player_hp) and first_alive(enemy_hp) and rounds < 100:
-            rounds += 1
-            attack_phase(player_hp, player_stats, enemy_hp, {slot: (a.hp, a.atk, a.defense) for slot, a in enemy_animals.items()})
-            if not first_alive(enemy_hp):
-                break
-            attack_phase(enemy_hp, {slot: (a.hp, a.atk, a.defense) for slot, a in enemy_animals.items()}, player_hp, player_stats)
-
-        player_alive = first_alive(player_hp) is not None
-        enemy_alive = first_alive(enemy_hp) is not None
-        cap_reached = rounds >= 100 and player_alive and enemy_alive
-        if cap_reached:
-            player_hp_total = sum(max(0, hp) for hp in player_hp.values())
-            enemy_hp_total = sum(max(0, hp) for hp in enemy_hp.values())
-            player_win = player_hp_total > enemy_hp_total
-        else:
-            player_win = player_alive and not enemy_alive
+        player_animals, player_foods, player_stats = team.animals, team.foods, team.stats
+        # Set before any offload await so a second battle cannot slip in meanwhile.
+        cooldown = profile["cooldowns"]["battle"]
+        profile["cooldowns"]["battle"] = now_ts + 10
+        try:
+            if pvp:
+                match = await find_opponent(profile["user_id"], team)
+                opponent = build_team_snapshot(match[1], cat) if match else None
+                if opponent is None or not opponent.complete:
+                    profile["cooldowns"]["battle"] = cooldown
+                    await interaction.edit_original_response(
+                        content="🤷 No opponent\nNo other player has a full team near your power yet. Try a bot battle."
+                    )
+                    return
+                # Rewards scale with the opponent's strength relative to yours, as bot battles do.
+                seed, enemy_multiplier = 0, min(1.3, max(0.85, opponent.power / team.power))
+                player_hp, enemy_hp, player_win, kills = await offloader.call(
+                    "battle", 1, resolve_recorded, player_stats, opponent.stats
+                )
+                enemy_animals, enemy_stats = opponent.animals, opponent.stats
+            else:
+                seed, _ = rng_service.stream(profile, "battle")
+                enemy_multiplier, enemy_ids, player_hp, enemy_hp, player_win, kills = await offloader.call(
+                    "battle", 1, simulate_battle, player_stats, team.power, team.allowed_indices,
+                    profile.get("last_enemy_signature"), seed, cat,
+                )
+                enemy_animals = {slot: cat.animals[animal_id] for slot, animal_id in enemy_ids.items()}
+                enemy_stats = {slot: (a.hp, a.atk, a.defense) for slot, a in enemy_animals.items()}
+                profile["last_enemy_signature"] = enemy_signature(enemy_animals)
+        except BaseException:
+            profile["cooldowns"]["battle"] = cooldown
+            raise
 
         energy_gain = 1 if player_win else 0
-        coin_gain = coins_reward(enemy_multiplier) if player_win else 0
+        coin_gain = coins_reward(enemy_multiplier, cat.coin_multiplier) if player_win else 0
 
         profile["energy"] += energy_gain
         profile["coins"] += coin_gain
-        profile["cooldowns"]["battle"] = now_ts + 10
         if player_win:
             for slot, food_id in profile.get("equipped_foods", {}).items():
                 if food_id:
                     profile["equipped_food_wins"][slot] = profile["equipped_food_wins"].get(slot, 0) + 1
         store.save_profile(profile)
+        ledger.record(
+            profile["user_id"], "pvp" if pvp else "battle", coins=coin_gain, energy=energy_gain, seed=seed, aux=enemy_multiplier
+        )
+        replays.add(
+            profile["user_id"],
+            battle_record(
+                {slot: a.animal_id for slot, a in player_animals.items()}, player_stats,
+                {slot: a.animal_id for slot, a in enemy_animals.items()}, enemy_stats,
+                player_win, kills, match[0] if pvp else None,
+            ),
+        )
         embed_color = 0x2ECC71 if player_win else 0xE74C3C
         embed = discord.Embed(
             title="Victory" if player_win else "Defeat",
             description="Battle complete. Review the summary below.",
             color=embed_color,
         )
+        if pvp:
+            overview = f"You fought <@{match[0]}>'s saved team (⚡ {opponent.power:.0f} power)."
+        else:
+            overview = "Enemy strength adapted to your squad and food boosts."
         embed.add_field(
             name="Battle Overview",
             value=(
-                f"Enemy strength adapted to your squad and food boosts.\n"
+                f"{overview}\n"
                 f"Difficulty hint: {'Weaker Enemy' if enemy_multiplier < 0.95 else 'Balanced Fight' if enemy_multiplier < 1.12 else 'Tough Enemy'}"
             ),
             inline=False,
@@ -1395,12 +5275,11 @@ async def battle(interaction: discord.Interaction):
         for i in range(1, 4):
             slot = f"slot{i}"
             pa = player_animals[slot]
-            ea = enemy_animals[slot]
             p_food = player_foods.get(slot)
             p_hp_max = player_stats[slot][0]
             survivor_lines.append(
                 f"{ROLE_EMOJI[pa.role]} {pa.emoji} {pa.animal_id} {p_food.emoji if p_food else ''}\n"
-                f"You: {player_hp[slot]}/{p_hp_max} | Enemy: {enemy_hp[slot]}/{ea.hp}"
+                f"You: {player_hp[slot]}/{p_hp_max} | Enemy: {enemy_hp[slot]}/{enemy_stats[slot][0]}"
             )
         embed.add_field(name="Survivors", value="\n\n".join(survivor_lines), inline=False)
 
@@ -1414,7 +5293,10 @@ async def battle(interaction: discord.Interaction):
             value="Weaker Enemy" if enemy_multiplier < 0.95 else "Balanced Fight" if enemy_multiplier < 1.12 else "Tough Enemy",
             inline=False,
         )
-        embed.set_footer(text="Tip: Equip foods to push your power higher before battling again.")
+        if pvp:
+            embed.set_footer(text="Tip: Your own team can be drawn as an opponent once it is complete.")
+        else:
+            embed.set_footer(text=f"Tip: Equip foods to push your power higher before battling again. • Seed {seed}")
 
         await interaction.edit_original_response(content=None, embed=embed)
     except Exception as exc:
@@ -1429,38 +5311,77 @@ async def battle(interaction: discord.Interaction):
 
 
 
+def replay_embed(record: Dict, number: int, total: int) -> discord.Embed:
+    names = [catalog.animals[a].emoji if a in catalog.animals else "❔" for a in record["animals"]]
+    phases, exact = replay_phases(record)
+    # Rounds between two deaths repeat the same hits; show each run once, with
+    # the hp left after its last round.
+    rounds = [phases[idx : idx + 2] for idx in range(0, len(phases), 2)]
+    keys = [tuple(tuple(hit[:3] for hit in hits) for hits in pair) for pair in rounds]
+    lines = []
+    first = 0
+    for idx in range(1, len(rounds) + 1):
+        if idx < len(rounds) and keys[idx] == keys[first]:
+            continue
+        label = f"R{first + 1}" if idx - first == 1 else f"R{first + 1}–{idx}"
+        sides = []
+        for side, hits in enumerate(rounds[idx - 1]):
+            attackers, targets = (names[:3], names[3:]) if side == 0 else (names[3:], names[:3])
+            sides.append(
+                ", ".join(
+                    f"{attackers[SLOT_KEYS.index(slot)]}→{targets[SLOT_KEYS.index(target)]} {dmg}{' 💀' if not left else ''}"
+                    for slot, target, dmg, left in hits
+                )
+            )
+        lines.append(f"**{label}** You: {sides[0]}" + (f" | Foe: {sides[1]}" if len(sides) > 1 else ""))
+        first = idx
+    opponent = f"<@{record['opponent']}>'s team" if record["opponent"] else "a bot team"
+    header = f"<t:{record['ts']}:R> against {opponent}\n"
+    header += f"You: {' '.join(names[:3])} · Foe: {' '.join(names[3:])}\n\n"
+    body = "\n".join(lines)
+    if len(header) + len(body) > 4000:
+        body = body[: 3990 - len(header)].rsplit("\n", 1)[0] + "\n…"
+    embed = discord.Embed(
+        title=f"🎞️ Replay {number}/{total} — {'Victory' if record['win'] else 'Defeat'}",
+        description=header + body,
+        color=0x2ECC71 if record["win"] else 0xE74C3C,
+    )
+    if exact:
+        embed.set_footer(text="Use /replay <n> for older battles • 1 is the latest")
+    else:
+        embed.set_footer(text="⚠️ Battle rules changed since this fight; turns are re-derived and may differ.")
+    return embed
 
 
-DEV_GUILD_ID = 1452648204519739483
-
-@client.event
-async def on_ready():
-    print("====== COMMAND DEBUG ======")
-    for cmd in client.tree.get_commands():
-        print("-", cmd.name)
-    print("===========================")
-
-    dev_guild = discord.Object(id=DEV_GUILD_ID)
-
-    # 🔥 Clear ONCE (comment this out after success)
-    client.tree.clear_commands(guild=dev_guild)
-    await client.tree.sync(guild=dev_guild)
-    print("🧹 Cleared guild commands")
-
-    # ⚡ Re-sync
-    synced = await client.tree.sync(guild=dev_guild)
-    print(f"⚡ Re-synced {len(synced)} guild commands")
-
-    # 🌍 Global sync
-    await client.tree.sync()
-    print("🌍 Global sync requested")
-
-    # IMPORTANT: DO NOTHING ELSE HERE
-    # Do NOT exit
-    # Do NOT stop the loop
-
-
+@client.tree.command(name="replay", description="🎞️ Replay one of your recent battles turn by turn")
+@app_commands.describe(battle="1 = your latest battle, 2 = the one before, and so on")
+async def replay_command(interaction: discord.Interaction, battle: int = 1):
+    records = await recent_replays(str(interaction.user.id))
+    if not records:
+        await interaction.response.send_message("🎞️ No battles recorded yet. Try /battle first.", ephemeral=True)
+        return
+    if not 1 <= battle <= len(records):
+        await interaction.response.send_message(f"❌ Pick a battle from 1 to {len(records)}.", ephemeral=True)
+        return
+    await interaction.response.send_message(embed=replay_embed(records[battle - 1], battle, len(records)))
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emoji Zoo Discord bot")
+    parser.add_argument("--workers", type=int, default=0, help="Run a store process plus N gateway worker processes")
+    parser.add_argument("--shards", type=int, default=0, help="Total shard count for --workers (default: one per worker)")
+    args = parser.parse_args()
+    # Until the catalog reload handler is installed, a SIGHUP must not stop the process.
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    if ZOO_ROLE == "store":
+        asyncio.run(StoreServer().serve())
+        sys.exit(0)
+    if not TOKEN:
+        raise RuntimeError("DISCORD_TOKEN environment variable is not set!")
+    if args.workers:
+        sys.exit(run_cluster(args.workers, args.shards))
+    startup.mark("imported")
     client.run(TOKEN)
+    if client.failed:
+        sys.exit(1)
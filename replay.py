@@ -0,0 +1,131 @@
+"""Rebuild profiles from the economic ledger, or audit one user's history.
+
+Starts from a backup chain (or from empty profiles when no backup is given)
+and applies every ledger event taken after that backup, up to --at:
+
+    python replay.py --dir backups --at 2026-10-01T12:00:00 --output users.json
+    python replay.py --dir backups --user 123456789
+    python replay.py --audit 123456789
+
+Times are Unix seconds or ISO 8601 (UTC when no offset is given).
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+import main
+import restore
+
+
+# Yields (event, animal_ids, food_ids) for events in (since, until], in ledger order.
+# A ledger position from a backup header also skips everything written before it;
+# timestamps alone cannot split events recorded in the same instant as the backup.
+def ledger_events(
+    directory: str, since: float, until: float, user_ids: Optional[Set[int]] = None, position: Optional[Dict] = None
+):
+    for path in main.ledger_segments(directory):
+        name, start = os.path.basename(path), 0
+        if position:
+            if name < position["segment"]:
+                continue
+            if name == position["segment"]:
+                start = position["offset"]
+        segment = main.LedgerSegment(path)
+        animal_ids, food_ids = segment.header["animal_ids"], segment.header["food_ids"]
+        if user_ids is None:
+            events = segment.events(start=start)
+        else:
+            index = segment.index()
+            offsets = []
+            for user in user_ids:
+                entry = index.get(user)
+                if entry and entry[1] > since and entry[0] <= until:
+                    offsets.extend(entry[2])
+            events = segment.events(sorted(offsets), start)
+        for event in events:
+            if since < event[0] <= until:
+                yield event, animal_ids, food_ids
+
+
+def replay(
+    directory: str,
+    users: Dict[str, Dict],
+    since: float,
+    until: float,
+    user_ids: Optional[Set[int]] = None,
+    position: Optional[Dict] = None,
+) -> int:
+    applied = 0
+    for event, animal_ids, food_ids in ledger_events(directory, since, until, user_ids, position):
+        user_id = str(event[1])
+        profile = users.get(user_id)
+        if profile is None:
+            profile = users[user_id] = main.DataStore._default_profile(user_id)
+        main.apply_ledger_event(profile, event, animal_ids, food_ids)
+        applied += 1
+    return applied
+
+
+def audit(directory: str, user_id: int, since: float, until: float) -> None:
+    for event, animal_ids, food_ids in ledger_events(directory, since, until, {user_id}):
+        ts, _, kind, coins, energy, seed, aux, items = event
+        parts = [datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds"), main.LEDGER_KINDS[kind]]
+        parts.append(f"coins {coins:+d} energy {energy:+d}")
+        for item_type, ordinal, delta in items:
+            if item_type == main.LEDGER_ANIMAL:
+                parts.append(f"{animal_ids[ordinal]} {delta:+d}")
+            elif item_type == main.LEDGER_FOOD:
+                parts.append(f"{food_ids[ordinal]} {delta:+d}")
+            else:
+                parts.append(f"equip {food_ids[ordinal]} -> slot{delta}")
+        if seed:
+            parts.append(f"seed {seed}")
+        if aux:
+            parts.append(f"multiplier {aux:.4f}")
+        print(" | ".join(parts))
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ledger", default=main.LEDGER_DIR, help="Ledger directory")
+    parser.add_argument("--dir", help="Backup directory; the newest chain taken before --at is the base")
+    parser.add_argument("--at", type=main.parse_timestamp, default=math.inf, help="Point in time to rebuild (default: latest)")
+    parser.add_argument("--user", type=int, help="Rebuild only this user and print the profile")
+    parser.add_argument("--audit", type=int, metavar="USER", help="Print this user's ledger events")
+    parser.add_argument("--output", help="Write the rebuilt users.json here")
+    args = parser.parse_args()
+
+    if args.audit is not None:
+        audit(args.ledger, args.audit, 0.0, args.at)
+        return 0
+
+    users: Dict[str, Dict] = {}
+    since = 0.0
+    version = 2
+    position = None
+    if args.dir:
+        merged = restore.merge(restore.latest_chain(args.dir, None if math.isinf(args.at) else args.at))
+        users, since, version, position = merged["users"], merged["created"], merged["version"], merged["ledger"]
+        if position:
+            # Backups written before headers carried a ledger position fall back to the timestamp.
+            since = -math.inf
+    if args.user is not None:
+        users = {str(args.user): users[str(args.user)]} if str(args.user) in users else {}
+    applied = replay(args.ledger, users, since, args.at, None if args.user is None else {args.user}, position)
+
+    if args.user is not None and not args.output:
+        print(json.dumps(users.get(str(args.user)), indent=2))
+    elif args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "users": users}, f, indent=2)
+    print(f"Applied {applied} ledger events to {len(users)} users", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
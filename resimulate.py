@@ -0,0 +1,86 @@
+"""Replay a hunt or battle offline from its recorded seed.
+
+Seeds are shown in the hunt results and battle footer and stored in
+profile["last_seeds"]. Rules come from main.py and the catalog from
+catalog.json, so a replay is exact as long as neither has changed since the
+original roll. Ledger segments name the catalog version their events used;
+pass a saved copy of that version with --catalog.
+
+    python resimulate.py hunt --seed 123456789 --rolls 20
+    python resimulate.py battle --seed 123456789 --team elephant,wolf,owl --foods honey,pepper,-
+"""
+
+import argparse
+import sys
+from collections import Counter
+from typing import Dict, List, Optional
+
+import main
+
+
+def parse_slots(value: str, catalog: Dict) -> List[Optional[str]]:
+    slots = [part.strip() for part in value.split(",")]
+    if len(slots) != 3:
+        raise SystemExit("Expected three comma-separated slot values.")
+    resolved: List[Optional[str]] = []
+    for part in slots:
+        if part in ("", "-", "none"):
+            resolved.append(None)
+        elif part in catalog:
+            resolved.append(part)
+        else:
+            raise SystemExit(f"Unknown id: {part}")
+    return resolved
+
+
+def replay_hunt(seed: int, rolls: int) -> None:
+    for animal_id, count in sorted(Counter(main.hunt_rolls(seed, rolls)).items()):
+        animal = main.catalog.animals[animal_id]
+        print(f"{animal.rarity:<10} {animal.emoji} {animal_id} x{count}")
+
+
+def replay_battle(seed: int, team: List[Optional[str]], foods: List[Optional[str]], last_signature: Optional[str]) -> None:
+    player_animals = {f"slot{i + 1}": main.catalog.animals[animal_id] for i, animal_id in enumerate(team)}
+    player_foods = {f"slot{i + 1}": main.catalog.foods[food_id] if food_id else None for i, food_id in enumerate(foods)}
+    allowed = main.rarity_window(list(player_animals.values()))
+    player_power = sum(main.power(a) + main.food_power(player_foods[slot]) for slot, a in player_animals.items())
+    player_stats = {slot: main.apply_food(a, player_foods[slot]) for slot, a in player_animals.items()}
+    enemy_multiplier, enemy_ids, player_hp, enemy_hp, player_win, _ = main.simulate_battle(
+        player_stats, player_power, allowed, last_signature, seed
+    )
+    enemy = {slot: main.catalog.animals[animal_id] for slot, animal_id in enemy_ids.items()}
+    print(f"enemy multiplier: {enemy_multiplier:.4f}")
+    print(f"enemy team: {main.enemy_signature(enemy)}")
+    for slot in player_animals:
+        print(f"{slot}: you {player_hp[slot]}/{player_stats[slot][0]} | enemy {enemy_hp[slot]}/{enemy[slot].hp}")
+    print(f"result: {'Victory' if player_win else 'Defeat'} (+{main.coins_reward(enemy_multiplier) if player_win else 0} coins)")
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="kind", required=True)
+    hunt = sub.add_parser("hunt")
+    hunt.add_argument("--seed", type=int, required=True)
+    hunt.add_argument("--rolls", type=int, required=True)
+    battle = sub.add_parser("battle")
+    battle.add_argument("--seed", type=int, required=True)
+    battle.add_argument("--team", required=True, help="slot1,slot2,slot3 animal ids")
+    battle.add_argument("--foods", default="-,-,-", help="slot1,slot2,slot3 food ids (- for none)")
+    battle.add_argument("--last-signature", help="Enemy signature of the previous battle, if any")
+    parser.add_argument("--catalog", help="Catalog file to replay against (default: CATALOG_PATH)")
+    args = parser.parse_args()
+    if args.catalog:
+        main.install_catalog(main.load_catalog(args.catalog))
+
+    if args.kind == "hunt":
+        replay_hunt(args.seed, args.rolls)
+    else:
+        team = parse_slots(args.team, main.catalog.animals)
+        if None in team:
+            raise SystemExit("All three team slots are required.")
+        replay_battle(args.seed, team, parse_slots(args.foods, main.catalog.foods), args.last_signature)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,102 @@
+"""Rebuild users.json from compressed backups written by the bot.
+
+Pass a full backup followed by any incrementals taken after it, or point
+at the backup directory to use the newest full backup and its incrementals:
+
+    python restore.py backups/users-...-full.json.gz backups/users-...-incremental.json.gz
+    python restore.py --dir backups --output users.json
+"""
+
+import argparse
+import calendar
+import gzip
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # only needed for .zst backups
+    zstandard = None
+
+
+def read_backup(path: str) -> Dict:
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise SystemExit(f"{path} is zstd-compressed; install zstandard to read it.")
+        with open(path, "rb") as f:
+            return json.load(zstandard.ZstdDecompressor().stream_reader(f))
+    with gzip.open(path, "rb") as f:
+        return json.load(f)
+
+
+def backup_time(name: str) -> float:
+    # users-YYYYmmdd-HHMMSSmmm-<kind>.json.<ext>, stamped in UTC
+    stamp = name.split("-")
+    return calendar.timegm(time.strptime(stamp[1] + stamp[2][:6], "%Y%m%d%H%M%S")) + int(stamp[2][6:9]) / 1000
+
+
+def latest_chain(directory: str, before: Optional[float] = None) -> List[str]:
+    names = sorted(name for name in os.listdir(directory) if name.startswith("users-") and not name.endswith(".tmp"))
+    if before is not None:
+        names = [name for name in names if backup_time(name) <= before]
+    fulls = [name for name in names if "-full." in name]
+    if not fulls:
+        raise SystemExit(f"No full backup in {directory}.")
+    base = fulls[-1]
+    chain = [base] + [name for name in names if name > base and "-incremental." in name]
+    return [os.path.join(directory, name) for name in chain]
+
+
+def merge(paths: List[str]) -> Dict:
+    full = read_backup(paths[0])
+    if full.get("kind") != "full":
+        raise SystemExit(f"{paths[0]} is not a full backup.")
+    base_name = os.path.basename(paths[0])
+    users = full["users"]
+    hatch_counts = full.get("hatch_counts", {})
+    created = full.get("created", 0.0)
+    position = full.get("ledger")
+    for path in sorted(paths[1:], key=lambda p: read_backup(p)["created"]):
+        incremental = read_backup(path)
+        if incremental.get("base") != base_name:
+            print(f"⚠️ {os.path.basename(path)} was taken against {incremental.get('base')}, not {base_name}; skipping.")
+            continue
+        users.update(incremental["users"])
+        hatch_counts = incremental.get("hatch_counts", hatch_counts)
+        created = incremental.get("created", created)
+        position = incremental.get("ledger", position)
+    return {
+        "version": full.get("version", 2),
+        "users": users,
+        "hatch_counts": hatch_counts,
+        "created": created,
+        "ledger": position,
+    }
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("backups", nargs="*", help="Full backup followed by incrementals")
+    parser.add_argument("--dir", help="Use the newest full backup (and its incrementals) in this directory")
+    parser.add_argument("--output", default="users.json", help="Where to write the rebuilt users.json")
+    parser.add_argument("--hatch-output", help="Also write the hatch counts side file here")
+    args = parser.parse_args()
+
+    paths = latest_chain(args.dir) if args.dir else args.backups
+    if not paths:
+        parser.error("give backup files or --dir")
+    merged = merge(paths)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"version": merged["version"], "users": merged["users"]}, f, indent=2)
+    if args.hatch_output:
+        with open(args.hatch_output, "w", encoding="utf-8") as f:
+            f.write(json.dumps(merged["hatch_counts"], separators=(",", ":")) + "\n")
+    print(f"Restored {len(merged['users'])} users from {len(paths)} backup file(s) into {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())